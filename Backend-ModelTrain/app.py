@@ -2,46 +2,80 @@ import os
 import random
 import datetime
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from flask_bcrypt import Bcrypt
-from flask_mail import Mail, Message
-from pymongo import MongoClient
-import pandas as pd
-import joblib
-import numpy as np
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from model_registry import registry, MODEL_PATH, SCALER_PATH, FEATURE_PATH
+from inference import predict_batch, predict_row, micro_batcher, InvalidFeatureError
+from hourly_model import hourly_registry, solar_geometry, predict_day_curve, HourlyInputError
+from micro_batcher import QueueFullError
+from prediction_cache import prediction_cache
+from mongo_connection import MongoConnection
+from user_store import (ensure_user_indexes, RESEND_OTP_FIELDS, VERIFY_EMAIL_FIELDS,
+                        SIGNIN_FIELDS, EXISTS_FIELDS, OTP_FIELDS)
+from metrics import metrics, mark_stage, stages_sampled, WSGIRequestTimer
+from password_hasher import password_hasher_from_env, HasherBusyError
+from mail_queue import mail_queue_from_env, otp_email_html
 
 load_dotenv()
 app = Flask(__name__)
 CORS(app)
-bcrypt = Bcrypt(app)
 
-mongo_uri = os.environ.get("MONGO_URI")
-client = MongoClient(mongo_uri)
-db = client["SolarPower-ML"]
-users_collection = db["users"]
-
-app.config["MAIL_SERVER"] = "smtp.gmail.com"
-app.config["MAIL_PORT"] = 587
-app.config["MAIL_USE_TLS"] = True
-app.config["MAIL_USERNAME"] = os.environ.get("EMAIL_USER")
-app.config["MAIL_PASSWORD"] = os.environ.get("EMAIL_PASS")
-app.config["MAIL_DEFAULT_SENDER"] = os.environ.get("EMAIL_FROM") or os.environ.get("EMAIL_USER")
-mail = Mail(app)
-
-MODEL_PATH = "random_forest_model.pkl"
-SCALER_PATH = "scaler.pkl"
-FEATURE_PATH = "feature_columns.csv"
+# Per-route and per-stage latency histograms, scraped from /metrics.
+app.wsgi_app = WSGIRequestTimer(app, metrics)
+
+@app.before_request
+def time_json_parsing():
+    if stages_sampled() and request.is_json:
+        # Parsed here and cached by Flask, so the route's get_json() is free.
+        request.get_json(silent=True)
+        mark_stage("parse")
+
+# The client is created on first use in each worker process, after gunicorn
+# forks; pool size, timeouts and read preference come from MONGO_* variables.
+mongo = MongoConnection.from_env(on_connect=lambda db: ensure_user_indexes(db["users"]))
+users_collection = mongo.collection("users")
+
+# OTP emails go through a persistent outbox delivered by background workers;
+# MAIL_SERVER/MAIL_PORT/MAIL_USE_TLS can point it at a local SMTP stand-in.
+mail_queue = mail_queue_from_env()
+
+@app.before_request
+def start_mail_queue():
+    # Started on the first request rather than at import, so mail left in the
+    # outbox by a restart goes out straight away; later calls are a pid check.
+    mail_queue.start()
+
+prediction_cache.max_entries = int(os.environ.get("PREDICTION_CACHE_SIZE", 10000))
+prediction_cache.ttl_seconds = float(os.environ.get("PREDICTION_CACHE_TTL", 3600))
+
+# Micro-batching only pays off with threaded workers (e.g. gunicorn --threads 8).
+micro_batcher.enabled = os.environ.get("MICRO_BATCH", "0") == "1"
+micro_batcher.max_batch = int(os.environ.get("MICRO_BATCH_MAX_ROWS", 64))
+micro_batcher.max_wait_ms = float(os.environ.get("MICRO_BATCH_WINDOW_MS", 2))
+micro_batcher.max_queue = int(os.environ.get("MICRO_BATCH_MAX_QUEUE", 1024))
+
+# Bcrypt runs on a bounded pool (BCRYPT_WORKERS / BCRYPT_MAX_PENDING) at BCRYPT_LOG_ROUNDS;
+# logins re-hash passwords stored with a different cost.
+password_hasher = password_hasher_from_env()
+metrics.gauge("password_hasher_in_flight", lambda: password_hasher.in_flight, "bcrypt jobs running or queued")
+metrics.gauge("prediction_cache_entries", lambda: prediction_cache.stats()["entries"], "cached predictions")
+metrics.gauge("mail_queue_depth", mail_queue.depth, "OTP emails waiting for delivery")
+
+# FAST_START=1 serves from the memory-mapped forests and defers unpickling
+# the sklearn model until a request actually needs it; SHARED_MODEL=1 never
+# unpickles it, so workers forked by gunicorn --preload share one mapping.
+registry.lazy = hourly_registry.lazy = os.environ.get("FAST_START", "0") == "1"
+registry.forest_only = hourly_registry.forest_only = os.environ.get("SHARED_MODEL", "0") == "1"
 
 print("Attempting to load model files...")
-if not os.path.exists(MODEL_PATH) or not os.path.exists(SCALER_PATH) or not os.path.exists(FEATURE_PATH):
+if registry.get() is None:
     print("❌ Model files missing. Please run 'trainmodel.py' first.")
-    model, scaler, feature_columns = None, None, []
 else:
-    model = joblib.load(MODEL_PATH)
-    scaler = joblib.load(SCALER_PATH)
-    feature_columns = pd.read_csv(FEATURE_PATH).columns.tolist()
     print("✅ Model, Scaler, and Feature Columns Loaded")
+if hourly_registry.get() is None:
+    print("⚠️ Hourly model files missing. Run 'train_model.py --hourly --fused' to enable the hourly route.")
 
 
 def generate_otp():
@@ -49,21 +83,15 @@ def generate_otp():
     return str(random.randint(100000, 999999))
 
 def send_email(to_email, otp, subject):
-    """Send OTP Email"""
-    html = f"""
-    <div style="font-family: Arial; font-size:16px; color:#222;">
-        <h3>{subject}</h3>
-        <p>Your OTP code is:</p>
-        <h2>{otp}</h2>
-        <p>This code will expire in 5 minutes.</p>
-    </div>
-    """
-    msg = Message(subject=subject, recipients=[to_email], html=html)
-    mail.send(msg)
+    """Queue OTP Email for background delivery"""
+    mail_queue.enqueue(to_email, subject, otp_email_html(otp, subject))
 
 
 def train_model():
     """Train Random Forest model for Solar Power Prediction"""
+    import pandas as pd
+    import joblib
+    import numpy as np
     df = pd.read_csv("Solar_Power_Prediction.csv")
     print("✅ Dataset loaded successfully!")
 
@@ -125,10 +153,44 @@ def train_model():
 def home():
     return jsonify({"message": "☀️ SolarPower-ML Flask API (Auth + ML) is Running!"})
 
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    """Health check: pings Mongo through the worker's pool and reports whether a model is loaded"""
+    mongo_health = mongo.health()
+    model_loaded = registry.get() is not None
+    ok = mongo_health["ok"] and model_loaded
+    return jsonify({"ok": ok, "mongo": mongo_health, "model_loaded": model_loaded}), 200 if ok else 503
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Request, stage, Mongo, bcrypt and SMTP latency histograms in Prometheus text format"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/model/status", methods=["GET"])
+def model_status():
+    """Report the loaded model version, how long it took to load and cache usage"""
+    return jsonify({
+        **registry.status(),
+        "hourly": hourly_registry.status(),
+        "prediction_cache": prediction_cache.stats(),
+        "micro_batcher": micro_batcher.stats(),
+    }), 200
+
+@app.route("/api/mail/status", methods=["GET"])
+def mail_status():
+    """Report outbox depth, delivery counters and SMTP send latency"""
+    return jsonify(mail_queue.stats()), 200
+
+@app.route("/api/auth/status", methods=["GET"])
+def auth_status():
+    """Report password hashing load and admission rejections"""
+    return jsonify(password_hasher.stats()), 200
+
 @app.route("/predict", methods=["POST"])
 def predict_power():
     """Predict solar power output using ML model"""
-    if not model or not scaler:
+    bundle = registry.get()
+    if bundle is None:
         return jsonify({"error": "Model not loaded"}), 500
 
     data = request.get_json()
@@ -141,10 +203,12 @@ def predict_power():
     if missing:
         return jsonify({"error": f"Missing fields: {', '.join(missing)}"}), 400
 
-    df = pd.DataFrame([{key: data[key] for key in required_fields}])
-    df = df.reindex(columns=feature_columns, fill_value=0)
-    scaled = scaler.transform(df)
-    predicted_kw = float(model.predict(scaled)[0])
+    try:
+        predicted_kw = predict_row(bundle, {key: data[key] for key in required_fields})
+    except InvalidFeatureError as e:
+        return jsonify({"error": str(e)}), 400
+    except QueueFullError:
+        return jsonify({"error": "Server busy, please retry"}), 503
 
     return jsonify({
         "predicted_power_kW": round(predicted_kw, 3),
@@ -161,14 +225,10 @@ def signup():
     if not fullname or not email or not password:
         return jsonify({"message": "Please fill all required fields"}), 400
 
-    existing_user = users_collection.find_one({"email": email})
-    if existing_user:
-        if existing_user.get("isverified"):
-            return jsonify({"message": "User already exists"}), 400
-        else:
-            users_collection.delete_one({"email": email})
-            
-    hashed_pw = bcrypt.generate_password_hash(password).decode("utf-8")
+    try:
+        hashed_pw = password_hasher.hash(password)
+    except HasherBusyError:
+        return jsonify({"message": "Server busy, please retry"}), 503
 
     otp = generate_otp()
     otp_expiry = datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
@@ -181,8 +241,17 @@ def signup():
         "otp": otp,
         "otpExpiry": otp_expiry
     }
-    result = users_collection.insert_one(new_user)
-    user_id = str(result.inserted_id)
+    # One round trip: replaces an earlier unverified signup for this email or
+    # inserts a new user, and the unique email index rejects the insert when
+    # a verified user already has the address.
+    try:
+        user = users_collection.find_one_and_replace(
+            {"email": email, "isverified": False}, new_user,
+            projection=EXISTS_FIELDS, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        return jsonify({"message": "User already exists"}), 400
+    user_id = str(user["_id"])
 
     try:
         send_email(email, otp, "Verify your SolarPower-ML Account")
@@ -199,22 +268,23 @@ def signup():
 def resend_otp(user_id):
     from bson.objectid import ObjectId
     try:
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
+        oid = ObjectId(user_id)
     except Exception:
         return jsonify({"message": "Invalid user ID"}), 400
 
-    if not user:
-        return jsonify({"message": "User not found"}), 404
-    if user.get("isverified"):
-        return jsonify({"message": "User already verified"}), 400
-
     otp = generate_otp()
     otp_expiry = datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
 
-    users_collection.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$set": {"otp": otp, "otpExpiry": otp_expiry}}
+    user = users_collection.find_one_and_update(
+        {"_id": oid, "isverified": False},
+        {"$set": {"otp": otp, "otpExpiry": otp_expiry}},
+        projection=RESEND_OTP_FIELDS
     )
+    if not user:
+        # Only a failed update pays for a second lookup, to say why it failed.
+        if users_collection.find_one({"_id": oid}, EXISTS_FIELDS):
+            return jsonify({"message": "User already verified"}), 400
+        return jsonify({"message": "User not found"}), 404
 
     try:
         send_email(user["email"], otp, "Resend: Verify your SolarPower-ML Account")
@@ -227,12 +297,10 @@ def resend_otp(user_id):
 # SINGLE DAY SOLAR POWER PREDICTION (TryModelPage)
 @app.route("/api/predict/solarpower", methods=["POST"])
 def predict_single_day():
-    if not os.path.exists(MODEL_PATH) or not os.path.exists(SCALER_PATH) or not os.path.exists(FEATURE_PATH):
+    bundle = registry.get()
+    if bundle is None:
         return jsonify({"error": "Model not trained yet. Please run trainmodel.py first."}), 400
-
-    model = joblib.load(MODEL_PATH)
-    scaler = joblib.load(SCALER_PATH)
-    feature_columns = pd.read_csv(FEATURE_PATH).columns.tolist()
+    feature_columns = bundle.feature_columns
 
     data = request.get_json()
     if not data:
@@ -243,54 +311,65 @@ def predict_single_day():
         return jsonify({"error": f"Missing fields: {', '.join(missing)}"}), 400
 
     try:
-        df_input = pd.DataFrame([{col: data[col] for col in feature_columns}])
-        scaled_features = scaler.transform(df_input)
-        predicted_kw = float(model.predict(scaled_features)[0])
+        predicted_kw = predict_row(bundle, {col: data[col] for col in feature_columns})
 
         return jsonify({
             "predicted_power_kW": round(predicted_kw, 3),
             "input_used": data
         }), 200
 
+    except InvalidFeatureError as e:
+        return jsonify({"error": str(e)}), 400
+    except QueueFullError:
+        return jsonify({"error": "Server busy, please retry"}), 503
     except Exception as e:
         print("❌ Error during single-day prediction:", e)
+        metrics.inc("prediction_errors_total", route="/api/predict/solarpower")
         return jsonify({"error": "Prediction failed", "details": str(e)}), 500
 
 
 @app.route("/api/predict/solarpowerforecast", methods=["POST"])
 def predict_multiple_days():
-    if not os.path.exists(MODEL_PATH) or not os.path.exists(SCALER_PATH) or not os.path.exists(FEATURE_PATH):
+    bundle = registry.get()
+    if bundle is None:
         return jsonify({"error": "Model not trained yet. Please run trainmodel.py first."}), 400
 
-    model = joblib.load(MODEL_PATH)
-    scaler = joblib.load(SCALER_PATH)
-    feature_columns = pd.read_csv(FEATURE_PATH).columns.tolist()
-
     payload = request.get_json()
     if not isinstance(payload, list) or len(payload) == 0:
         return jsonify({"error": "Request body must be a non-empty JSON array"}), 400
 
-    predictions = []
-
     try:
-        for day_data in payload:
-            missing = [f for f in feature_columns if f not in day_data]
-            if missing:
-                return jsonify({"error": f"Missing fields: {', '.join(missing)}"}), 400
-            
-            df_input = pd.DataFrame([{col: day_data[col] for col in feature_columns}])
-            scaled_features = scaler.transform(df_input)
-            predicted_kw = float(model.predict(scaled_features)[0])
-
-            predictions.append({
-                "input": day_data,
-                "predicted_power_kW": round(predicted_kw, 3)
-            })
-
-        return jsonify({"predictions": predictions}), 200
+        predictions, errors = predict_batch(bundle, payload)
+        if len(errors) == len(payload):
+            return jsonify({"error": "No valid rows in request", "errors": errors}), 400
+
+        return jsonify({"predictions": predictions, "errors": errors}), 200
 
     except Exception as e:
         print("❌ Error predicting solar power:", e)
+        metrics.inc("prediction_errors_total", route="/api/predict/solarpowerforecast")
+        return jsonify({"error": "Prediction failed", "details": str(e)}), 500
+
+
+# HOURLY CURVE OF ONE DAY (eight 3-hour periods, one predict call)
+@app.route("/api/predict/solarpower/hourly", methods=["POST"])
+def predict_hourly_curve():
+    bundle = hourly_registry.get()
+    geometry = solar_geometry()
+    if bundle is None or geometry is None:
+        return jsonify({"error": "Hourly model not trained yet. Please run train_model.py --hourly first."}), 400
+
+    data = request.get_json()
+    if not isinstance(data, dict) or not data:
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+
+    try:
+        return jsonify(predict_day_curve(bundle, data, geometry)), 200
+    except HourlyInputError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print("❌ Error during hourly prediction:", e)
+        metrics.inc("prediction_errors_total", route="/api/predict/solarpower/hourly")
         return jsonify({"error": "Prediction failed", "details": str(e)}), 500
 
 
@@ -304,26 +383,28 @@ def verify_email(user_id):
         return jsonify({"message": "OTP is required"}), 400
 
     try:
-        user = users_collection.find_one({"_id": ObjectId(user_id)})
+        oid = ObjectId(user_id)
     except Exception:
         return jsonify({"message": "Invalid user ID"}), 400
 
+    now = datetime.datetime.utcnow()
+    user = users_collection.find_one_and_update(
+        {"_id": oid, "isverified": False, "otp": otp, "otpExpiry": {"$gte": now}},
+        {"$set": {"isverified": True, "otp": None, "otpExpiry": None}},
+        projection=VERIFY_EMAIL_FIELDS
+    )
     if not user:
-        return jsonify({"message": "User not found"}), 404
-    if user.get("isverified"):
-        return jsonify({"message": "User already verified"}), 400
-    if not user.get("otp"):
-        return jsonify({"message": "No OTP found. Please resend OTP"}), 400
-    if datetime.datetime.utcnow() > user["otpExpiry"]:
-        return jsonify({"message": "OTP expired. Please resend OTP"}), 400
-    if user["otp"] != otp:
+        user = users_collection.find_one({"_id": oid}, VERIFY_EMAIL_FIELDS)
+        if not user:
+            return jsonify({"message": "User not found"}), 404
+        if user.get("isverified"):
+            return jsonify({"message": "User already verified"}), 400
+        if not user.get("otp"):
+            return jsonify({"message": "No OTP found. Please resend OTP"}), 400
+        if now > user["otpExpiry"]:
+            return jsonify({"message": "OTP expired. Please resend OTP"}), 400
         return jsonify({"message": "Invalid OTP"}), 400
 
-    users_collection.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$set": {"isverified": True, "otp": None, "otpExpiry": None}}
-    )
-
     return jsonify({
         "message": "Email verified successfully!",
         "user": {
@@ -343,18 +424,21 @@ def signin():
         return jsonify({"message": "Please enter all required fields"}), 400
 
     try:
-        user = users_collection.find_one({"email": email})
+        user = users_collection.find_one({"email": email}, SIGNIN_FIELDS)
         if not user:
             return jsonify({"message": "User does not exist"}), 401
 
         if not user.get("isverified", "false"):
-            users_collection.delete_one({"email": email})
+            users_collection.delete_one({"_id": user["_id"], "isverified": False})
             return jsonify({
                 "message": "Email not verified. Please sign up again."
             }), 403  
 
-        if not bcrypt.check_password_hash(user["password"], password):
+        ok, new_hash = password_hasher.verify_and_update(user["password"], password)
+        if not ok:
             return jsonify({"message": "Invalid credentials"}), 401
+        if new_hash:
+            users_collection.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
 
         return jsonify({
             "message": "Login successful",
@@ -366,6 +450,8 @@ def signin():
             }
         }), 200
 
+    except HasherBusyError:
+        return jsonify({"message": "Server busy, please retry"}), 503
     except Exception as e:
         print("Error during signin:", e)
         return jsonify({"message": "Server error"}), 500
@@ -380,7 +466,9 @@ def delete_unverified_user():
         return jsonify({"message": "Email is required"}), 400
 
     try:
-        result = users_collection.find_one_and_delete({"email": email, "isverified": False})
+        result = users_collection.find_one_and_delete(
+            {"email": email, "isverified": False}, projection=EXISTS_FIELDS
+        )
 
         if not result:
             return jsonify({"message": "No unverified user found with this email"}), 404
@@ -399,16 +487,15 @@ def forgot_password():
     email = data.get("email")
     if not email:
         return jsonify({"message": "Email is required"}), 400
-    user = users_collection.find_one({"email": email})
-    if not user:
-        return jsonify({"message": "User not found. Please sign up first."}), 404
     otp = generate_otp()
     otp_expiry = datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
 
-    users_collection.update_one(
+    result = users_collection.update_one(
         {"email": email},
         {"$set": {"otp": otp, "otpExpiry": otp_expiry}}
     )
+    if result.matched_count == 0:
+        return jsonify({"message": "User not found. Please sign up first."}), 404
 
     try:
         send_email(email, otp, "SolarPower-ML Password Reset OTP")
@@ -423,7 +510,7 @@ def verify_forgot_otp():
     data = request.get_json()
     email, otp = data.get("email"), data.get("otp")
 
-    user = users_collection.find_one({"email": email})
+    user = users_collection.find_one({"email": email}, OTP_FIELDS)
     if not user:
         return jsonify({"message": "User not found"}), 404
 
@@ -438,21 +525,36 @@ def verify_forgot_otp():
 def reset_password():
     data = request.get_json()
     email, otp, password = data.get("email"), data.get("otp"), data.get("password")
-
-    user = users_collection.find_one({"email": email})
+    if not email or not otp or not isinstance(password, str) or not password:
+        return jsonify({"message": "Email, OTP and new password are required"}), 400
+
+    # Claim the OTP first with one conditional update: concurrent resets with
+    # the same OTP cannot both succeed, and only the winner pays for bcrypt.
+    now = datetime.datetime.utcnow()
+    user = users_collection.find_one_and_update(
+        {"email": email, "otp": otp, "otpExpiry": {"$gte": now}},
+        {"$set": {"otp": None, "otpExpiry": None}},
+        projection=OTP_FIELDS
+    )
     if not user:
-        return jsonify({"message": "User not found"}), 404
-    if user.get("otp") != otp:
-        return jsonify({"message": "Invalid OTP"}), 400
-    if datetime.datetime.utcnow() > user["otpExpiry"]:
+        user = users_collection.find_one({"email": email}, OTP_FIELDS)
+        if not user:
+            return jsonify({"message": "User not found"}), 404
+        if user.get("otp") != otp:
+            return jsonify({"message": "Invalid OTP"}), 400
         return jsonify({"message": "OTP expired"}), 400
 
-    hashed_pw = bcrypt.generate_password_hash(password).decode("utf-8")
-    users_collection.update_one(
-        {"email": email},
-        {"$set": {"password": hashed_pw, "otp": None, "otpExpiry": None}}
-    )
-
+    try:
+        hashed_pw = password_hasher.hash(password)
+    except HasherBusyError:
+        # Hand the OTP back, unless a new one was sent meanwhile, so the user can retry with it.
+        users_collection.update_one(
+            {"_id": user["_id"], "otp": None},
+            {"$set": {"otp": otp, "otpExpiry": user["otpExpiry"]}}
+        )
+        return jsonify({"message": "Server busy, please retry"}), 503
+
+    users_collection.update_one({"_id": user["_id"]}, {"$set": {"password": hashed_pw}})
     return jsonify({"message": "Password reset successful"}), 200
 
 if __name__ == "__main__":
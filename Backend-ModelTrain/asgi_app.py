@@ -0,0 +1,579 @@
+"""Asyncio-native entry point serving the prediction and auth routes of app.py.
+
+Mongo calls go through pymongo's async client, OTP emails are queued for
+background delivery, bcrypt runs on the password hasher's bounded pool
+and forest inference runs on its own thread pool, so a slow database or
+mail server never holds up prediction requests.
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 8000 --workers 2
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import datetime
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from bson.objectid import ObjectId
+from dotenv import load_dotenv
+from pymongo import AsyncMongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+from model_registry import registry
+from inference import predict_batch, predict_row, micro_batcher, InvalidFeatureError
+from hourly_model import hourly_registry, solar_geometry, predict_day_curve, HourlyInputError
+from micro_batcher import QueueFullError
+from prediction_cache import prediction_cache
+from mail_queue import mail_queue_from_env, otp_email_html
+from mongo_connection import mongo_options_from_env, MongoCommandTimer, DB_NAME
+from metrics import metrics, mark_stage
+from user_store import (ensure_user_indexes_async, RESEND_OTP_FIELDS, VERIFY_EMAIL_FIELDS,
+                        SIGNIN_FIELDS, EXISTS_FIELDS, OTP_FIELDS)
+from password_hasher import password_hasher_from_env, HasherBusyError
+
+load_dotenv()
+
+prediction_cache.max_entries = int(os.environ.get("PREDICTION_CACHE_SIZE", 10000))
+prediction_cache.ttl_seconds = float(os.environ.get("PREDICTION_CACHE_TTL", 3600))
+
+micro_batcher.enabled = os.environ.get("MICRO_BATCH", "0") == "1"
+micro_batcher.max_batch = int(os.environ.get("MICRO_BATCH_MAX_ROWS", 64))
+micro_batcher.max_wait_ms = float(os.environ.get("MICRO_BATCH_WINDOW_MS", 2))
+micro_batcher.max_queue = int(os.environ.get("MICRO_BATCH_MAX_QUEUE", 1024))
+
+mail_queue = mail_queue_from_env()
+password_hasher = password_hasher_from_env()
+metrics.gauge("password_hasher_in_flight", lambda: password_hasher.in_flight, "bcrypt jobs running or queued")
+metrics.gauge("prediction_cache_entries", lambda: prediction_cache.stats()["entries"], "cached predictions")
+metrics.gauge("mail_queue_depth", mail_queue.depth, "OTP emails waiting for delivery")
+registry.lazy = hourly_registry.lazy = os.environ.get("FAST_START", "0") == "1"
+registry.forest_only = hourly_registry.forest_only = os.environ.get("SHARED_MODEL", "0") == "1"
+
+inference_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("INFERENCE_THREADS", os.cpu_count() or 1)),
+    thread_name_prefix="inference",
+)
+
+# Set in lifespan(): the async client must be created inside the worker's event loop.
+mongo_client = None
+users_collection = None
+
+
+def generate_otp():
+    """Generate a random 6-digit OTP"""
+    return str(random.randint(100000, 999999))
+
+
+async def send_email(to_email, otp, subject):
+    """Queue OTP Email for background delivery"""
+    await asyncio.to_thread(mail_queue.enqueue, to_email, subject, otp_email_html(otp, subject))
+
+
+async def hash_password(password):
+    # The hasher's own pool bounds the bcrypt work; this thread only waits on it.
+    return await asyncio.to_thread(password_hasher.hash, password)
+
+
+async def verify_password(pw_hash, password):
+    return await asyncio.to_thread(password_hasher.verify_and_update, pw_hash, password)
+
+
+class EchoJSONResponse(JSONResponse):
+    """JSONResponse that, like Flask's jsonify, writes NaN/Infinity echoed back from a request body"""
+
+    def render(self, content):
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+async def run_inference(fn, *args):
+    loop = asyncio.get_running_loop()
+    # Run in a copy of this task's context so stage marks reach its request clock.
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(inference_pool, ctx.run, fn, *args)
+
+
+async def read_json(request):
+    """Request body as JSON, or None if it is missing or malformed"""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+    finally:
+        mark_stage("parse")
+
+
+def parse_object_id(user_id):
+    try:
+        return ObjectId(user_id)
+    except Exception:
+        return None
+
+
+async def home(request):
+    return JSONResponse({"message": "☀️ SolarPower-ML ASGI API (Auth + ML) is Running!"})
+
+
+async def healthz(request):
+    """Health check: pings Mongo through the worker's pool and reports whether a model is loaded"""
+    mongo_health = {"ok": False, "pool": mongo_options_from_env(), "pid": os.getpid()}
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(mongo_client.admin.command("ping"), timeout=2.0)
+        mongo_health["ok"] = True
+    except (PyMongoError, asyncio.TimeoutError) as e:
+        mongo_health["error"] = str(e)[:200] or "ping timed out"
+    mongo_health["ping_ms"] = round((time.perf_counter() - start) * 1000, 3)
+    model_loaded = registry.get() is not None
+    ok = mongo_health["ok"] and model_loaded
+    return JSONResponse({"ok": ok, "mongo": mongo_health, "model_loaded": model_loaded}, 200 if ok else 503)
+
+
+async def prometheus_metrics(request):
+    """Request, stage, Mongo, bcrypt and SMTP latency histograms in Prometheus text format"""
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+async def model_status(request):
+    """Report the loaded model version, how long it took to load and cache usage"""
+    return JSONResponse({
+        **registry.status(),
+        "hourly": hourly_registry.status(),
+        "prediction_cache": prediction_cache.stats(),
+        "micro_batcher": micro_batcher.stats(),
+    })
+
+
+async def mail_status(request):
+    """Report outbox depth, delivery counters and SMTP send latency"""
+    return JSONResponse(await asyncio.to_thread(mail_queue.stats))
+
+
+async def auth_status(request):
+    """Report password hashing load and admission rejections"""
+    return JSONResponse(password_hasher.stats())
+
+
+async def predict_single_day(request):
+    bundle = registry.get()
+    if bundle is None:
+        return JSONResponse({"error": "Model not trained yet. Please run trainmodel.py first."}, 400)
+    feature_columns = bundle.feature_columns
+
+    data = await read_json(request)
+    if not data:
+        return JSONResponse({"error": "No JSON data received"}, 400)
+
+    missing = [f for f in feature_columns if f not in data]
+    if missing:
+        return JSONResponse({"error": f"Missing fields: {', '.join(missing)}"}, 400)
+
+    try:
+        predicted_kw = await run_inference(predict_row, bundle, {col: data[col] for col in feature_columns})
+
+        return EchoJSONResponse({
+            "predicted_power_kW": round(predicted_kw, 3),
+            "input_used": data
+        })
+
+    except InvalidFeatureError as e:
+        return JSONResponse({"error": str(e)}, 400)
+    except QueueFullError:
+        return JSONResponse({"error": "Server busy, please retry"}, 503)
+    except Exception as e:
+        print("❌ Error during single-day prediction:", e)
+        metrics.inc("prediction_errors_total", route="/api/predict/solarpower")
+        return JSONResponse({"error": "Prediction failed", "details": str(e)}, 500)
+
+
+async def predict_multiple_days(request):
+    bundle = registry.get()
+    if bundle is None:
+        return JSONResponse({"error": "Model not trained yet. Please run trainmodel.py first."}, 400)
+
+    payload = await read_json(request)
+    if not isinstance(payload, list) or len(payload) == 0:
+        return JSONResponse({"error": "Request body must be a non-empty JSON array"}, 400)
+
+    try:
+        predictions, errors = await run_inference(predict_batch, bundle, payload)
+        if len(errors) == len(payload):
+            return EchoJSONResponse({"error": "No valid rows in request", "errors": errors}, 400)
+
+        return EchoJSONResponse({"predictions": predictions, "errors": errors})
+
+    except Exception as e:
+        print("❌ Error predicting solar power:", e)
+        metrics.inc("prediction_errors_total", route="/api/predict/solarpowerforecast")
+        return JSONResponse({"error": "Prediction failed", "details": str(e)}, 500)
+
+
+async def predict_hourly_curve(request):
+    bundle = hourly_registry.get()
+    geometry = solar_geometry()
+    if bundle is None or geometry is None:
+        return JSONResponse({"error": "Hourly model not trained yet. Please run train_model.py --hourly first."}, 400)
+
+    data = await read_json(request)
+    if not isinstance(data, dict) or not data:
+        return JSONResponse({"error": "Request body must be a JSON object"}, 400)
+
+    try:
+        return JSONResponse(await run_inference(predict_day_curve, bundle, data, geometry))
+    except HourlyInputError as e:
+        return JSONResponse({"error": str(e)}, 400)
+    except Exception as e:
+        print("❌ Error during hourly prediction:", e)
+        metrics.inc("prediction_errors_total", route="/api/predict/solarpower/hourly")
+        return JSONResponse({"error": "Prediction failed", "details": str(e)}, 500)
+
+
+async def signup(request):
+    data = await read_json(request) or {}
+    fullname = data.get("fullname")
+    email = data.get("email")
+    password = data.get("password")
+
+    if not fullname or not email or not password:
+        return JSONResponse({"message": "Please fill all required fields"}, 400)
+
+    try:
+        hashed_pw = await hash_password(password)
+    except HasherBusyError:
+        return JSONResponse({"message": "Server busy, please retry"}, 503)
+
+    otp = generate_otp()
+    otp_expiry = datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
+
+    new_user = {
+        "fullname": fullname,
+        "email": email,
+        "password": hashed_pw,
+        "isverified": False,
+        "otp": otp,
+        "otpExpiry": otp_expiry
+    }
+    # One round trip: replaces an earlier unverified signup for this email or
+    # inserts a new user, and the unique email index rejects the insert when
+    # a verified user already has the address.
+    try:
+        user = await users_collection.find_one_and_replace(
+            {"email": email, "isverified": False}, new_user,
+            projection=EXISTS_FIELDS, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        return JSONResponse({"message": "User already exists"}, 400)
+    user_id = str(user["_id"])
+
+    try:
+        await send_email(email, otp, "Verify your SolarPower-ML Account")
+    except Exception as e:
+        print("❌ Email send failed:", e)
+        return JSONResponse({"message": "Failed to send OTP email"}, 500)
+
+    return JSONResponse({
+        "message": "User registered successfully. OTP sent to email.",
+        "user": {"id": user_id, "fullname": fullname, "email": email}
+    }, 201)
+
+
+async def resend_otp(request):
+    oid = parse_object_id(request.path_params["user_id"])
+    if oid is None:
+        return JSONResponse({"message": "Invalid user ID"}, 400)
+
+    otp = generate_otp()
+    otp_expiry = datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
+
+    user = await users_collection.find_one_and_update(
+        {"_id": oid, "isverified": False},
+        {"$set": {"otp": otp, "otpExpiry": otp_expiry}},
+        projection=RESEND_OTP_FIELDS
+    )
+    if not user:
+        # Only a failed update pays for a second lookup, to say why it failed.
+        if await users_collection.find_one({"_id": oid}, EXISTS_FIELDS):
+            return JSONResponse({"message": "User already verified"}, 400)
+        return JSONResponse({"message": "User not found"}, 404)
+
+    try:
+        await send_email(user["email"], otp, "Resend: Verify your SolarPower-ML Account")
+    except Exception as e:
+        print("❌ Email send failed:", e)
+        return JSONResponse({"message": "Failed to resend OTP"}, 500)
+
+    return JSONResponse({"message": "OTP resent successfully"})
+
+
+async def verify_email(request):
+    data = await read_json(request) or {}
+    otp = data.get("otp")
+
+    if not otp:
+        return JSONResponse({"message": "OTP is required"}, 400)
+
+    oid = parse_object_id(request.path_params["user_id"])
+    if oid is None:
+        return JSONResponse({"message": "Invalid user ID"}, 400)
+
+    now = datetime.datetime.utcnow()
+    user = await users_collection.find_one_and_update(
+        {"_id": oid, "isverified": False, "otp": otp, "otpExpiry": {"$gte": now}},
+        {"$set": {"isverified": True, "otp": None, "otpExpiry": None}},
+        projection=VERIFY_EMAIL_FIELDS
+    )
+    if not user:
+        user = await users_collection.find_one({"_id": oid}, VERIFY_EMAIL_FIELDS)
+        if not user:
+            return JSONResponse({"message": "User not found"}, 404)
+        if user.get("isverified"):
+            return JSONResponse({"message": "User already verified"}, 400)
+        if not user.get("otp"):
+            return JSONResponse({"message": "No OTP found. Please resend OTP"}, 400)
+        if now > user["otpExpiry"]:
+            return JSONResponse({"message": "OTP expired. Please resend OTP"}, 400)
+        return JSONResponse({"message": "Invalid OTP"}, 400)
+
+    return JSONResponse({
+        "message": "Email verified successfully!",
+        "user": {
+            "id": str(user["_id"]),
+            "fullname": user["fullname"],
+            "email": user["email"]
+        }
+    })
+
+
+async def signin(request):
+    data = await read_json(request) or {}
+    email = data.get("email")
+    password = data.get("password")
+
+    if not email or not password:
+        return JSONResponse({"message": "Please enter all required fields"}, 400)
+
+    try:
+        user = await users_collection.find_one({"email": email}, SIGNIN_FIELDS)
+        if not user:
+            return JSONResponse({"message": "User does not exist"}, 401)
+
+        if not user.get("isverified", "false"):
+            await users_collection.delete_one({"_id": user["_id"], "isverified": False})
+            return JSONResponse({
+                "message": "Email not verified. Please sign up again."
+            }, 403)
+
+        ok, new_hash = await verify_password(user["password"], password)
+        if not ok:
+            return JSONResponse({"message": "Invalid credentials"}, 401)
+        if new_hash:
+            await users_collection.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
+
+        return JSONResponse({
+            "message": "Login successful",
+            "user": {
+                "id": str(user["_id"]),
+                "fullname": user.get("fullname"),
+                "email": user.get("email"),
+                "phonenumber": user.get("phonenumber", "")
+            }
+        })
+
+    except HasherBusyError:
+        return JSONResponse({"message": "Server busy, please retry"}, 503)
+    except Exception as e:
+        print("Error during signin:", e)
+        return JSONResponse({"message": "Server error"}, 500)
+
+
+async def delete_unverified_user(request):
+    data = await read_json(request) or {}
+    email = data.get("email")
+
+    if not email:
+        return JSONResponse({"message": "Email is required"}, 400)
+
+    try:
+        result = await users_collection.find_one_and_delete(
+            {"email": email, "isverified": False}, projection=EXISTS_FIELDS
+        )
+
+        if not result:
+            return JSONResponse({"message": "No unverified user found with this email"}, 404)
+
+        return JSONResponse({"message": "Unverified user deleted successfully"})
+
+    except Exception as e:
+        print("Error deleting unverified user:", e)
+        return JSONResponse({"message": "Server error"}, 500)
+
+
+async def forgot_password(request):
+    data = await read_json(request) or {}
+    email = data.get("email")
+    if not email:
+        return JSONResponse({"message": "Email is required"}, 400)
+    otp = generate_otp()
+    otp_expiry = datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
+
+    result = await users_collection.update_one(
+        {"email": email},
+        {"$set": {"otp": otp, "otpExpiry": otp_expiry}}
+    )
+    if result.matched_count == 0:
+        return JSONResponse({"message": "User not found. Please sign up first."}, 404)
+
+    try:
+        await send_email(email, otp, "SolarPower-ML Password Reset OTP")
+    except Exception as e:
+        print("❌ Email send failed:", e)
+        return JSONResponse({"message": "Failed to send OTP email"}, 500)
+
+    return JSONResponse({"message": "Password reset OTP sent successfully"})
+
+
+async def verify_forgot_otp(request):
+    data = await read_json(request) or {}
+    email, otp = data.get("email"), data.get("otp")
+
+    user = await users_collection.find_one({"email": email}, OTP_FIELDS)
+    if not user:
+        return JSONResponse({"message": "User not found"}, 404)
+
+    if user.get("otp") != otp:
+        return JSONResponse({"message": "Invalid OTP"}, 400)
+    if datetime.datetime.utcnow() > user["otpExpiry"]:
+        return JSONResponse({"message": "OTP expired"}, 400)
+
+    return JSONResponse({"message": "OTP verified"})
+
+
+async def reset_password(request):
+    data = await read_json(request) or {}
+    email, otp, password = data.get("email"), data.get("otp"), data.get("password")
+    if not email or not otp or not isinstance(password, str) or not password:
+        return JSONResponse({"message": "Email, OTP and new password are required"}, 400)
+
+    # Claim the OTP first with one conditional update: concurrent resets with
+    # the same OTP cannot both succeed, and only the winner pays for bcrypt.
+    now = datetime.datetime.utcnow()
+    user = await users_collection.find_one_and_update(
+        {"email": email, "otp": otp, "otpExpiry": {"$gte": now}},
+        {"$set": {"otp": None, "otpExpiry": None}},
+        projection=OTP_FIELDS
+    )
+    if not user:
+        user = await users_collection.find_one({"email": email}, OTP_FIELDS)
+        if not user:
+            return JSONResponse({"message": "User not found"}, 404)
+        if user.get("otp") != otp:
+            return JSONResponse({"message": "Invalid OTP"}, 400)
+        return JSONResponse({"message": "OTP expired"}, 400)
+
+    try:
+        hashed_pw = await hash_password(password)
+    except HasherBusyError:
+        # Hand the OTP back, unless a new one was sent meanwhile, so the user can retry with it.
+        await users_collection.update_one(
+            {"_id": user["_id"], "otp": None},
+            {"$set": {"otp": otp, "otpExpiry": user["otpExpiry"]}}
+        )
+        return JSONResponse({"message": "Server busy, please retry"}, 503)
+
+    await users_collection.update_one({"_id": user["_id"]}, {"$set": {"password": hashed_pw}})
+    return JSONResponse({"message": "Password reset successful"})
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    global mongo_client, users_collection
+    mongo_client = AsyncMongoClient(os.environ.get("MONGO_URI"), event_listeners=[MongoCommandTimer()],
+                                    **mongo_options_from_env())
+    users_collection = mongo_client[os.environ.get("MONGO_DB", DB_NAME)]["users"]
+    # Awaited before serving: signup relies on the unique email index.
+    await ensure_user_indexes_async(users_collection)
+    mail_queue.start()
+
+    print("Attempting to load model files...")
+    if registry.get() is None:
+        print("❌ Model files missing. Please run 'trainmodel.py' first.")
+    else:
+        print("✅ Model, Scaler, and Feature Columns Loaded")
+    if hourly_registry.get() is None:
+        print("⚠️ Hourly model files missing. Run 'train_model.py --hourly --fused' to enable the hourly route.")
+
+    try:
+        yield
+    finally:
+        await mongo_client.close()
+        inference_pool.shutdown(wait=False)
+        mail_queue.stop()
+
+
+routes = [
+    Route("/", home, methods=["GET"]),
+    Route("/healthz", healthz, methods=["GET"]),
+    Route("/metrics", prometheus_metrics, methods=["GET"]),
+    Route("/api/model/status", model_status, methods=["GET"]),
+    Route("/api/mail/status", mail_status, methods=["GET"]),
+    Route("/api/auth/status", auth_status, methods=["GET"]),
+    Route("/api/predict/solarpower", predict_single_day, methods=["POST"]),
+    Route("/api/predict/solarpowerforecast", predict_multiple_days, methods=["POST"]),
+    Route("/api/predict/solarpower/hourly", predict_hourly_curve, methods=["POST"]),
+    Route("/api/signup", signup, methods=["POST"]),
+    Route("/api/signup/resend-otp/{user_id:str}", resend_otp, methods=["GET"]),
+    Route("/api/signup/verify/{user_id:str}", verify_email, methods=["POST"]),
+    Route("/api/signin", signin, methods=["POST"]),
+    Route("/api/signin/emailnotverified", delete_unverified_user, methods=["DELETE"]),
+    Route("/api/signin/forgotpassword/auth", forgot_password, methods=["POST"]),
+    Route("/api/signin/forgotpassword/verify", verify_forgot_otp, methods=["POST"]),
+    Route("/api/signin/forgotpassword/reset", reset_password, methods=["PATCH"]),
+]
+
+
+class RequestTimerMiddleware:
+    """Times each request and its stages, labelled with the matched route's path template"""
+
+    def __init__(self, app):
+        self.app = app
+        self.route_paths = {route.endpoint: route.path for route in routes}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = metrics.start_request()
+        if token is None:
+            return await self.app(scope, receive, send)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            mark_stage("handler")
+            # The router adds the matched endpoint to this same scope dict.
+            route = self.route_paths.get(scope.get("endpoint"), "unmatched")
+            metrics.finish_request(token, scope["method"], route, status)
+
+
+app = Starlette(
+    routes=routes,
+    middleware=[Middleware(RequestTimerMiddleware),
+                Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])],
+    lifespan=lifespan,
+)
+
+if __name__ == "__main__":
+    import uvicorn
+    port = int(os.environ.get("PORT", 8000))
+    uvicorn.run(app, host="0.0.0.0", port=port)
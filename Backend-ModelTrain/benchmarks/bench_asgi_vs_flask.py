@@ -0,0 +1,147 @@
+"""Load test: requests/sec and p99 latency of the Flask app vs asgi_app.
+
+Starts each server on the same machine (gunicorn sync workers for app.py,
+uvicorn for asgi_app.py), drives it with a fixed number of concurrent
+keep-alive clients for a fixed time and prints throughput and latency.
+
+Run from Backend-ModelTrain:
+    python -m benchmarks.bench_asgi_vs_flask --workers 2 --concurrency 32 --duration 15
+
+--signin-ratio mixes in /api/signin calls for an unknown email, which
+cost one Mongo lookup each; it needs MONGO_URI pointing at a server.
+The load generator shares the CPU with the server, so compare runs made
+on the same machine only.
+"""
+import sys
+import json
+import time
+import argparse
+import threading
+import subprocess
+import http.client
+import numpy as np
+
+SERVERS = {
+    "flask": lambda port, workers: ["gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}",
+                                    "--log-level", "warning", "app:app"],
+    "asgi": lambda port, workers: ["uvicorn", "asgi_app:app", "--host", "127.0.0.1", "--port", str(port),
+                                   "--workers", str(workers), "--log-level", "warning"],
+}
+
+SAMPLE_ROW = {
+    "Month": 9, "Day": 1, "Is Daylight": 1, "Average Temperature (Day)": 69,
+    "Average Wind Direction (Day)": 28, "Average Wind Speed (Day)": 7.5, "Sky Cover": 0,
+    "Visibility": 10, "Relative Humidity": 47.6, "Average Barometric Pressure (Period)": 29.86,
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--servers", nargs="+", default=list(SERVERS), choices=list(SERVERS))
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--endpoint", choices=["single", "forecast"], default="single")
+    parser.add_argument("--forecast-days", type=int, default=7)
+    parser.add_argument("--signin-ratio", type=float, default=0.0)
+    parser.add_argument("--port", type=int, default=8765)
+    return parser.parse_args()
+
+
+def build_requests(args):
+    if args.endpoint == "single":
+        predict = ("POST", "/api/predict/solarpower", json.dumps(SAMPLE_ROW))
+    else:
+        rows = [dict(SAMPLE_ROW, Day=d + 1) for d in range(args.forecast_days)]
+        predict = ("POST", "/api/predict/solarpowerforecast", json.dumps(rows))
+    signin = ("POST", "/api/signin", json.dumps({"email": "loadtest@example.invalid", "password": "x"}))
+    return predict, signin
+
+
+def wait_until_ready(port, proc, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Server exited with code {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/")
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("Server did not start in time")
+
+
+def client_loop(port, predict, signin, signin_ratio, deadline, seed, results):
+    rng = np.random.default_rng(seed)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    latencies, errors = [], 0
+    headers = {"Content-Type": "application/json"}
+    while time.monotonic() < deadline:
+        method, path, body = signin if rng.random() < signin_ratio else predict
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            continue
+        latencies.append(time.perf_counter() - start)
+    conn.close()
+    results.append((latencies, errors))
+
+
+def run_load(args, port):
+    predict, signin = build_requests(args)
+    results = []
+    deadline = time.monotonic() + args.duration
+    threads = [threading.Thread(target=client_loop,
+                                args=(port, predict, signin, args.signin_ratio, deadline, i, results))
+               for i in range(args.concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([lat for lats, _ in results for lat in lats]) * 1000
+    errors = sum(e for _, e in results)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies, 50)) if len(latencies) else float("nan"),
+        "p99_ms": float(np.percentile(latencies, 99)) if len(latencies) else float("nan"),
+    }
+
+
+def bench_server(name, args):
+    proc = subprocess.Popen(SERVERS[name](args.port, args.workers), stdout=subprocess.DEVNULL)
+    try:
+        wait_until_ready(args.port, proc)
+        return run_load(args, args.port)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+
+
+def main():
+    args = parse_args()
+    print(f"endpoint={args.endpoint} workers={args.workers} concurrency={args.concurrency} "
+          f"duration={args.duration}s signin_ratio={args.signin_ratio}")
+    print(f"{'server':>7} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}")
+    for name in args.servers:
+        r = bench_server(name, args)
+        print(f"{name:>7} {r['requests']:>9} {r['errors']:>7} {r['rps']:>9.1f} {r['p50_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Throughput and peak memory of bulk_score.py on generated weather files.
+
+Writes files of N daily rows (days drawn from Solar_Power_Prediction.csv's
+daily aggregates with their weather columns jittered by 5%) as CSV and
+Parquet into --dir, then scores each with every --workers setting in a
+fresh interpreter and reports rows per minute and the peak RSS of the
+scoring process and of its largest worker. Peak memory should stay flat
+as N grows, since only a few chunks are ever held at once.
+
+Run from Backend-ModelTrain:
+    python -m benchmarks.bench_bulk_score --rows 1000000 4000000 --workers 1 4
+"""
+import os
+import sys
+import json
+import argparse
+import warnings
+import subprocess
+import numpy as np
+
+PROBE = """
+import json, resource, warnings
+warnings.filterwarnings("ignore")
+from bulk_score import score_file
+rows, invalid, seconds = score_file({input!r}, {output!r}, chunksize={chunksize}, workers={workers},
+                                    keep={keep!r}, forest_only={forest_only})
+print(json.dumps({{"rows": rows, "invalid": invalid, "seconds": seconds,
+                  "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "worker_max_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024}}))
+"""
+
+
+def generate(path, n_rows, seed=0, block=250_000):
+    """Write n_rows jittered daily rows to path (CSV or Parquet), block by block"""
+    warnings.filterwarnings("ignore")
+    from ingest import DATA_PATH, load_daily_power
+    from model_registry import read_feature_columns
+    from bulk_score import is_parquet
+    feature_columns = read_feature_columns()
+    daily = load_daily_power(DATA_PATH)[["Year"] + feature_columns]
+    rng = np.random.default_rng(seed)
+    jittered = [col for col in feature_columns if col not in ("Month", "Day", "Is Daylight")]
+    writer = None
+    for start in range(0, n_rows, block):
+        part = daily.iloc[rng.integers(0, len(daily), min(block, n_rows - start))].reset_index(drop=True)
+        part[jittered] = (part[jittered] * rng.normal(1.0, 0.05, (len(part), len(jittered)))).round(3)
+        if is_parquet(path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(part, preserve_index=False)
+            writer = writer or pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+        else:
+            part.to_csv(path, mode="w" if start == 0 else "a", header=start == 0, index=False)
+    if writer is not None:
+        writer.close()
+
+
+def score(input_path, output_path, chunksize, workers, keep, forest_only):
+    code = PROBE.format(input=input_path, output=output_path, chunksize=chunksize, workers=workers,
+                        keep=keep, forest_only=forest_only)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=[500_000, 2_000_000])
+    parser.add_argument("--workers", type=int, nargs="+", default=sorted({1, os.cpu_count()}))
+    parser.add_argument("--formats", nargs="+", choices=["csv", "parquet"], default=["csv", "parquet"])
+    parser.add_argument("--chunksize", type=int, default=100_000)
+    parser.add_argument("--forest-only", action="store_true")
+    parser.add_argument("--dir", default="/tmp/bench_bulk_score")
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    print(f"{'rows':>9} {'format':>7} {'workers':>7} {'seconds':>8} {'rows/min':>12} {'RSS MB':>7} {'worker RSS MB':>13}")
+    for n_rows in args.rows:
+        for fmt in args.formats:
+            input_path = os.path.join(args.dir, f"weather-{n_rows}.{fmt}")
+            if not os.path.exists(input_path):
+                generate(input_path, n_rows)
+            output_path = os.path.join(args.dir, f"scored-{n_rows}.{fmt}")
+            for workers in args.workers:
+                r = score(input_path, output_path, args.chunksize, workers, ["Year", "Month", "Day"],
+                          args.forest_only)
+                assert r["rows"] == n_rows, r
+                worker_rss = f"{r['worker_max_rss_mb']:.1f}" if workers > 1 else "-"
+                print(f"{n_rows:>9} {fmt:>7} {workers:>7} {r['seconds']:>8.2f} "
+                      f"{r['rows'] / r['seconds'] * 60:>12,.0f} {r['max_rss_mb']:>7.1f} {worker_rss:>13}")
+                sys.stdout.flush()
+            os.remove(output_path)
+    print(f"Generated inputs are kept in {args.dir} for the next run")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Latency of FlatForest.predict vs RandomForestRegressor.predict.
+
+Run from Backend-ModelTrain after exporting the forest:
+    python flat_forest.py
+    python -m benchmarks.bench_flat_forest
+"""
+import time
+import warnings
+import joblib
+import numpy as np
+import pandas as pd
+from flat_forest import FlatForest, FOREST_PATH, FLAT_FOREST_MAX_BATCH, check_parity
+from model_registry import MODEL_PATH, SCALER_PATH, FEATURE_PATH
+
+BATCH_SIZES = [1, 10, 100, 512, 1000, 10000]
+
+
+def sample_inputs(n, seed=0):
+    """Resample real daily rows with a little noise so every branch gets exercised"""
+    rng = np.random.default_rng(seed)
+    base = pd.read_csv(FEATURE_PATH)
+    picked = base.sample(n=n, replace=True, random_state=seed)
+    return picked.to_numpy(dtype=np.float64) * rng.normal(1.0, 0.05, size=(n, base.shape[1]))
+
+
+def best_of(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    warnings.filterwarnings("ignore")
+    model = joblib.load(MODEL_PATH)
+    scaler = joblib.load(SCALER_PATH)
+    forest = FlatForest.load(FOREST_PATH)
+
+    print(f"{'batch':>7} {'sklearn ms':>11} {'flat ms':>9} {'speedup':>8} {'max diff':>10}  served by")
+    for n in BATCH_SIZES:
+        X = scaler.transform(pd.DataFrame(sample_inputs(n), columns=scaler.feature_names_in_))
+        max_diff = check_parity(model, forest, X)
+        repeat = 20 if n <= 1000 else 3
+        sk_ms = best_of(lambda: model.predict(X), repeat)
+        flat_ms = best_of(lambda: forest.predict(X), repeat)
+        served_by = "flat" if n <= FLAT_FOREST_MAX_BATCH else "sklearn"
+        print(f"{n:>7} {sk_ms:>11.3f} {flat_ms:>9.3f} {sk_ms / flat_ms:>7.1f}x {max_diff:>10.2g}  {served_by}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Runtime, peak memory and error of the imputation modes on synthetic hourly data.
+
+Run from Backend-ModelTrain:
+    python -m benchmarks.bench_imputation --sizes 10000 100000 1000000 10000000
+
+The brute-force KNNImputer is only run up to --knn-max-rows, past that its
+pairwise distance pass is impractical. Errors are mean absolute error in W
+against the values that were masked out, and against KNNImputer's output
+where it ran.
+"""
+import argparse
+import time
+import tracemalloc
+import warnings
+import numpy as np
+import pandas as pd
+from imputation import impute_numeric, IMPUTE_METHODS
+
+PERIOD_HOURS = [1, 4, 7, 10, 13, 16, 19, 22]
+
+
+def synthetic_hourly(n_rows, missing_rate=0.07, seed=0):
+    """Hourly-like frame shaped like Solar_Power_Prediction.csv, plus the true masked values"""
+    rng = np.random.default_rng(seed)
+    n_days = -(-n_rows // len(PERIOD_HOURS))
+    days = pd.date_range("2008-09-01", periods=n_days, freq="D")
+
+    df = pd.DataFrame({
+        "Year": np.repeat(days.year, len(PERIOD_HOURS))[:n_rows],
+        "Month": np.repeat(days.month, len(PERIOD_HOURS))[:n_rows],
+        "Day": np.repeat(days.day, len(PERIOD_HOURS))[:n_rows],
+        "First Hour of Period": np.tile(PERIOD_HOURS, n_days)[:n_rows],
+    })
+    noon_distance = np.abs(df["First Hour of Period"].to_numpy() + 1.5 - 12) / 12
+    daily_temp = np.repeat(rng.normal(60, 12, n_days), len(PERIOD_HOURS))[:n_rows]
+    sky_cover = rng.integers(0, 5, n_rows)
+
+    df["Is Daylight"] = (noon_distance < 0.6).astype(int)
+    df["Distance to Solar Noon"] = noon_distance
+    df["Average Temperature (Day)"] = daily_temp
+    df["Sky Cover"] = sky_cover
+    df["Relative Humidity"] = np.clip(rng.normal(70, 15, n_rows), 10, 100)
+    power = df["Is Daylight"] * np.clip(1 - noon_distance, 0, 1) * (5 - sky_cover) * 6000
+    df["Power Generated"] = np.maximum(power + rng.normal(0, 500, n_rows), 0) * df["Is Daylight"]
+
+    mask = (df["Is Daylight"] == 1).to_numpy() & (rng.random(n_rows) < missing_rate)
+    truth = df.loc[mask, "Power Generated"].to_numpy()
+    df.loc[mask, "Power Generated"] = np.nan
+    return df, mask, truth
+
+
+def run(method, df, mask):
+    frame = df.copy()
+    tracemalloc.start()
+    start = time.perf_counter()
+    impute_numeric(frame, method=method, n_neighbors=3)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 2**20, frame.loc[mask, "Power Generated"].to_numpy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--knn-max-rows", type=int, default=20_000)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    print(f"{'rows':>10} {'method':>12} {'seconds':>9} {'peak MiB':>9} {'MAE truth':>10} {'MAE knn':>9}")
+    for n in args.sizes:
+        df, mask, truth = synthetic_hourly(n)
+        knn_values = None
+        for method in IMPUTE_METHODS:
+            if method == "knn" and n > args.knn_max_rows:
+                print(f"{n:>10} {method:>12} {'skipped':>9}")
+                continue
+            elapsed, peak_mib, imputed = run(method, df, mask)
+            if method == "knn":
+                knn_values = imputed
+            mae_truth = np.mean(np.abs(imputed - truth))
+            mae_knn = f"{np.mean(np.abs(imputed - knn_values)):>9.1f}" if knn_values is not None else f"{'-':>9}"
+            print(f"{n:>10} {method:>12} {elapsed:>9.3f} {peak_mib:>9.1f} {mae_truth:>10.1f} {mae_knn}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""Inference benchmark suite for the prediction endpoints, with a regression gate.
+
+Payloads are built from the daily aggregates of Solar_Power_Prediction.csv
+(the same table the model is trained on): days are drawn at random and
+their weather columns jittered by a few percent, so every row is a
+plausible day and the prediction cache (off unless --cache) cannot
+answer from earlier requests. The fixed --seed makes every run send the
+same bodies.
+
+Each scenario drives one endpoint at one batch size and concurrency for
+--duration seconds, through the Flask test client (in process, no HTTP)
+and through gunicorn on a local port, and records throughput (requests
+and rows per second), p50/p95/p99 latency and RSS (this process for the
+test client, master + workers for gunicorn). /predict and
+/api/predict/solarpower take one row, so they only vary in concurrency;
+/api/predict/solarpowerforecast runs every batch size of the grid.
+
+Results are written as JSON to --output and compared with the stored
+baseline (benchmarks/baselines/bench_inference.json). The run exits with
+status 1 when a scenario present in both loses more than --tolerance of
+its throughput or grows its RSS by more than that, grows its p95 latency
+by more than --latency-tolerance and 5 ms (tail latency is the noisiest
+number), or returns errors. Baselines are machine-specific: record one on the
+machine that runs the comparison with --update-baseline.
+
+Run from Backend-ModelTrain:
+    python -m benchmarks.bench_inference
+    python -m benchmarks.bench_inference --grid full --output inference.json
+    python -m benchmarks.bench_inference --transports client --update-baseline
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import platform
+import resource
+import threading
+import subprocess
+import http.client
+import warnings
+import numpy as np
+from benchmarks.bench_startup import smaps_rollup, children, wait_ready
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines", "bench_inference.json")
+
+SINGLE_ROW_ENDPOINTS = ["/predict", "/api/predict/solarpower"]
+FORECAST_ENDPOINT = "/api/predict/solarpowerforecast"
+
+GRIDS = {
+    "quick": {"batch_sizes": [1, 100, 1000], "concurrency": [1, 8]},
+    "full": {"batch_sizes": [1, 10, 100, 1000, 10000], "concurrency": [1, 4, 16, 64]},
+}
+
+# Columns kept as drawn: calendar fields and the daylight flag are not measurements.
+FIXED_COLUMNS = {"Month", "Day", "Is Daylight"}
+JITTER = 0.05
+BODIES_PER_SCENARIO = 8
+# p95 growth smaller than this is scheduler noise on millisecond requests, whatever the ratio.
+LATENCY_SLACK_MS = 5.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--grid", choices=list(GRIDS), default="quick")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", help="override the grid's forecast batch sizes")
+    parser.add_argument("--concurrency", type=int, nargs="+", help="override the grid's concurrency levels")
+    parser.add_argument("--transports", nargs="+", choices=["client", "server"], default=["client", "server"])
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds per scenario")
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn workers for the server transport")
+    parser.add_argument("--port", type=int, default=8126)
+    parser.add_argument("--cache", action="store_true", help="leave the prediction cache on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed relative loss of throughput / growth of RSS (default 0.25)")
+    parser.add_argument("--latency-tolerance", type=float, default=0.5,
+                        help="allowed relative growth of p95 latency (default 0.5)")
+    return parser.parse_args()
+
+
+def daily_feature_table(feature_columns):
+    """Daily aggregates of the training CSV, restricted to the model's features"""
+    from ingest import DATA_PATH, load_daily_power
+    daily = load_daily_power(DATA_PATH)
+    return daily[feature_columns].to_numpy(dtype=np.float64)
+
+
+def make_rows(table, feature_columns, n, rng):
+    picked = table[rng.integers(0, len(table), n)]
+    noise = rng.normal(1.0, JITTER, picked.shape)
+    for j, col in enumerate(feature_columns):
+        if col in FIXED_COLUMNS:
+            noise[:, j] = 1.0
+    values = np.round(picked * noise, 3)
+    rows = []
+    for row in values.tolist():
+        rows.append({col: (int(v) if col in FIXED_COLUMNS else v) for col, v in zip(feature_columns, row)})
+    return rows
+
+
+def scenarios(args):
+    grid = GRIDS[args.grid]
+    batch_sizes = args.batch_sizes or grid["batch_sizes"]
+    concurrency = args.concurrency or grid["concurrency"]
+    for c in concurrency:
+        for path in SINGLE_ROW_ENDPOINTS:
+            yield path, 1, c
+        for b in batch_sizes:
+            yield FORECAST_ENDPOINT, b, c
+
+
+def build_bodies(table, feature_columns, path, batch, rng):
+    if path == FORECAST_ENDPOINT:
+        payloads = [make_rows(table, feature_columns, batch, rng) for _ in range(BODIES_PER_SCENARIO)]
+    else:
+        payloads = make_rows(table, feature_columns, BODIES_PER_SCENARIO, rng)
+    return [json.dumps(p).encode() for p in payloads]
+
+
+class ClientTransport:
+    """Flask test client in this process; one client per load thread"""
+
+    name = "client"
+
+    def __init__(self, cache):
+        warnings.filterwarnings("ignore")
+        import app as flask_app
+        from prediction_cache import prediction_cache
+        if not cache:
+            prediction_cache.max_entries = 0
+        self.app = flask_app.app
+
+    def connect(self):
+        client = self.app.test_client()
+
+        def post(path, body):
+            return client.post(path, data=body, content_type="application/json").status_code
+        return post
+
+    def rss_mb(self):
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    def close(self):
+        pass
+
+
+class ServerTransport:
+    """gunicorn app:app on a local port; one HTTP connection per load thread"""
+
+    name = "server"
+
+    def __init__(self, cache, workers, port):
+        env = dict(os.environ)
+        if not cache:
+            env["PREDICTION_CACHE_SIZE"] = "0"
+        self.port = port
+        self.server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}",
+             "--log-level", "warning", "--timeout", "120", "app:app"],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        wait_ready(f"http://127.0.0.1:{port}/", timeout=120)
+
+    def connect(self):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=120)
+        headers = {"Content-Type": "application/json"}
+
+        def post(path, body):
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                return response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                return 0
+        return post
+
+    def rss_mb(self):
+        pids = [self.server.pid] + children(self.server.pid)
+        return sum(smaps_rollup(pid)["rss_mb"] for pid in pids)
+
+    def close(self):
+        self.server.send_signal(signal.SIGTERM)
+        self.server.wait(timeout=30)
+
+
+def run_scenario(transport, path, batch, concurrency, bodies, duration):
+    warm = transport.connect()
+    for body in bodies[:2]:
+        warm(path, body)
+
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def load(offset):
+        post = transport.connect()
+        local, failed, i = [], 0, offset
+        while time.monotonic() < deadline:
+            body = bodies[i % len(bodies)]
+            i += 1
+            start = time.perf_counter()
+            status = post(path, body)
+            local.append(time.perf_counter() - start)
+            if status != 200:
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=load, args=(i,)) for i in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]).tolist() if len(ms) else [float("nan")] * 3
+    return {
+        "transport": transport.name, "endpoint": path, "batch": batch, "concurrency": concurrency,
+        "requests": len(ms), "errors": errors[0],
+        "requests_per_s": len(ms) / elapsed, "rows_per_s": len(ms) * batch / elapsed,
+        "p50_ms": p50, "p95_ms": p95, "p99_ms": p99, "rss_mb": transport.rss_mb(),
+    }
+
+
+def scenario_key(result):
+    return f"{result['transport']} {result['endpoint']} batch={result['batch']} c={result['concurrency']}"
+
+
+def compare(results, baseline, tolerance, latency_tolerance):
+    """Return a list of human-readable regressions of results against baseline"""
+    regressions = []
+    for key, r in results.items():
+        if r["errors"]:
+            regressions.append(f"{key}: {r['errors']} failed requests")
+        base = baseline.get(key)
+        if base is None:
+            continue
+        if r["rows_per_s"] < base["rows_per_s"] * (1 - tolerance):
+            regressions.append(f"{key}: throughput {r['rows_per_s']:.1f} rows/s vs baseline {base['rows_per_s']:.1f}")
+        slower = r["p95_ms"] - base["p95_ms"]
+        if slower > base["p95_ms"] * latency_tolerance and slower > LATENCY_SLACK_MS:
+            regressions.append(f"{key}: p95 {r['p95_ms']:.2f} ms vs baseline {base['p95_ms']:.2f}")
+        if r["rss_mb"] > base["rss_mb"] * (1 + tolerance):
+            regressions.append(f"{key}: RSS {r['rss_mb']:.1f} MB vs baseline {base['rss_mb']:.1f}")
+    return regressions
+
+
+def run_meta(args):
+    from model_registry import ModelRegistry
+    version = ModelRegistry(lazy=True).get().version
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count(),
+        "model_version": version, "commit": commit, "grid": args.grid, "duration_s": args.duration,
+        "workers": args.workers, "cache": args.cache, "seed": args.seed, "created_at": time.time(),
+    }
+
+
+def main():
+    args = parse_args()
+    from model_registry import read_feature_columns
+    feature_columns = read_feature_columns()
+    table = daily_feature_table(feature_columns)
+    plan = list(scenarios(args))
+
+    results = {}
+    print(f"{'scenario':58s} {'req/s':>8} {'rows/s':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'RSS MB':>7}")
+    for name in args.transports:
+        transport = ClientTransport(args.cache) if name == "client" else \
+            ServerTransport(args.cache, args.workers, args.port)
+        try:
+            # Same seed per transport, so both send identical bodies.
+            rng = np.random.default_rng(args.seed)
+            for path, batch, concurrency in plan:
+                bodies = build_bodies(table, feature_columns, path, batch, rng)
+                r = run_scenario(transport, path, batch, concurrency, bodies, args.duration)
+                key = scenario_key(r)
+                results[key] = r
+                print(f"{key:58s} {r['requests_per_s']:>8.1f} {r['rows_per_s']:>10.1f} {r['p50_ms']:>8.2f} "
+                      f"{r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['rss_mb']:>7.1f}")
+                sys.stdout.flush()
+        finally:
+            transport.close()
+
+    report = {"meta": run_meta(args), "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Results saved to {args.output}")
+
+    if args.update_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Baseline updated: {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"⚠️ No baseline at {args.baseline}; run with --update-baseline to record one")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["meta"].get("cpus") != os.cpu_count() or baseline["meta"].get("cache") != args.cache:
+        print("⚠️ Baseline was recorded with a different CPU count or cache setting; comparison is indicative only")
+    compared = len(set(results) & set(baseline["results"]))
+    regressions = compare(results, baseline["results"], args.tolerance, args.latency_tolerance)
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s) against the baseline ({compared} scenarios compared):")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"✅ No regressions against the baseline ({compared} scenarios compared, "
+          f"tolerance {args.tolerance:.0%}, p95 {args.latency_tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
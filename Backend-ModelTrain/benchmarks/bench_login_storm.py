@@ -0,0 +1,105 @@
+"""Prediction latency during a login storm, with bcrypt inline vs on the bounded hasher pool.
+
+Serves app.py from a threaded Werkzeug server in this process, backed by
+mongomock with one verified user, and measures /api/predict/solarpower
+latency first on its own and then while --logins threads hammer
+/api/signin. "inline" hashes on the request threads (the old
+Flask-Bcrypt behaviour); "pooled" uses PasswordHasher with --workers
+threads and sheds the excess with 503s.
+
+Run from Backend-ModelTrain:
+    python -m benchmarks.bench_login_storm --logins 16 --predictors 4 --duration 10
+"""
+import json
+import time
+import logging
+import argparse
+import threading
+import http.client
+import warnings
+import numpy as np
+import mongomock
+from werkzeug.serving import make_server
+from password_hasher import PasswordHasher
+from benchmarks.bench_asgi_vs_flask import SAMPLE_ROW
+
+EMAIL = "storm@example.com"
+PASSWORD = "correct horse battery staple"
+
+
+def worker(port, method, path, body, stop, latencies, statuses):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    headers = {"Content-Type": "application/json"}
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            continue
+        latencies.append((time.perf_counter() - start) * 1000)
+        statuses.append(response.status)
+    conn.close()
+
+
+def run_phase(port, args, with_logins):
+    stop = threading.Event()
+    predict_ms, predict_status, login_ms, login_status = [], [], [], []
+    predict_body = json.dumps(SAMPLE_ROW)
+    login_body = json.dumps({"email": EMAIL, "password": PASSWORD})
+    threads = [threading.Thread(target=worker, args=(port, "POST", "/api/predict/solarpower", predict_body,
+                                                     stop, predict_ms, predict_status))
+               for _ in range(args.predictors)]
+    if with_logins:
+        threads += [threading.Thread(target=worker, args=(port, "POST", "/api/signin", login_body,
+                                                          stop, login_ms, login_status))
+                    for _ in range(args.logins)]
+    for t in threads:
+        t.start()
+    time.sleep(args.duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    return np.array(predict_ms), np.array(login_status)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=16)
+    parser.add_argument("--predictors", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--max-pending", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    import app as flask_app
+    users = mongomock.MongoClient().db.users
+    flask_app.users_collection = users
+    stored_hash = PasswordHasher(rounds=args.rounds, workers=0).hash(PASSWORD)
+    users.insert_one({"fullname": "Storm", "email": EMAIL, "password": stored_hash, "isverified": True})
+
+    server = make_server("127.0.0.1", args.port, flask_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    print(f"{'mode':>7} {'phase':>8} {'pred p50':>9} {'pred p99':>9} {'pred req/s':>10} "
+          f"{'logins ok':>9} {'503s':>6}")
+    for mode in ["inline", "pooled"]:
+        workers = 0 if mode == "inline" else args.workers
+        flask_app.password_hasher = PasswordHasher(rounds=args.rounds, workers=workers,
+                                                   max_pending=args.max_pending, admit_timeout=0.05)
+        for phase, with_logins in [("alone", False), ("storm", True)]:
+            predict_ms, login_status = run_phase(args.port, args, with_logins)
+            print(f"{mode:>7} {phase:>8} {np.percentile(predict_ms, 50):>9.2f} {np.percentile(predict_ms, 99):>9.2f} "
+                  f"{len(predict_ms) / args.duration:>10.1f} {int((login_status == 200).sum()):>9} "
+                  f"{int((login_status == 503).sum()):>6}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
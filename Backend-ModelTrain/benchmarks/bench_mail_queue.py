@@ -0,0 +1,85 @@
+"""Request-path cost of sending OTP email inline vs through the mail queue.
+
+Uses benchmarks.smtp_sink as the SMTP server, with delays standing in for
+the TLS handshake and send time of a remote provider. "inline" opens a
+connection per message on the calling thread, like mail.send() did;
+"queued" only pays for the outbox insert, and delivery happens on the
+pooled background workers.
+
+Run from Backend-ModelTrain:
+    python -m benchmarks.bench_mail_queue --messages 50 --connect-delay 0.15 --send-delay 0.02
+"""
+import os
+import time
+import argparse
+import smtplib
+import tempfile
+from email.message import EmailMessage
+import numpy as np
+from mail_queue import MailQueue, SMTPPool, otp_email_html
+from benchmarks.smtp_sink import SMTPSink
+
+
+def send_inline(port, to_email, subject, html):
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg["From"] = "noreply@example.com"
+    msg["To"] = to_email
+    msg.set_content(html, subtype="html")
+    with smtplib.SMTP("127.0.0.1", port, timeout=10) as smtp:
+        smtp.send_message(msg)
+
+
+def summarize(name, handler_ms, total_s, sink):
+    handler_ms = np.array(handler_ms)
+    print(f"{name:>7} {np.percentile(handler_ms, 50):>10.2f} {np.percentile(handler_ms, 99):>10.2f} "
+          f"{total_s:>9.2f} {len(sink.messages):>9} {sink.connections:>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--connect-delay", type=float, default=0.15)
+    parser.add_argument("--send-delay", type=float, default=0.02)
+    parser.add_argument("--transient-failures", type=int, default=3,
+                        help="The sink answers 451 to this many messages in the queued run")
+    args = parser.parse_args()
+    html = otp_email_html("123456", "Verify your SolarPower-ML Account")
+
+    print(f"{'mode':>7} {'p50 ms':>10} {'p99 ms':>10} {'total s':>9} {'delivered':>9} {'connections':>12}")
+
+    sink = SMTPSink(connect_delay=args.connect_delay, send_delay=args.send_delay).start()
+    handler_ms = []
+    start = time.perf_counter()
+    for i in range(args.messages):
+        t = time.perf_counter()
+        send_inline(sink.port, f"user{i}@example.com", "Verify your SolarPower-ML Account", html)
+        handler_ms.append((time.perf_counter() - t) * 1000)
+    summarize("inline", handler_ms, time.perf_counter() - start, sink)
+    sink.stop()
+
+    sink = SMTPSink(connect_delay=args.connect_delay, send_delay=args.send_delay).start()
+    sink.fail_next = args.transient_failures
+    with tempfile.TemporaryDirectory() as tmp:
+        pool = SMTPPool("127.0.0.1", sink.port, use_tls=False, max_connections=args.workers)
+        mail_queue = MailQueue(pool, "noreply@example.com", path=os.path.join(tmp, "outbox.db"),
+                               workers=args.workers, backoff_seconds=0.05)
+        handler_ms = []
+        start = time.perf_counter()
+        for i in range(args.messages):
+            t = time.perf_counter()
+            mail_queue.enqueue(f"user{i}@example.com", "Verify your SolarPower-ML Account", html)
+            handler_ms.append((time.perf_counter() - t) * 1000)
+        drained = mail_queue.drain(timeout=120)
+        summarize("queued", handler_ms, time.perf_counter() - start, sink)
+        stats = mail_queue.stats()
+        mail_queue.stop()
+    sink.stop()
+
+    print(f"queue: drained={drained} sent={stats['sent']} retried={stats['retried']} failed={stats['failed']} "
+          f"send_ms_mean={stats['send_ms_mean']} send_ms_p95={stats['send_ms_p95']}")
+
+
+if __name__ == "__main__":
+    main()
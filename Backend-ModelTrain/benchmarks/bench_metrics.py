@@ -0,0 +1,143 @@
+"""Overhead of the request/stage instrumentation on /api/predict/solarpower.
+
+Alternates short rounds with metrics enabled and disabled against the
+same app.py test client, timing each round in process CPU time (less
+sensitive to other load on the box than wall time), and reports the
+median overhead over all on/off pairs. Also times the instrumentation
+alone: start_request, the stage marks of one prediction and finish_request.
+
+With --server, also boots two `gunicorn -w 1 app:app` servers, one with
+METRICS_ENABLED=1 and one with =0, sends them requests alternately and
+compares each worker's own CPU time per request (from /proc/<pid>/stat),
+which includes the HTTP and WSGI work the test client skips and is not
+affected by the client's timing noise.
+
+Run from Backend-ModelTrain:
+    python -m benchmarks.bench_metrics --rounds 40 --requests 500
+"""
+import os
+import sys
+import time
+import argparse
+import http.client
+import statistics
+import subprocess
+import warnings
+import json
+from metrics import Metrics, mark_stage
+from benchmarks.bench_asgi_vs_flask import SAMPLE_ROW
+
+PREDICT_STAGES = ("parse", "features", "cache", "model", "cache", "handler")
+
+
+def instrumentation_us(n=20_000, repeat=5):
+    registry = Metrics()
+    timings = []
+    for _ in range(repeat):
+        start = time.process_time()
+        for _ in range(n):
+            token = registry.start_request()
+            for stage in PREDICT_STAGES:
+                mark_stage(stage)
+            registry.finish_request(token, "POST", "/api/predict/solarpower", "200")
+        timings.append((time.process_time() - start) / n * 1e6)
+    return min(timings)
+
+
+def per_request_us(client, n):
+    start = time.process_time()
+    for _ in range(n):
+        client.post("/api/predict/solarpower", json=SAMPLE_ROW)
+    return (time.process_time() - start) / n * 1e6
+
+
+def worker_cpu_seconds(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime and stime are fields 14 and 15 of stat(5); the split starts at field 3.
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def start_server(enabled, port):
+    from benchmarks.bench_startup import wait_ready, children
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-w", "1", "-b", f"127.0.0.1:{port}", "--log-level", "warning", "app:app"],
+        env={**os.environ, "METRICS_ENABLED": "1" if enabled else "0"},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wait_ready(f"http://127.0.0.1:{port}/", timeout=120)
+    (worker,) = children(server.pid)
+    return server, worker
+
+
+def server_cpu_us(n, port):
+    """Worker CPU per request of two gunicorn servers, metrics on and off, fed alternately"""
+    servers = {enabled: start_server(enabled, port + i) for i, enabled in enumerate((True, False))}
+    try:
+        conns = {enabled: http.client.HTTPConnection("127.0.0.1", port + i, timeout=30)
+                 for i, enabled in enumerate((True, False))}
+        body = json.dumps(SAMPLE_ROW)
+        headers = {"Content-Type": "application/json"}
+
+        def send(enabled):
+            conns[enabled].request("POST", "/api/predict/solarpower", body=body, headers=headers)
+            conns[enabled].getresponse().read()
+        for _ in range(200):
+            send(True)
+            send(False)
+        start = {enabled: worker_cpu_seconds(worker) for enabled, (_, worker) in servers.items()}
+        # Alternating requests spreads any change in machine speed over both
+        # servers; swapping which goes first removes any bias from the order.
+        for i in range(n):
+            first = i % 2 == 0
+            send(first)
+            send(not first)
+        return {enabled: (worker_cpu_seconds(worker) - start[enabled]) / n * 1e6
+                for enabled, (_, worker) in servers.items()}
+    finally:
+        for server, _ in servers.values():
+            server.terminate()
+            server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=40)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--server", action="store_true")
+    parser.add_argument("--server-rounds", type=int, default=3)
+    parser.add_argument("--server-requests", type=int, default=10000)
+    parser.add_argument("--port", type=int, default=8125)
+    args = parser.parse_args()
+
+    print(f"Instrumentation alone: {instrumentation_us():.2f} µs per prediction request")
+
+    warnings.filterwarnings("ignore")
+    import app as flask_app
+    client = flask_app.app.test_client()
+    per_request_us(client, 200)
+
+    timings = {True: [], False: []}
+    for i in range(args.rounds):
+        # Swap the order every round so drift hits both sides equally.
+        for enabled in ((True, False) if i % 2 == 0 else (False, True)):
+            flask_app.metrics.enabled = enabled
+            timings[enabled].append(per_request_us(client, args.requests))
+    flask_app.metrics.enabled = True
+
+    on, off = statistics.median(timings[True]), statistics.median(timings[False])
+    overhead = statistics.median((a - b) / b * 100 for a, b in zip(timings[True], timings[False]))
+    print(f"/api/predict/solarpower via test client: metrics on {on:.1f} µs, off {off:.1f} µs CPU "
+          f"→ overhead {overhead:+.2f}% (median of {args.rounds} paired rounds)")
+
+    if args.server:
+        server = {True: [], False: []}
+        for _ in range(args.server_rounds):
+            for enabled, us in server_cpu_us(args.server_requests, args.port).items():
+                server[enabled].append(us)
+        on, off = statistics.median(server[True]), statistics.median(server[False])
+        print(f"/api/predict/solarpower via gunicorn: worker CPU metrics on {on:.1f} µs, off {off:.1f} µs "
+              f"per request → overhead {(on - off) / off * 100:+.2f}%")
+
+
+if __name__ == "__main__":
+    main()
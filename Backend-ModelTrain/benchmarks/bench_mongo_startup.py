@@ -0,0 +1,71 @@
+"""Startup time and auth request latency of app.py against a MongoDB server.
+
+Times `import app` in fresh interpreters (what each gunicorn worker pays
+on boot), then, in this process, the first /api/signin for an unknown
+email (which includes creating the client and its first connection) and
+the steady-state latency of the following ones.
+
+Run from Backend-ModelTrain, on each commit to compare:
+    MONGO_URI=mongodb://localhost:27017 python -m benchmarks.bench_mongo_startup
+Pool settings are read from the MONGO_* variables (see mongo_connection.py).
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+import warnings
+import numpy as np
+
+IMPORT_SNIPPET = (
+    "import time, warnings; warnings.filterwarnings('ignore'); t = time.perf_counter(); "
+    "import app; print(time.perf_counter() - t)"
+)
+
+
+def import_seconds(repeat):
+    timings = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET], capture_output=True, text=True, check=True)
+        timings.append(float(out.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--imports", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=200)
+    args = parser.parse_args()
+
+    timings = import_seconds(args.imports)
+    print(f"import app: median {statistics.median(timings) * 1000:.1f} ms over {len(timings)} runs")
+
+    if not os.environ.get("MONGO_URI"):
+        print("MONGO_URI is not set, skipping request latency")
+        return
+
+    warnings.filterwarnings("ignore")
+    import app as flask_app
+    client = flask_app.app.test_client()
+    body = {"email": "bench-unknown@example.invalid", "password": "x"}
+
+    start = time.perf_counter()
+    response = client.post("/api/signin", json=body)
+    print(f"first /api/signin: {(time.perf_counter() - start) * 1000:.2f} ms (status {response.status_code})")
+
+    latencies = []
+    for _ in range(args.requests):
+        start = time.perf_counter()
+        client.post("/api/signin", json=body)
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(f"/api/signin: p50 {np.percentile(latencies, 50):.3f} ms, p99 {np.percentile(latencies, 99):.3f} ms "
+          f"over {args.requests} requests")
+
+    if "/healthz" in {rule.rule for rule in flask_app.app.url_map.iter_rules()}:
+        response = client.get("/healthz")
+        print(f"/healthz: {response.status_code} {response.get_json()['mongo']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Per-worker unique memory with a private sklearn model vs shared mapped forests.
+
+Boots `gunicorn -w N app:app` twice:
+  private: every worker unpickles random_forest_model.pkl (the default);
+  shared:  SHARED_MODEL=1, so gunicorn.conf.py preloads the app in the
+           master, which maps the exported forests, and workers serve
+           every batch size from those read-only pages.
+Each worker gets single-day and large forecast requests first, so the
+large-batch path (and its temporaries) is exercised before measuring
+private memory from /proc/<pid>/smaps_rollup. Also times predictions of
+large batches in-process for both paths.
+
+Run from Backend-ModelTrain:
+    python -m benchmarks.bench_shared_model --workers 4
+"""
+import time
+import argparse
+import warnings
+import numpy as np
+from benchmarks.bench_startup import gunicorn_report, print_gunicorn, sample_row
+
+MODES = {
+    "private": {"FAST_START": "0", "SHARED_MODEL": "0"},
+    "shared": {"FAST_START": "0", "SHARED_MODEL": "1"},
+}
+
+
+def forecast_rows(n):
+    rng = np.random.default_rng(n)
+    return [dict(sample_row(), Day=int(d % 28) + 1, **{"Average Temperature (Day)": float(t)})
+            for d, t in zip(range(n), rng.uniform(40, 90, n))]
+
+
+def batch_latency(batch_sizes, repeat=5):
+    warnings.filterwarnings("ignore")
+    from model_registry import ModelRegistry
+    registries = {"sklearn": ModelRegistry(), "mapped forest": ModelRegistry(forest_only=True)}
+    rng = np.random.default_rng(0)
+    base = np.array([list(sample_row().values())], dtype=np.float64)
+    for n in batch_sizes:
+        X = base.repeat(n, axis=0) * rng.uniform(0.8, 1.2, (n, base.shape[1]))
+        timings = {}
+        for name, reg in registries.items():
+            bundle = reg.get()
+            bundle.predict(X.copy())
+            start = time.perf_counter()
+            for _ in range(repeat):
+                bundle.predict(X.copy())
+            timings[name] = (time.perf_counter() - start) / repeat * 1000
+        print(f"{n:6d} rows: " + ", ".join(f"{name} {ms:.1f} ms" for name, ms in timings.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--forecast-rows", type=int, default=2000)
+    parser.add_argument("--port", type=int, default=8124)
+    args = parser.parse_args()
+
+    warm = ([("/api/predict/solarpower", sample_row())] * args.workers * 4
+            + [("/api/predict/solarpowerforecast", forecast_rows(args.forecast_rows))] * args.workers * 2)
+    private = {}
+    for mode, env in MODES.items():
+        report = gunicorn_report(args.module, env, args.workers, args.port, warm_requests=warm)
+        print_gunicorn(f"gunicorn -w {args.workers} ({mode})", report)
+        private[mode] = sum(w["private_mb"] for w in report["workers"]) / len(report["workers"])
+    print(f"Mean private memory per worker: {private['private']:.1f} MB → {private['shared']:.1f} MB")
+
+    batch_latency([1000, 10000])
+
+
+if __name__ == "__main__":
+    main()
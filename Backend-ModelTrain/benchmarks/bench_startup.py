@@ -0,0 +1,147 @@
+"""Cold start of the API: import time, first prediction and memory per worker.
+
+For each mode (eager, FAST_START=1) starts fresh interpreters that import
+the app, serve one /api/predict/solarpower request and report how long
+each step took and the process RSS. With --gunicorn, also boots
+`gunicorn -w N app:app` and reports the time until it answers /
+and the RSS / PSS / private memory of every worker from
+/proc/<pid>/smaps_rollup.
+
+Run from Backend-ModelTrain:
+    python -m benchmarks.bench_startup --runs 3
+    python -m benchmarks.bench_startup --gunicorn --workers 4
+"""
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import statistics
+import subprocess
+import urllib.request
+
+MODES = {"eager": {"FAST_START": "0"}, "fast": {"FAST_START": "1"}}
+
+PROBE = """
+import json, time, warnings, resource
+warnings.filterwarnings("ignore")
+t0 = time.perf_counter()
+import {module} as target
+t1 = time.perf_counter()
+client = target.app.test_client()
+response = client.post("/api/predict/solarpower", json={sample})
+t2 = time.perf_counter()
+import sys
+heavy = [m for m in ("sklearn", "pandas", "joblib", "scipy") if m in sys.modules]
+print(json.dumps({{"import_ms": (t1 - t0) * 1000, "first_predict_ms": (t2 - t1) * 1000,
+                  "status": response.status_code, "heavy_modules": heavy,
+                  "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}}))
+"""
+
+
+def sample_row():
+    from benchmarks.bench_asgi_vs_flask import SAMPLE_ROW
+    return SAMPLE_ROW
+
+
+def probe(module, env):
+    code = PROBE.format(module=module, sample=repr(sample_row()))
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         env={**os.environ, **env})
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def smaps_rollup(pid):
+    """RSS, PSS and private (unique) memory of a process in MB"""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 3 and parts[0].endswith(":"):
+                fields[parts[0][:-1]] = int(parts[1]) / 1024
+    private = fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    return {"rss_mb": fields.get("Rss", 0), "pss_mb": fields.get("Pss", 0), "private_mb": private}
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(p) for p in f.read().split()]
+
+
+def wait_ready(url, timeout):
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return time.perf_counter() - start
+        except OSError:
+            time.sleep(0.05)
+    raise TimeoutError(f"{url} did not answer within {timeout}s")
+
+
+def gunicorn_report(module, env, workers, port, extra_args=(), warm_requests=None):
+    """Boot gunicorn, warm every worker and return per-process memory.
+
+    warm_requests is a list of (path, JSON body) sent in turn before
+    measuring; by default a few single-day predictions per worker.
+    """
+    cmd = [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}",
+           "--log-level", "warning", *extra_args, f"{module}:app"]
+    start = time.perf_counter()
+    server = subprocess.Popen(cmd, env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(f"http://127.0.0.1:{port}/", timeout=120)
+        ready_s = time.perf_counter() - start
+        if warm_requests is None:
+            warm_requests = [("/api/predict/solarpower", sample_row())] * (workers * 8)
+        for path, payload in warm_requests:
+            request = urllib.request.Request(f"http://127.0.0.1:{port}{path}", data=json.dumps(payload).encode(),
+                                             headers={"Content-Type": "application/json"})
+            urllib.request.urlopen(request, timeout=60).read()
+        worker_pids = children(server.pid)
+        return {
+            "ready_s": ready_s,
+            "master": smaps_rollup(server.pid),
+            "workers": [smaps_rollup(pid) for pid in worker_pids],
+        }
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+def print_gunicorn(label, report):
+    workers = report["workers"]
+    print(f"{label}: ready in {report['ready_s']:.2f}s, master RSS {report['master']['rss_mb']:.1f} MB")
+    for i, w in enumerate(workers):
+        print(f"  worker {i}: RSS {w['rss_mb']:.1f} MB, PSS {w['pss_mb']:.1f} MB, private {w['private_mb']:.1f} MB")
+    total_pss = report["master"]["pss_mb"] + sum(w["pss_mb"] for w in workers)
+    print(f"  total PSS (master + {len(workers)} workers): {total_pss:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="app", help="app or index")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--gunicorn", action="store_true")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8123)
+    args = parser.parse_args()
+
+    for mode, env in MODES.items():
+        results = [probe(args.module, env) for _ in range(args.runs)]
+        assert all(r["status"] == 200 for r in results), results
+        import_ms = statistics.median(r["import_ms"] for r in results)
+        first_ms = statistics.median(r["first_predict_ms"] for r in results)
+        rss = statistics.median(r["max_rss_mb"] for r in results)
+        print(f"{mode:6s} import {import_ms:7.1f} ms | first predict {first_ms:6.1f} ms | "
+              f"RSS {rss:6.1f} MB | heavy modules loaded: {results[0]['heavy_modules'] or 'none'}")
+
+    if args.gunicorn:
+        for mode, env in MODES.items():
+            print_gunicorn(f"gunicorn -w {args.workers} ({mode})",
+                           gunicorn_report(args.module, env, args.workers, args.port))
+
+
+if __name__ == "__main__":
+    main()
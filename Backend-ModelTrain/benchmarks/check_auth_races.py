@@ -0,0 +1,162 @@
+"""Concurrency check of the auth flows: no lost updates, few round trips per request.
+
+Fires the same auth request from many threads at once against app.py and
+checks that conditional updates let exactly one of them win, e.g. one
+OTP resets a password once, and that resets without a valid OTP never
+reach bcrypt. Also counts the database operations each route issues on
+its success path.
+
+With MONGO_URI set, runs against a scratch database on that server;
+otherwise uses mongomock behind a lock, since every single operation is
+atomic on a real server but mongomock has no locking of its own.
+
+Run from Backend-ModelTrain:
+    python -m benchmarks.check_auth_races --threads 16
+"""
+import os
+import argparse
+import datetime
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from password_hasher import PasswordHasher, HasherBusyError
+from user_store import ensure_user_indexes
+from benchmarks.check_user_indexes import get_collection, SCRATCH_DB
+
+
+class CountingCollection:
+    """Collection proxy that counts operations and optionally runs each one under a lock"""
+
+    def __init__(self, collection, serialize):
+        self._collection = collection
+        self._lock = threading.Lock() if serialize else None
+        self.calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+        if not callable(method):
+            return method
+
+        def call(*args, **kwargs):
+            self.calls.append(name)
+            if self._lock is None:
+                return method(*args, **kwargs)
+            with self._lock:
+                return method(*args, **kwargs)
+        return call
+
+
+def fire(n_threads, fn):
+    barrier = threading.Barrier(n_threads)
+
+    def run(i):
+        barrier.wait()
+        return fn(i)
+    with ThreadPoolExecutor(max_workers=n_threads) as pool:
+        return list(pool.map(run, range(n_threads)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    warnings.filterwarnings("ignore")
+    import app as flask_app
+    raw, real_server = get_collection()
+    ensure_user_indexes(raw)
+    users = CountingCollection(raw, serialize=not real_server)
+    flask_app.users_collection = users
+    flask_app.password_hasher = PasswordHasher(rounds=4, workers=4, max_pending=args.threads)
+    sent_otps = {}
+    flask_app.send_email = lambda to_email, otp, subject: sent_otps.__setitem__(to_email, otp)
+    print(f"Backend: {'mongod' if real_server else 'mongomock (serialized)'}, {args.threads} threads")
+
+    def client():
+        return flask_app.app.test_client()
+
+    def round_trips(fn):
+        users.calls.clear()
+        response = fn()
+        return response, list(users.calls)
+
+    # Round trips per successful request.
+    email = "race@example.com"
+    r, calls = round_trips(lambda: client().post("/api/signup", json={"fullname": "R", "email": email, "password": "pw"}))
+    assert r.status_code == 201, r.get_json()
+    user_id = r.get_json()["user"]["id"]
+    print(f"signup             {r.status_code}  round trips: {calls}")
+    r, calls = round_trips(lambda: client().get(f"/api/signup/resend-otp/{user_id}"))
+    print(f"resend-otp         {r.status_code}  round trips: {calls}")
+    r, calls = round_trips(lambda: client().post(f"/api/signup/verify/{user_id}", json={"otp": sent_otps[email]}))
+    print(f"verify             {r.status_code}  round trips: {calls}")
+    r, calls = round_trips(lambda: client().post("/api/signin/forgotpassword/auth", json={"email": email}))
+    print(f"forgotpassword     {r.status_code}  round trips: {calls}")
+    r, calls = round_trips(lambda: client().patch("/api/signin/forgotpassword/reset",
+                                                  json={"email": email, "otp": sent_otps[email], "password": "new"}))
+    print(f"reset              {r.status_code}  round trips: {calls}")
+    r, calls = round_trips(lambda: client().post("/api/signin", json={"email": email, "password": "new"}))
+    print(f"signin             {r.status_code}  round trips: {calls}")
+
+    # One OTP, many concurrent resets with different passwords: exactly one may win.
+    client().post("/api/signin/forgotpassword/auth", json={"email": email})
+    otp = sent_otps[email]
+    statuses = fire(args.threads, lambda i: client().patch(
+        "/api/signin/forgotpassword/reset", json={"email": email, "otp": otp, "password": f"pw-{i}"}).status_code)
+    winners = [i for i, status in enumerate(statuses) if status == 200]
+    assert len(winners) == 1, statuses
+    stored = raw.find_one({"email": email})["password"]
+    assert flask_app.password_hasher.check(stored, f"pw-{winners[0]}")
+    print(f"✅ Concurrent resets with one OTP: 1 succeeded, {statuses.count(400)} rejected, stored password is the winner's")
+
+    # Resets without a valid OTP are rejected before any bcrypt work.
+    hashed = flask_app.password_hasher.hashed
+    for body in ({"email": email}, {"email": email, "otp": otp}, {"email": email, "otp": "000000", "password": "x"},
+                 {"email": "nobody@example.com", "otp": otp, "password": "x"}):
+        status = client().patch("/api/signin/forgotpassword/reset", json=body).status_code
+        assert status in (400, 404), (body, status)
+    assert flask_app.password_hasher.hashed == hashed
+    print("✅ Incomplete or wrong-OTP resets rejected with 400/404 and no password hashed")
+
+    # A reset turned away by a busy hasher hands its OTP back for a retry.
+    client().post("/api/signin/forgotpassword/auth", json={"email": email})
+    otp, hasher = sent_otps[email], flask_app.password_hasher
+
+    class BusyHasher:
+        def hash(self, password):
+            raise HasherBusyError("busy")
+    flask_app.password_hasher = BusyHasher()
+    body = {"email": email, "otp": otp, "password": "after-busy"}
+    status = client().patch("/api/signin/forgotpassword/reset", json=body).status_code
+    flask_app.password_hasher = hasher
+    assert status == 503 and raw.find_one({"email": email})["otp"] == otp, status
+    assert client().patch("/api/signin/forgotpassword/reset", json=body).status_code == 200
+    print("✅ Reset refused by a busy hasher keeps its OTP and succeeds on retry")
+
+    # Concurrent verifications of one signup OTP: exactly one verifies.
+    email = "verify-race@example.com"
+    user_id = client().post("/api/signup", json={"fullname": "V", "email": email, "password": "pw"}).get_json()["user"]["id"]
+    otp = sent_otps[email]
+    statuses = fire(args.threads, lambda i: client().post(f"/api/signup/verify/{user_id}", json={"otp": otp}).status_code)
+    assert statuses.count(200) == 1, statuses
+    print(f"✅ Concurrent verifications: 1 succeeded, {statuses.count(400)} rejected")
+
+    # Concurrent signups for one new email: no 500s and a single account.
+    email = "signup-race@example.com"
+    statuses = fire(args.threads, lambda i: client().post(
+        "/api/signup", json={"fullname": f"S{i}", "email": email, "password": "pw"}).status_code)
+    assert 500 not in statuses and raw.count_documents({"email": email}) == 1, statuses
+    print(f"✅ Concurrent signups: {statuses.count(201)} accepted, {statuses.count(400)} rejected, 1 account stored")
+
+    # A verified account cannot be replaced by a new signup.
+    status = client().post("/api/signup", json={"fullname": "X", "email": "race@example.com", "password": "x"}).status_code
+    assert status == 400 and flask_app.password_hasher.check(raw.find_one({"email": "race@example.com"})["password"],
+                                                              "after-busy")
+    print("✅ Signup for a verified email rejected without touching the account")
+
+    if real_server:
+        raw.database.client.drop_database(SCRATCH_DB)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Check bulk_score.py on CSV inputs whose columns change type between chunks.
+
+pandas infers the types of every CSV chunk separately. An integer
+column with one blank value becomes float64 in that chunk, and a text
+column that happens to hold only digits becomes int64. Writes such a
+file, scores it to Parquet and CSV with a small --chunksize and checks
+that every row is written with its kept values intact. Also checks that
+infinite and non-numeric features are left unscored.
+
+Run from Backend-ModelTrain:
+    python -m benchmarks.check_bulk_score
+"""
+import os
+import sys
+import argparse
+import tempfile
+import warnings
+import numpy as np
+import pandas as pd
+from bulk_score import score_file, PREDICTION_COLUMN
+from benchmarks.bench_asgi_vs_flask import SAMPLE_ROW
+
+
+def generate(path, n_rows, blank_at):
+    df = pd.DataFrame([SAMPLE_ROW] * n_rows)
+    df.insert(0, "site_id", np.arange(n_rows, dtype=object))
+    df.loc[blank_at, "site_id"] = None
+    # Text in the first chunk only; later chunks read as integers.
+    df.insert(1, "label", [f"s{i}" if i < 10 else str(i) for i in range(n_rows)])
+    df["Visibility"] = df["Visibility"].astype(object)
+    df.loc[n_rows - 3, "Visibility"] = "inf"
+    df.loc[n_rows - 2, "Visibility"] = "abc"
+    df.to_csv(path, index=False)
+
+
+def check(input_path, output_path, args):
+    rows, invalid, _ = score_file(input_path, output_path, chunksize=args.chunksize, workers=1,
+                                  keep=["site_id", "label"])
+    out = pd.read_parquet(output_path) if output_path.endswith(".parquet") else pd.read_csv(output_path)
+    site_ids = pd.to_numeric(out["site_id"])
+    problems = []
+    if rows != args.rows or len(out) != args.rows:
+        problems.append(f"{rows} rows scored, {len(out)} written, expected {args.rows}")
+    if not site_ids.isna().iloc[args.blank_at] or site_ids.drop(args.blank_at).tolist() != \
+            [float(i) for i in range(args.rows) if i != args.blank_at]:
+        problems.append("site_id values changed")
+    if out["label"].astype(str).tolist()[:12] != [f"s{i}" for i in range(10)] + ["10", "11"]:
+        problems.append("label values changed")
+    if invalid != 2 or out[PREDICTION_COLUMN].isna().sum() != 2:
+        problems.append(f"expected 2 unscored rows (inf, text), got {invalid}")
+    name = os.path.basename(output_path)
+    print(f"{'✅' if not problems else '❌'} {name}: " + ("; ".join(problems) or
+                                                      f"{rows} rows across dtype changes written intact"))
+    return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--blank-at", type=int, default=800)
+    parser.add_argument("--chunksize", type=int, default=300)
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        input_path = os.path.join(tmp, "weather.csv")
+        generate(input_path, args.rows, args.blank_at)
+        ok = True
+        for fmt in ("parquet", "csv"):
+            ok &= check(input_path, os.path.join(tmp, f"scored.{fmt}"), args)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
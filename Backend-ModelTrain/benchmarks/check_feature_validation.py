@@ -0,0 +1,83 @@
+"""Check that prediction routes reject non-numeric and non-finite features.
+
+float() accepts "nan", "inf" and "-inf" (and json accepts bare NaN and
+Infinity), but the scaler rejects infinity and the flat forests send NaN
+down a different branch than sklearn. Sends such values to app.py,
+index.py and asgi_app.py in process. A single-day request must get a 400
+naming the field. A forecast row must get a per-row error while its
+valid neighbours are still scored.
+
+Run from Backend-ModelTrain:
+    python -m benchmarks.check_feature_validation
+"""
+import sys
+import json
+import argparse
+import warnings
+from benchmarks.bench_asgi_vs_flask import SAMPLE_ROW
+
+FIELD = "Average Temperature (Day)"
+# Raw JSON fragments put in place of FIELD's value.
+BAD_VALUES = ['"nan"', '"inf"', '"-inf"', '"Infinity"', "NaN", "Infinity", "-Infinity", "1e999", '"abc"']
+
+
+def body_with(raw_value, row=SAMPLE_ROW):
+    """JSON text of row with FIELD set to raw_value, which json.dumps could not produce for every case"""
+    return json.dumps(dict(row, **{FIELD: "__BAD__"})).replace('"__BAD__"', raw_value)
+
+
+def check(name, post):
+    problems = []
+    for raw in BAD_VALUES:
+        status, payload = post("/api/predict/solarpower", body_with(raw))
+        if status != 400 or FIELD not in payload.get("error", ""):
+            problems.append(f"single {raw}: {status} {payload}")
+
+        good = json.dumps(SAMPLE_ROW)
+        status, payload = post("/api/predict/solarpowerforecast", f"[{good}, {body_with(raw)}, {good}]")
+        errors = payload.get("errors", [])
+        predictions = payload.get("predictions", [{}] * 3)
+        if (status != 200 or [err["index"] for err in errors] != [1] or FIELD not in errors[0]["error"]
+                or predictions[1]["predicted_power_kW"] is not None
+                or predictions[0]["predicted_power_kW"] is None or predictions[2]["predicted_power_kW"] is None):
+            problems.append(f"forecast {raw}: {status} {payload}")
+
+        status, payload = post("/api/predict/solarpowerforecast", f"[{body_with(raw)}]")
+        if status != 400:
+            problems.append(f"forecast of only {raw}: {status}")
+    status, payload = post("/api/predict/solarpower", json.dumps(SAMPLE_ROW))
+    if status != 200:
+        problems.append(f"valid row: {status} {payload}")
+    print(f"{'✅' if not problems else '❌'} {name}: " + ("\n    ".join(problems) or
+                                                      f"{len(BAD_VALUES)} bad values rejected"))
+    return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", nargs="+", choices=["app", "index", "asgi"], default=["app", "index", "asgi"])
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    ok = True
+    for name in args.apps:
+        if name == "asgi":
+            import asgi_app
+            from starlette.testclient import TestClient
+            with TestClient(asgi_app.app) as client:
+                def post(path, body):
+                    response = client.post(path, content=body, headers={"Content-Type": "application/json"})
+                    return response.status_code, response.json()
+                ok &= check("asgi_app.py", post)
+        else:
+            client = __import__(name).app.test_client()
+
+            def post(path, body):
+                response = client.post(path, data=body, content_type="application/json")
+                return response.status_code, response.get_json()
+            ok &= check(f"{name}.py", post)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
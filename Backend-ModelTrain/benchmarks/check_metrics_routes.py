@@ -0,0 +1,114 @@
+"""Check that /metrics labels requests with the route that served them.
+
+Sends predictions, a failing prediction and an unknown path to app.py,
+index.py and asgi_app.py in process, then scrapes /metrics and checks
+that the request histogram has a series for each route template (404s
+as "unmatched") and that the failure was counted in
+prediction_errors_total.
+
+Run from Backend-ModelTrain:
+    python -m benchmarks.check_metrics_routes
+"""
+import re
+import sys
+import argparse
+import warnings
+from benchmarks.bench_asgi_vs_flask import SAMPLE_ROW
+
+PREDICT_ROUTE = "/api/predict/solarpower"
+REQUESTS = 20
+
+
+def request_counts(text):
+    """{(method, route, status): count} from the request duration histogram"""
+    counts = {}
+    for line in text.splitlines():
+        match = re.match(r'solarpower_http_request_duration_seconds_count\{(.*)\} (\d+)', line)
+        if match:
+            labels = dict(re.findall(r'(\w+)="([^"]*)"', match.group(1)))
+            counts[labels["method"], labels["route"], labels["status"]] = int(match.group(2))
+    return counts
+
+
+def error_count(text, route):
+    match = re.search(rf'solarpower_prediction_errors_total\{{route="{re.escape(route)}"\}} (\d+)', text)
+    return int(match.group(1)) if match else 0
+
+
+def exercise(module, client):
+    """Drive the client and return the /metrics text before and after"""
+    def failing_predict(*args):
+        raise RuntimeError("injected failure")
+
+    before = client.get("/metrics").text
+    for _ in range(REQUESTS):
+        assert client.post(PREDICT_ROUTE, json=SAMPLE_ROW).status_code == 200
+    predict_row = module.predict_row
+    module.predict_row = failing_predict
+    try:
+        assert client.post(PREDICT_ROUTE, json=dict(SAMPLE_ROW, Day=2)).status_code == 500
+    finally:
+        module.predict_row = predict_row
+    assert client.get("/no/such/route").status_code == 404
+    return before, client.get("/metrics").text
+
+
+def flask_client(module):
+    client = module.app.test_client()
+    # Same .text accessor as Starlette's TestClient.
+    get, post = client.get, client.post
+
+    class Client:
+        def get(self, path):
+            response = get(path)
+            response.text = response.get_data(as_text=True)
+            return response
+
+        def post(self, path, json):
+            return post(path, json=json)
+    return Client()
+
+
+def check(name, module, client):
+    before, after = exercise(module, client)
+    counts_before, counts_after = request_counts(before), request_counts(after)
+
+    def delta(key):
+        return counts_after.get(key, 0) - counts_before.get(key, 0)
+
+    problems = []
+    if delta(("POST", PREDICT_ROUTE, "200")) != REQUESTS:
+        problems.append(f"expected {REQUESTS} POST {PREDICT_ROUTE} 200, got {delta(('POST', PREDICT_ROUTE, '200'))}")
+    if delta(("POST", PREDICT_ROUTE, "500")) != 1:
+        problems.append(f"failed prediction not labelled with {PREDICT_ROUTE}")
+    if delta(("GET", "unmatched", "404")) != 1:
+        problems.append("404 not labelled unmatched")
+    if delta(("POST", "unmatched", "200")):
+        problems.append("successful predictions labelled unmatched")
+    if error_count(after, PREDICT_ROUTE) - error_count(before, PREDICT_ROUTE) != 1:
+        problems.append("prediction_errors_total not incremented")
+    print(f"{'✅' if not problems else '❌'} {name}: " + ("; ".join(problems) or "route labels and error counter OK"))
+    return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--apps", nargs="+", choices=["app", "index", "asgi"], default=["app", "index", "asgi"])
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")
+
+    ok = True
+    for name in args.apps:
+        if name == "asgi":
+            import asgi_app
+            from starlette.testclient import TestClient
+            with TestClient(asgi_app.app) as client:
+                ok &= check("asgi_app.py", asgi_app, client)
+        else:
+            module = __import__(name)
+            ok &= check(f"{name}.py", module, flask_client(module))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Check the users indexes and route projections against mongomock or a real mongod.
+
+With MONGO_URI set, runs against a scratch database on that server (and
+also prints the query plan of the email lookup); otherwise uses mongomock.
+
+Run from Backend-ModelTrain:
+    python -m benchmarks.check_user_indexes
+    MONGO_URI=mongodb://localhost:27017 python -m benchmarks.check_user_indexes
+"""
+import os
+import datetime
+from pymongo.errors import DuplicateKeyError
+from user_store import ensure_user_indexes, SIGNIN_FIELDS, OTP_FIELDS, USER_INDEXES, UNVERIFIED_TTL_SECONDS
+
+SCRATCH_DB = "SolarPower-ML-indexcheck"
+
+
+def get_collection():
+    mongo_uri = os.environ.get("MONGO_URI")
+    if mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
+        client.drop_database(SCRATCH_DB)
+        return client[SCRATCH_DB]["users"], True
+    import mongomock
+    return mongomock.MongoClient()[SCRATCH_DB]["users"], False
+
+
+def main():
+    users, real_server = get_collection()
+    print(f"Backend: {'mongod' if real_server else 'mongomock'}")
+
+    first = ensure_user_indexes(users)
+    second = ensure_user_indexes(users)
+    assert first == second == [options["name"] for _, options in USER_INDEXES], (first, second)
+    print("✅ Indexes created and re-creating them is a no-op:", first)
+
+    info = users.index_information()
+    assert info["email_unique"].get("unique"), info["email_unique"]
+    assert info["email_isverified"]["key"] == [("email", 1), ("isverified", 1)]
+    ttl = info["otpExpiry_unverified_ttl"]
+    assert ttl["expireAfterSeconds"] == UNVERIFIED_TTL_SECONDS
+    assert ttl["partialFilterExpression"] == {"isverified": False}
+    print(f"✅ TTL index removes unverified users {UNVERIFIED_TTL_SECONDS}s after otpExpiry")
+
+    now = datetime.datetime.utcnow()
+    users.insert_one({"fullname": "A", "email": "a@example.com", "password": "$2b$12$hash",
+                      "isverified": True, "otp": "123456", "otpExpiry": now, "phonenumber": ""})
+    try:
+        users.insert_one({"fullname": "B", "email": "a@example.com", "password": "x", "isverified": False})
+        raise AssertionError("duplicate email was accepted")
+    except DuplicateKeyError:
+        print("✅ Duplicate email rejected by the unique index")
+
+    user = users.find_one({"email": "a@example.com"}, OTP_FIELDS)
+    assert set(user) == {"_id", "otp", "otpExpiry"}, user
+    user = users.find_one({"email": "a@example.com"}, SIGNIN_FIELDS)
+    assert set(user) == {"_id", *SIGNIN_FIELDS}, user
+    print("✅ Projections return only the requested fields")
+
+    if real_server:
+        plan = users.find({"email": "a@example.com"}, SIGNIN_FIELDS).explain()["queryPlanner"]["winningPlan"]
+        print("Email lookup plan:", plan)
+        users.database.client.drop_database(SCRATCH_DB)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Minimal local SMTP stand-in that accepts and counts every message.
+
+Speaks just enough plain SMTP (no TLS/AUTH) for smtplib. connect_delay
+and send_delay simulate the handshake and per-message cost of a remote
+server. Run it on its own for manual testing of the mail queue:
+    python -m benchmarks.smtp_sink --port 1025
+    MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=0 python app.py
+"""
+import time
+import argparse
+import threading
+import socketserver
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        sink = self.server.sink
+        time.sleep(sink.connect_delay)
+        with sink.lock:
+            sink.connections += 1
+        self._reply("220 smtp-sink ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith("EHLO"):
+                self._reply("250-smtp-sink")
+                self._reply("250 8BITMIME")
+            elif command.startswith("DATA"):
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                body = []
+                for data_line in self.rfile:
+                    if data_line in (b".\r\n", b".\n"):
+                        break
+                    body.append(data_line)
+                time.sleep(sink.send_delay)
+                if sink.fail_next > 0:
+                    with sink.lock:
+                        sink.fail_next -= 1
+                    self._reply("451 Temporary failure, try again")
+                    continue
+                with sink.lock:
+                    sink.messages.append(b"".join(body))
+                self._reply("250 OK queued")
+            elif command.startswith("QUIT"):
+                self._reply("221 Bye")
+                return
+            else:
+                # HELO, MAIL FROM, RCPT TO, RSET, NOOP
+                self._reply("250 OK")
+
+
+class SMTPSink:
+    """Threaded SMTP server on localhost; start() returns once it is listening"""
+
+    def __init__(self, port=0, connect_delay=0.0, send_delay=0.0):
+        self.connect_delay = connect_delay
+        self.send_delay = send_delay
+        self.fail_next = 0
+        self.messages = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", port), _Handler)
+        self._server.daemon_threads = True
+        self._server.sink = self
+        self.port = self._server.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=1025)
+    parser.add_argument("--connect-delay", type=float, default=0.0)
+    parser.add_argument("--send-delay", type=float, default=0.0)
+    args = parser.parse_args()
+    sink = SMTPSink(args.port, args.connect_delay, args.send_delay).start()
+    print(f"📨 SMTP sink listening on 127.0.0.1:{sink.port}")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"   {len(sink.messages)} messages over {sink.connections} connections")
+    except KeyboardInterrupt:
+        sink.stop()
+
+
+if __name__ == "__main__":
+    main()
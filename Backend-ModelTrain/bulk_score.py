@@ -0,0 +1,217 @@
+import os
+import sys
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from model_registry import ModelRegistry, read_feature_columns
+
+PREDICTION_COLUMN = "predicted_power_kW"
+PARQUET_SUFFIXES = (".parquet", ".pq")
+DAYLIGHT_VALUES = {"TRUE": 1, "FALSE": 0, "YES": 1, "NO": 0}
+
+_bundle = None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Score a large CSV / Parquet file of daily weather rows with the saved model")
+    parser.add_argument("input", help="CSV or Parquet (.parquet/.pq) file with the feature columns")
+    parser.add_argument("output", help="CSV or Parquet file to write; input columns + predicted_power_kW")
+    parser.add_argument("--chunksize", type=int, default=100_000,
+                        help="rows read, scored and written at a time (default: 100000)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="scoring processes (default: one per CPU; 1 scores in this process)")
+    parser.add_argument("--keep", nargs="*", metavar="COLUMN",
+                        help="input columns copied to the output (default: all; no names: predictions only)")
+    parser.add_argument("--forest-only", action="store_true",
+                        help="score with the memory-mapped forests instead of unpickling the sklearn model "
+                             "(less memory per worker, slower per row)")
+    return parser.parse_args()
+
+
+def is_parquet(path):
+    return path.lower().endswith(PARQUET_SUFFIXES)
+
+
+def input_columns(path):
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).schema_arrow.names
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def read_chunks(path, columns, chunksize):
+    """Yield DataFrames of at most chunksize rows holding only the given columns"""
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=columns)
+
+
+def feature_matrix(df, feature_columns):
+    """float64 matrix of the feature columns; unparseable values become NaN"""
+    X = np.empty((len(df), len(feature_columns)), dtype=np.float64)
+    for j, col in enumerate(feature_columns):
+        values = df[col]
+        if col == "Is Daylight" and not pd.api.types.is_numeric_dtype(values):
+            values = values.astype(str).str.upper().replace(DAYLIGHT_VALUES)
+        X[:, j] = pd.to_numeric(values, errors="coerce")
+    return X
+
+
+def _init_worker(forest_only):
+    global _bundle
+    _bundle = ModelRegistry(lazy=forest_only, forest_only=forest_only).get()
+    if _bundle is None:
+        raise RuntimeError("No trained model found. Run train_model.py first.")
+
+
+def score_matrix(X):
+    """Predictions for every row of X, NaN for rows with a missing, non-numeric or infinite feature"""
+    predicted = np.full(len(X), np.nan)
+    valid = np.isfinite(X).all(axis=1)
+    if valid.any():
+        predicted[valid] = np.round(_bundle.predict(X[valid]), 3)
+    return predicted
+
+
+def file_schema(schema):
+    """Parquet schema for the whole output, from the first chunk's schema.
+
+    pandas infers CSV types per chunk: an integer column turns float in a
+    chunk with a blank value, so integer columns are written as float64.
+    The first chunk's pandas metadata is dropped, since it would no longer
+    match the later chunks.
+    """
+    import pyarrow as pa
+    return pa.schema([pa.field(f.name, pa.float64()) if pa.types.is_integer(f.type) else f for f in schema])
+
+
+class ChunkWriter:
+    """Appends scored chunks to <path>.tmp and renames it to path on close(); abort() discards it"""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.parquet = is_parquet(path)
+        self._file = None
+        self._writer = None
+
+    def write(self, df):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.tmp_path, file_schema(table.schema))
+            try:
+                table = table.cast(self._writer.schema)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                raise ValueError(f"A column changed type between chunks and cannot be written "
+                                 f"as {self._writer.schema}: {e}")
+            self._writer.write_table(table)
+        else:
+            header = self._file is None
+            if header:
+                self._file = open(self.tmp_path, "w", newline="")
+            df.to_csv(self._file, header=header, index=False)
+
+    def _close_files(self):
+        if self._writer is not None:
+            self._writer.close()
+        if self._file is not None:
+            self._file.close()
+
+    def close(self):
+        self._close_files()
+        if os.path.exists(self.tmp_path):
+            os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self._close_files()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+def score_file(input_path, output_path, chunksize=100_000, workers=None, keep=None, forest_only=False):
+    """Stream input_path through the model into output_path; returns (rows, invalid rows, seconds).
+
+    Reading and writing stay in this process while chunks are scored in a
+    pool of workers that each load the model once. At most two chunks per
+    worker are in flight and results are written in input order, so
+    memory depends on chunksize and workers, not on the file size.
+    """
+    feature_columns = read_feature_columns()
+    available = input_columns(input_path)
+    missing = [col for col in feature_columns if col not in available]
+    if missing:
+        raise ValueError(f"Missing feature columns in {input_path}: {', '.join(missing)}")
+    unknown = [col for col in keep or () if col not in available]
+    if unknown:
+        raise ValueError(f"--keep columns not in {input_path}: {', '.join(unknown)}")
+    kept = available if keep is None else [col for col in available if col in keep]
+    columns = [col for col in available if col in kept or col in feature_columns]
+
+    workers = workers or os.cpu_count()
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                               initargs=(forest_only,)) if workers > 1 else None
+    if pool is None:
+        _init_worker(forest_only)
+    writer = ChunkWriter(output_path)
+    in_flight = deque()
+    rows = invalid = 0
+    start = time.perf_counter()
+
+    def write_oldest():
+        nonlocal rows, invalid
+        chunk, predicted = in_flight.popleft()
+        predicted = predicted.result() if pool is not None else predicted
+        chunk[PREDICTION_COLUMN] = predicted
+        writer.write(chunk)
+        rows += len(chunk)
+        invalid += int(np.isnan(predicted).sum())
+
+    try:
+        for df in read_chunks(input_path, columns, chunksize):
+            X = feature_matrix(df, feature_columns)
+            chunk = df[kept].copy() if len(kept) != len(df.columns) else df
+            in_flight.append((chunk, pool.submit(score_matrix, X) if pool is not None else score_matrix(X)))
+            if len(in_flight) >= 2 * workers:
+                write_oldest()
+        while in_flight:
+            write_oldest()
+    except BaseException:
+        writer.abort()
+        raise
+    else:
+        writer.close()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    return rows, invalid, time.perf_counter() - start
+
+
+def main():
+    args = parse_args()
+    if not os.path.exists(args.input):
+        print(f"❌ ERROR: {args.input} not found!")
+        sys.exit(1)
+    try:
+        rows, invalid, seconds = score_file(args.input, args.output, chunksize=args.chunksize,
+                                            workers=args.workers, keep=args.keep, forest_only=args.forest_only)
+    except ValueError as e:
+        print(f"❌ ERROR: {e}")
+        sys.exit(1)
+    print(f"✅ Scored {rows} rows in {seconds:.2f}s ({rows / max(seconds, 1e-9) * 60:,.0f} rows/min) "
+          f"→ {args.output}")
+    if invalid:
+        print(f"⚠️ {invalid} rows had missing, non-numeric or infinite features; their {PREDICTION_COLUMN} is empty")
+
+
+if __name__ == "__main__":
+    main()
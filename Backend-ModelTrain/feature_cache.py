@@ -0,0 +1,79 @@
+import os
+import json
+import hashlib
+from flat_forest import file_sha256
+from stage_profiler import profiler
+
+CACHE_DIR = ".cache"
+
+# Bump when clean_hourly/aggregate_daily change what they produce.
+PIPELINE_VERSION = 1
+
+
+def cache_key(data_path, config):
+    """Key a cached daily table by the input file's content and the pipeline config"""
+    payload = json.dumps({"version": PIPELINE_VERSION, "config": config}, sort_keys=True)
+    digest = hashlib.sha256(file_sha256(data_path).encode() + payload.encode())
+    return digest.hexdigest()[:16]
+
+
+def appended_path(cache_dir=CACHE_DIR):
+    """Daily rows added by incremental retrains, kept on top of the base table"""
+    return os.path.join(cache_dir, "daily_power-appended.arrow")
+
+
+def cache_path(key, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, f"daily_power-{key}.arrow")
+
+
+def read_table(path):
+    """Memory-map an Arrow IPC file into a DataFrame, or None if it does not exist"""
+    if not os.path.exists(path):
+        return None
+    import pyarrow.feather as feather
+    return feather.read_table(path, memory_map=True).to_pandas()
+
+
+def write_table(df, path):
+    """Write df as an uncompressed Arrow IPC file so later runs can memory-map it"""
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    feather.write_feather(pa.Table.from_pandas(df, preserve_index=False),
+                          tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_cached(key, cache_dir=CACHE_DIR):
+    """Memory-map a cached daily table, or None if it is not cached"""
+    return read_table(cache_path(key, cache_dir))
+
+
+def save_cached(key, daily_power, cache_dir=CACHE_DIR):
+    return write_table(daily_power, cache_path(key, cache_dir))
+
+
+def cached_daily_power(data_path, config, build, rebuild=False, cache_dir=CACHE_DIR):
+    """Return the cached daily table for (data_path, config), building and caching it on a miss"""
+    key = cache_key(data_path, config)
+    if not rebuild:
+        try:
+            with profiler.stage("load_cache"):
+                daily_power = load_cached(key, cache_dir)
+        except ImportError:
+            print("⚠️ pyarrow is not installed, skipping the feature cache")
+            return build()
+        if daily_power is not None:
+            print(f"✅ Loaded cleaned daily features from cache ({cache_path(key, cache_dir)})")
+            return daily_power
+
+    daily_power = build()
+    try:
+        with profiler.stage("save_cache"):
+            path = save_cached(key, daily_power, cache_dir)
+        print(f"✅ Cached cleaned daily features to {path}")
+    except ImportError:
+        print("⚠️ pyarrow is not installed, skipping the feature cache")
+    return daily_power
@@ -0,0 +1,300 @@
+import os
+import mmap
+import struct
+import hashlib
+import zipfile
+import numpy as np
+
+FOREST_PATH = "forest_nodes.npz"
+FUSED_FOREST_PATH = "fused_forest.npz"
+
+# Above this many rows sklearn's compiled per-tree traversal overtakes the
+# array walk (see benchmarks/bench_flat_forest.py), so callers hand larger
+# batches back to model.predict.
+FLAT_FOREST_MAX_BATCH = 512
+
+# predict() walks at most this many rows at a time, which caps the
+# (rows x trees) index arrays a request allocates at a few MB.
+PREDICT_CHUNK_ROWS = 2048
+
+# Every this many levels, (sample, tree) pairs that reached a leaf are
+# dropped from the walk; most paths end well before max_depth.
+_COMPACT_EVERY = 4
+
+# sklearn marks leaves with feature == -2 and children == -1.
+_TREE_LEAF = -1
+
+
+def _mmap_npz(path):
+    """Arrays of an uncompressed .npz as read-only views over one shared file mapping.
+
+    np.savez stores each array as a plain .npy member, so the data can be
+    mapped in place instead of copied: every process mapping the same
+    file shares its page-cache pages. Compressed members are read normally.
+    """
+    arrays = {}
+    with open(path, "rb") as f, zipfile.ZipFile(f) as archive:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        for info in archive.infolist():
+            name = info.filename[:-len(".npy")] if info.filename.endswith(".npy") else info.filename
+            if info.compress_type != zipfile.ZIP_STORED:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+            # Local file header: 30 fixed bytes, then the name and extra field.
+            name_len, extra_len = struct.unpack("<HH", buffer[info.header_offset + 26:info.header_offset + 30])
+            start = info.header_offset + 30 + name_len + extra_len
+            with archive.open(info) as member:
+                version = np.lib.format.read_magic(member)
+                read_header = (np.lib.format.read_array_header_1_0 if version == (1, 0)
+                               else np.lib.format.read_array_header_2_0)
+                shape, fortran_order, dtype = read_header(member)
+                data_offset = start + member.tell()
+            if dtype.hasobject or fortran_order:
+                with archive.open(info) as member:
+                    arrays[name] = np.lib.format.read_array(member)
+                continue
+            count = int(np.prod(shape, dtype=np.int64))
+            arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=data_offset).reshape(shape)
+    return arrays
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FlatForest:
+    """A RandomForestRegressor flattened into contiguous node arrays.
+
+    Every tree lives in the same feature/threshold/left/right/value arrays,
+    with child indices already offset to global positions and leaves
+    pointing at themselves. predict() walks all trees for the whole batch
+    at once, one array step per tree level.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth,
+                 source_sha256="", scaler_sha256="", fused=False, children=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.source_sha256 = str(source_sha256)
+        # A fused forest has the StandardScaler folded into its thresholds
+        # and takes raw float64 features; scaler_sha256 names that scaler.
+        self.scaler_sha256 = str(scaler_sha256)
+        self.fused = bool(fused)
+        # Interleaved [left, right] pairs so one take() picks the next node.
+        # Saved with the forest so a memory-mapped load needs no private copy.
+        if children is None:
+            children = np.stack([left, right], axis=1).ravel().astype(np.int64)
+        self.children = children
+        self.is_leaf = self.left == np.arange(len(self.left), dtype=self.left.dtype)
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @property
+    def node_count(self):
+        return len(self.feature)
+
+    @classmethod
+    def from_model(cls, model, source_sha256=""):
+        """Flatten a fitted single-output RandomForestRegressor"""
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n = tree.node_count
+            node_ids = np.arange(n, dtype=np.int32)
+            is_leaf = tree.children_left == _TREE_LEAF
+
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(np.where(is_leaf, np.inf, tree.threshold).astype(np.float64))
+            lefts.append((np.where(is_leaf, node_ids, tree.children_left) + offset).astype(np.int32))
+            rights.append((np.where(is_leaf, node_ids, tree.children_right) + offset).astype(np.int32))
+            values.append(tree.value[:, 0, 0].astype(np.float64))
+            roots.append(offset)
+
+            offset += n
+            max_depth = max(max_depth, tree.max_depth)
+
+        return cls(
+            np.concatenate(features), np.concatenate(thresholds),
+            np.concatenate(lefts), np.concatenate(rights), np.concatenate(values),
+            np.asarray(roots, dtype=np.int32), max_depth, source_sha256,
+        )
+
+    def save(self, path=FOREST_PATH):
+        # Written beside the target and renamed over it: processes that have
+        # the old file memory-mapped keep reading the old inode intact.
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f, feature=self.feature, threshold=self.threshold, left=self.left,
+                right=self.right, value=self.value, roots=self.roots, children=self.children,
+                max_depth=self.max_depth, source_sha256=self.source_sha256,
+                scaler_sha256=self.scaler_sha256, fused=self.fused,
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=FOREST_PATH, mmap_mode=True):
+        """Load a saved forest, memory-mapping its node arrays unless mmap_mode is False"""
+        if mmap_mode:
+            data = _mmap_npz(path)
+        else:
+            with np.load(path) as npz:
+                data = {name: npz[name] for name in npz.files}
+        return cls(
+            data["feature"], data["threshold"], data["left"], data["right"],
+            data["value"], data["roots"], data["max_depth"][()], data["source_sha256"][()],
+            data["scaler_sha256"][()] if "scaler_sha256" in data else "",
+            data["fused"][()] if "fused" in data else False,
+            data.get("children"),
+        )
+
+    def predict(self, X):
+        """Mean of all trees' leaf values for every row of X (raw if fused, else already scaled)"""
+        # sklearn compares float32 inputs against float64 thresholds; do the same.
+        # Fused thresholds already account for that rounding and take float64.
+        X = np.asarray(X, dtype=np.float64 if self.fused else np.float32)
+        if len(X) > PREDICT_CHUNK_ROWS:
+            return np.concatenate([self._predict(X[start:start + PREDICT_CHUNK_ROWS])
+                                   for start in range(0, len(X), PREDICT_CHUNK_ROWS)])
+        return self._predict(X)
+
+    def _predict(self, X):
+        n_samples, n_features = X.shape
+        X_flat = X.ravel()
+
+        # One entry per (sample, tree) pair, walked down one level per step;
+        # finished pairs park their leaf in `leaves` and leave the walk.
+        row_offsets = np.repeat(np.arange(n_samples, dtype=np.int64) * n_features, self.n_trees)
+        nodes = np.tile(self.roots.astype(np.int64), n_samples)
+        positions = np.arange(len(nodes))
+        leaves = np.empty(len(nodes), dtype=np.int64)
+        for level in range(1, self.max_depth + 1):
+            go_right = X_flat.take(row_offsets + self.feature.take(nodes)) > self.threshold.take(nodes)
+            nodes = self.children.take(2 * nodes + go_right)
+            if level % _COMPACT_EVERY == 0:
+                done = self.is_leaf.take(nodes)
+                leaves[positions[done]] = nodes[done]
+                active = ~done
+                nodes, positions, row_offsets = nodes[active], positions[active], row_offsets[active]
+                if not len(nodes):
+                    break
+        leaves[positions] = nodes
+
+        return self.value.take(leaves).reshape(n_samples, self.n_trees).mean(axis=1)
+
+
+def _float_key(x):
+    """Map float64 values to int64 keys with the same ordering"""
+    bits = x.view(np.int64)
+    return np.where(bits < 0, np.iinfo(np.int64).min - bits, bits)
+
+
+def _key_float(key):
+    bits = np.where(key < 0, np.iinfo(np.int64).min - key, key)
+    return bits.view(np.float64)
+
+
+def _raw_thresholds(threshold, mean, scale):
+    """Largest raw x per node such that float32((x - mean) / scale) <= threshold.
+
+    Scaling and the float32 cast are both monotonic, so the set of raw
+    values that go left is a half-line; a binary search over the ordered
+    float64 bit patterns finds its exact end point.
+    """
+    biggest = np.finfo(np.float64).max
+    lo = np.full(threshold.shape, _float_key(np.array(-biggest))[()], dtype=np.int64)
+    hi = np.full(threshold.shape, _float_key(np.array(biggest))[()], dtype=np.int64)
+    with np.errstate(over="ignore", invalid="ignore"):
+        for _ in range(64):
+            mid = (lo >> 1) + (hi >> 1) + (lo & hi & 1)
+            x = _key_float(mid)
+            goes_left = ((x - mean) / scale).astype(np.float32) <= threshold
+            lo = np.where(goes_left, mid, lo)
+            hi = np.where(goes_left, hi, mid)
+    return _key_float(lo)
+
+
+def fold_scaler(forest, scaler, scaler_sha256=""):
+    """Fused copy of forest whose thresholds are in raw-feature units"""
+    mean = scaler.mean_ if scaler.mean_ is not None else np.zeros(scaler.n_features_in_)
+    scale = scaler.scale_ if scaler.scale_ is not None else np.ones(scaler.n_features_in_)
+    is_leaf = np.isinf(forest.threshold)
+    split = ~is_leaf
+
+    threshold = forest.threshold.copy()
+    threshold[split] = _raw_thresholds(
+        forest.threshold[split], mean[forest.feature[split]], scale[forest.feature[split]]
+    )
+    return FlatForest(
+        forest.feature, threshold, forest.left, forest.right, forest.value, forest.roots,
+        forest.max_depth, forest.source_sha256, scaler_sha256, fused=True,
+    )
+
+
+def check_parity(model, forest, X, scaler=None, atol=1e-9):
+    """Max absolute difference between FlatForest and model.predict; raises if above atol.
+
+    X is already scaled for a plain forest and raw for a fused one, in
+    which case scaler is used to produce model.predict's input.
+    """
+    expected = model.predict(scaler.transform(X) if forest.fused else X)
+    actual = forest.predict(X)
+    max_diff = float(np.max(np.abs(expected - actual))) if len(expected) else 0.0
+    if max_diff > atol:
+        raise AssertionError(f"Flat forest diverges from model.predict (max abs diff {max_diff:.3g})")
+    return max_diff
+
+
+def export_flat_forest(model, model_path, path=FOREST_PATH):
+    """Flatten model and save it next to the pickle it was loaded from"""
+    forest = FlatForest.from_model(model, source_sha256=file_sha256(model_path))
+    forest.save(path)
+    return forest
+
+
+def export_fused_forest(forest, scaler, scaler_path, path=FUSED_FOREST_PATH):
+    """Fold scaler into an exported forest and save the fused artifact"""
+    fused = fold_scaler(forest, scaler, scaler_sha256=file_sha256(scaler_path))
+    fused.save(path)
+    return fused
+
+
+if __name__ == "__main__":
+    import sys
+    import joblib
+    import pandas as pd
+    from model_registry import MODEL_PATH, SCALER_PATH, FEATURE_PATH
+
+    model = joblib.load(MODEL_PATH)
+    scaler = joblib.load(SCALER_PATH)
+    forest = export_flat_forest(model, MODEL_PATH)
+    X = pd.read_csv(FEATURE_PATH)
+    max_diff = check_parity(model, forest, scaler.transform(X))
+    print(f"✅ Exported {forest.n_trees} trees ({forest.node_count} nodes) to {FOREST_PATH}")
+    print(f"✅ Parity check passed on {len(X)} rows (max abs diff {max_diff:.3g})")
+
+    if "--fused" in sys.argv:
+        fused = export_fused_forest(forest, scaler, SCALER_PATH)
+        print(f"✅ Exported scaler-fused forest to {FUSED_FOREST_PATH}")
+
+        # Check the fused thresholds on every daily row plus every hourly row
+        # of the raw dataset, which covers far more distinct feature values.
+        hourly = pd.read_csv("Solar_Power_Prediction.csv")
+        hourly["Is Daylight"] = hourly["Is Daylight"].astype(str).str.upper().map({"TRUE": 1, "FALSE": 0, "YES": 1, "NO": 0})
+        X_all = pd.concat([X, hourly[X.columns]], ignore_index=True).astype(np.float64)
+        max_diff = check_parity(model, fused, X_all, scaler=scaler)
+        print(f"✅ Fused parity check passed on {len(X_all)} rows (max abs diff {max_diff:.3g})")
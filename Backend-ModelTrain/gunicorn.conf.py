@@ -0,0 +1,6 @@
+import os
+
+# SHARED_MODEL=1: import the app once in the master, which memory-maps the
+# exported forests; forked workers inherit the read-only mappings instead
+# of each unpickling its own copy of the sklearn model.
+preload_app = os.environ.get("SHARED_MODEL", "0") == "1"
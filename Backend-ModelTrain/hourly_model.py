@@ -0,0 +1,191 @@
+import os
+import csv
+import datetime
+import threading
+import numpy as np
+from model_registry import ModelRegistry
+from metrics import mark_stage
+
+HOURLY_MODEL_PATH = "hourly_random_forest_model.pkl"
+HOURLY_SCALER_PATH = "hourly_scaler.pkl"
+HOURLY_FEATURE_PATH = "hourly_feature_columns.csv"
+HOURLY_FOREST_PATH = "hourly_forest_nodes.npz"
+HOURLY_FUSED_FOREST_PATH = "hourly_fused_forest.npz"
+SOLAR_GEOMETRY_PATH = "hourly_solar_geometry.csv"
+HOURLY_ARTIFACT_PATHS = [HOURLY_MODEL_PATH, HOURLY_SCALER_PATH, HOURLY_FEATURE_PATH,
+                         HOURLY_FOREST_PATH, HOURLY_FUSED_FOREST_PATH, SOLAR_GEOMETRY_PATH]
+HOURLY_DROP_COLS = ["Power Generated", "Year", "Day of Year"]
+
+# The CSV has one row per 3-hour period; each day has these eight.
+PERIOD_HOURS = (1, 4, 7, 10, 13, 16, 19, 22)
+# Measured per period in the CSV: a request may give one value for the
+# whole day or a list with one value per period.
+PERIOD_FIELDS = ("Sky Cover", "Visibility", "Relative Humidity",
+                 "Average Wind Speed (Period)", "Average Barometric Pressure (Period)")
+# Fixed by the date and hour at the site, looked up from the training
+# data unless the request overrides them per period.
+GEOMETRY_FIELDS = ("Is Daylight", "Distance to Solar Noon")
+
+
+class HourlyInputError(ValueError):
+    """A request the hourly model cannot score; the message is meant for the client"""
+
+
+def _day_of_year(month, day):
+    # A leap year, so 29 February is a valid date.
+    return datetime.date(2000, month, day).timetuple().tm_yday
+
+
+class SolarGeometry:
+    """Is Daylight / Distance to Solar Noon of every period, per calendar day of the training data.
+
+    A day missing from the table (e.g. 29 February) borrows the periods of
+    the nearest day that is in it.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self._days = np.array(sorted(table))
+
+    @classmethod
+    def from_hourly(cls, df):
+        grouped = df.groupby(["Month", "Day", "First Hour of Period"])[list(GEOMETRY_FIELDS)].mean()
+        table = {}
+        for (month, day, hour), row in grouped.iterrows():
+            periods = table.setdefault(_day_of_year(int(month), int(day)), {})
+            periods[int(hour)] = (round(float(row["Is Daylight"])), float(row["Distance to Solar Noon"]))
+        return cls({doy: np.array([periods[h] for h in PERIOD_HOURS]) for doy, periods in table.items()
+                    if len(periods) == len(PERIOD_HOURS)})
+
+    def save(self, path=SOLAR_GEOMETRY_PATH):
+        with open(path + ".tmp", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["Day of Year", "First Hour of Period", *GEOMETRY_FIELDS])
+            for doy in self._days.tolist():
+                for hour, (daylight, distance) in zip(PERIOD_HOURS, self.table[doy].tolist()):
+                    writer.writerow([doy, hour, int(daylight), repr(distance)])
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path=SOLAR_GEOMETRY_PATH):
+        periods = {}
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                periods.setdefault(int(row["Day of Year"]), {})[int(row["First Hour of Period"])] = (
+                    float(row["Is Daylight"]), float(row["Distance to Solar Noon"]))
+        return cls({doy: np.array([p[h] for h in PERIOD_HOURS]) for doy, p in periods.items()})
+
+    def periods(self, month, day):
+        """(8, 2) array of Is Daylight and Distance to Solar Noon for the day's periods"""
+        doy = _day_of_year(month, day)
+        # Distance around the calendar, so 31 December is next to 1 January.
+        gap = np.abs(self._days - doy)
+        nearest = self._days[np.argmin(np.minimum(gap, 366 - gap))]
+        return self.table[int(nearest)]
+
+
+_geometry_lock = threading.Lock()
+_geometry_cache = {}
+
+
+def solar_geometry(path=SOLAR_GEOMETRY_PATH):
+    """The saved SolarGeometry, re-read only when the file changes; None if it does not exist"""
+    try:
+        signature = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    cached = _geometry_cache.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    with _geometry_lock:
+        geometry = SolarGeometry.load(path)
+        _geometry_cache[path] = (signature, geometry)
+    return geometry
+
+
+def _period_values(value):
+    if isinstance(value, (list, tuple)):
+        return [float(v) for v in value]
+    return float(value)
+
+
+def build_day_matrix(bundle, data, geometry):
+    """(8, n_features) float64 matrix of one day's periods in the bundle's column order.
+
+    Day-level fields are repeated on every row, PERIOD_FIELDS may vary per
+    period and GEOMETRY_FIELDS come from geometry unless given as one
+    value per period; a single value (e.g. a daily "Is Daylight": 1) would
+    mark night periods as daylight. Raises HourlyInputError when the
+    request cannot be scored.
+    """
+    try:
+        month, day = int(data["Month"]), int(data["Day"])
+        _day_of_year(month, day)
+    except KeyError:
+        raise HourlyInputError("Missing fields: Month, Day")
+    except (TypeError, ValueError):
+        raise HourlyInputError("Month and Day must form a valid calendar date")
+
+    columns = bundle.feature_columns
+    X = np.empty((len(PERIOD_HOURS), len(columns)), dtype=np.float64)
+    given = set(data)
+    if not set(GEOMETRY_FIELDS) <= given:
+        sun = geometry.periods(month, day)
+    missing, invalid, wrong_length = [], [], []
+    for j, col in enumerate(columns):
+        if col == "First Hour of Period":
+            X[:, j] = PERIOD_HOURS
+        elif col in given:
+            value = data[col]
+            is_list = isinstance(value, (list, tuple))
+            if (is_list and len(value) != len(PERIOD_HOURS)) or (col in GEOMETRY_FIELDS and not is_list):
+                wrong_length.append(col)
+                continue
+            try:
+                X[:, j] = _period_values(value)
+            except (TypeError, ValueError):
+                invalid.append(col)
+        elif col in GEOMETRY_FIELDS:
+            X[:, j] = sun[:, GEOMETRY_FIELDS.index(col)]
+        else:
+            missing.append(col)
+    if missing:
+        raise HourlyInputError(f"Missing fields: {', '.join(missing)}")
+    if invalid:
+        raise HourlyInputError(f"Non-numeric fields: {', '.join(invalid)}")
+    if wrong_length:
+        geometry_given = [col for col in wrong_length if col in GEOMETRY_FIELDS]
+        if geometry_given:
+            raise HourlyInputError(f"Give {len(PERIOD_HOURS)} values (one per period) for "
+                                   f"{', '.join(geometry_given)} or leave them out to use the site's solar geometry")
+        raise HourlyInputError(f"Need one value or {len(PERIOD_HOURS)} (one per period) for: {', '.join(wrong_length)}")
+    finite = np.isfinite(X).all(axis=0).tolist()
+    if not all(finite):
+        raise HourlyInputError(f"Non-finite fields: {', '.join(col for col, ok in zip(columns, finite) if not ok)}")
+    return X
+
+
+def predict_day_curve(bundle, data, geometry):
+    """Predicted kW of each 3-hour period of one day, scored in a single predict call"""
+    X = build_day_matrix(bundle, data, geometry)
+    mark_stage("features")
+    columns = bundle.feature_columns
+    predicted = bundle.predict(X.copy()).tolist()
+    mark_stage("model")
+    periods = []
+    for i, hour in enumerate(PERIOD_HOURS):
+        period = {"First Hour of Period": hour, "predicted_power_kW": round(predicted[i], 3)}
+        for field in GEOMETRY_FIELDS:
+            if field in columns:
+                period[field] = round(float(X[i, columns.index(field)]), 6)
+        periods.append(period)
+    return {
+        "Month": int(data["Month"]),
+        "Day": int(data["Day"]),
+        "periods": periods,
+        "daily_total_kW": round(sum(predicted), 3),
+    }
+
+
+hourly_registry = ModelRegistry(HOURLY_MODEL_PATH, HOURLY_SCALER_PATH, HOURLY_FEATURE_PATH,
+                                HOURLY_FOREST_PATH, HOURLY_FUSED_FOREST_PATH)
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+from sklearn.impute import KNNImputer
+from sklearn.neighbors import KDTree
+
+IMPUTE_METHODS = ("knn", "kdtree", "interpolate")
+TIME_COLUMNS = ["Year", "Month", "Day", "First Hour of Period"]
+
+
+def knn_impute(df, columns, n_neighbors=3):
+    """Brute-force KNNImputer over columns (O(n²) distances, the original behaviour)"""
+    imputer = KNNImputer(n_neighbors=n_neighbors)
+    df[columns] = imputer.fit_transform(df[columns])
+    return df
+
+
+def kdtree_impute(df, columns, n_neighbors=3, chunk_size=65536):
+    """Nearest-neighbour imputation backed by a KD-tree, queried in fixed-size chunks.
+
+    Each column with gaps is filled with the mean of its n_neighbors
+    nearest donor rows, measuring euclidean distance over all the other
+    columns like KNNImputer does (stray gaps in those coordinates count as
+    the column mean). Memory is the tree over the donors plus one chunk of
+    queries, instead of KNNImputer's full pairwise distance matrix.
+    """
+    values = df[columns].to_numpy(dtype=np.float64)
+    missing = np.isnan(values)
+    gap_columns = np.flatnonzero(missing.any(axis=0))
+    if len(gap_columns) == 0:
+        return df
+
+    coords = np.where(missing, np.nanmean(values, axis=0), values)
+    filled = values.copy()
+    for j in gap_columns:
+        donors = np.flatnonzero(~missing[:, j])
+        queries = np.flatnonzero(missing[:, j])
+        if len(donors) == 0:
+            continue
+        others = np.arange(values.shape[1]) != j
+        k = min(n_neighbors, len(donors))
+        tree = KDTree(coords[np.ix_(donors, others)])
+        for start in range(0, len(queries), chunk_size):
+            rows = queries[start:start + chunk_size]
+            _, neighbours = tree.query(coords[np.ix_(rows, others)], k=k)
+            filled[rows, j] = values[donors[neighbours], j].mean(axis=1)
+
+    df[columns] = filled
+    return df
+
+
+def interpolate_impute(df, columns, group_columns=None, n_neighbors=3, chunk_size=65536):
+    """Time-aware linear interpolation between the neighbouring periods of each gap.
+
+    Rows are ordered by Year/Month/Day/First Hour of Period (separately per
+    group_columns, e.g. a site id) and each gap is interpolated in time,
+    with leading/trailing gaps taking the nearest observed value. Anything
+    left over (no time columns, or a group with no observations) goes
+    through kdtree_impute.
+    """
+    if all(col in df.columns for col in TIME_COLUMNS):
+        timestamps = pd.to_datetime(df[["Year", "Month", "Day"]].rename(columns=str.lower))
+        timestamps = timestamps + pd.to_timedelta(df["First Hour of Period"], unit="h")
+        gap_columns = [col for col in columns if df[col].isna().any()]
+        groups = [df.index] if not group_columns else df.groupby(group_columns).groups.values()
+        for index in groups:
+            order = timestamps.loc[index].sort_values(kind="stable").index
+            for col in gap_columns:
+                series = pd.Series(df.loc[order, col].to_numpy(dtype=np.float64), index=timestamps.loc[order])
+                df.loc[order, col] = series.interpolate(method="time", limit_direction="both").to_numpy()
+
+    if df[columns].isna().any().any():
+        kdtree_impute(df, columns, n_neighbors=n_neighbors, chunk_size=chunk_size)
+    return df
+
+
+def impute_numeric(df, method="knn", n_neighbors=3, chunk_size=65536, group_columns=None):
+    """Fill missing values in every numeric column of df in place"""
+    columns = df.select_dtypes(include=[np.number]).columns
+    if method == "knn":
+        return knn_impute(df, columns, n_neighbors=n_neighbors)
+    if method == "kdtree":
+        return kdtree_impute(df, columns, n_neighbors=n_neighbors, chunk_size=chunk_size)
+    if method == "interpolate":
+        return interpolate_impute(df, columns, group_columns=group_columns,
+                                  n_neighbors=n_neighbors, chunk_size=chunk_size)
+    raise ValueError(f"Unknown imputation method '{method}', expected one of {', '.join(IMPUTE_METHODS)}")
@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import shutil
+import datetime
+import pandas as pd
+from model_registry import content_hash
+from ingest import DAY_KEYS
+
+# How many of publish_version's paths the registry hashes into its version:
+# model, scaler, feature columns, flat forest, fused forest.
+REGISTRY_ARTIFACTS = 5
+
+VERSIONS_DIR = "model_versions"
+MANIFEST_PATH = os.path.join(VERSIONS_DIR, "manifest.json")
+
+
+def read_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return []
+    with open(MANIFEST_PATH) as f:
+        return json.load(f)
+
+
+def record_version(entry):
+    """Append a published version to model_versions/manifest.json"""
+    manifest = read_manifest()
+    manifest.append(entry)
+    os.makedirs(VERSIONS_DIR, exist_ok=True)
+    tmp_path = MANIFEST_PATH + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def publish_version(paths, **info):
+    """Copy the live artifacts into model_versions/<version>/ and record them.
+
+    The live files stay where the backend reads them, so the registry
+    hot-reloads the new version while older ones remain on disk to roll
+    back to. paths start with the registry's artifacts in ModelRegistry
+    order, so the version id is the one /api/model/status reports.
+    """
+    version = content_hash(paths[:REGISTRY_ARTIFACTS])
+    version_dir = os.path.join(VERSIONS_DIR, version)
+    os.makedirs(version_dir, exist_ok=True)
+    for path in paths:
+        if os.path.exists(path):
+            shutil.copy2(path, version_dir)
+
+    entry = {"version": version, "published_at": datetime.datetime.utcnow().isoformat() + "Z", **info}
+    record_version(entry)
+    return entry
+
+
+def publish_baseline(paths):
+    """Publish the live artifacts as a "baseline" version before a retrain overwrites them.
+
+    Models trained before versioning, or copied in by hand, are not in the
+    manifest yet and would otherwise be lost. Returns the new entry, or
+    None when there is no live model or its version is already published.
+    """
+    if not os.path.exists(paths[0]):
+        return None
+    version = content_hash(paths[:REGISTRY_ARTIFACTS])
+    if any(entry["version"] == version for entry in read_manifest()):
+        return None
+    return publish_version(paths, mode="baseline")
+
+
+def last_full_fit_seconds():
+    """Fit time of the most recent full retrain, if one was recorded"""
+    for entry in reversed(read_manifest()):
+        if entry.get("mode") == "full" and entry.get("fit_seconds"):
+            return entry["fit_seconds"]
+    return None
+
+
+def append_daily_rows(base, new_rows):
+    """Union of two daily tables, newer rows winning for days present in both"""
+    combined = pd.concat([base, new_rows], ignore_index=True)
+    combined = combined.drop_duplicates(subset=DAY_KEYS, keep="last")
+    return combined.sort_values(by=DAY_KEYS).reset_index(drop=True)
+
+
+def recent_window(daily_power, window_days):
+    """Rows within window_days of the latest day in the table"""
+    dates = pd.to_datetime(daily_power[DAY_KEYS].rename(columns=str.lower))
+    return daily_power[dates > dates.max() - pd.Timedelta(days=window_days)]
+
+
+def warm_start_forest(model, X_scaled, y, add_trees, replace_oldest=False, seed=None):
+    """Grow add_trees new trees on (X_scaled, y), optionally retiring as many of the oldest.
+
+    sklearn seeds the new trees from random_state, skipping as many seeds
+    as there are trees. After retiring trees that count shrinks, so a fixed
+    random_state would hand every run the same seeds; pass a per-run seed.
+    Returns the seconds spent fitting the new trees.
+    """
+    if replace_oldest:
+        model.estimators_ = model.estimators_[add_trees:]
+    if seed is not None:
+        model.set_params(random_state=seed)
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + add_trees, n_jobs=-1)
+    start = time.perf_counter()
+    model.fit(X_scaled, y)
+    elapsed = time.perf_counter() - start
+    model.set_params(warm_start=False, n_jobs=None)
+    return elapsed
@@ -1,41 +1,73 @@
 import os
 import datetime
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
-from flask_bcrypt import Bcrypt
-from pymongo import MongoClient
-import pandas as pd
-import joblib
-import numpy as np
+from pymongo.errors import DuplicateKeyError
+from model_registry import registry, MODEL_PATH, SCALER_PATH, FEATURE_PATH
+from inference import predict_batch, predict_row, micro_batcher, InvalidFeatureError
+from hourly_model import hourly_registry, solar_geometry, predict_day_curve, HourlyInputError
+from micro_batcher import QueueFullError
+from prediction_cache import prediction_cache
+from mongo_connection import MongoConnection
+from user_store import ensure_user_indexes, SIGNIN_FIELDS, EXISTS_FIELDS
+from metrics import metrics, mark_stage, stages_sampled, WSGIRequestTimer
+from password_hasher import password_hasher_from_env, HasherBusyError
 
 load_dotenv()
 app = Flask(__name__)
 CORS(app)
-bcrypt = Bcrypt(app)
 
-mongo_uri = os.environ.get("MONGO_URI")
-client = MongoClient(mongo_uri)
-db = client["SolarPower-ML"]
-users_collection = db["users"]
+# Per-route and per-stage latency histograms, scraped from /metrics.
+app.wsgi_app = WSGIRequestTimer(app, metrics)
 
+@app.before_request
+def time_json_parsing():
+    if stages_sampled() and request.is_json:
+        # Parsed here and cached by Flask, so the route's get_json() is free.
+        request.get_json(silent=True)
+        mark_stage("parse")
 
-MODEL_PATH = "random_forest_model.pkl"
-SCALER_PATH = "scaler.pkl"
-FEATURE_PATH = "feature_columns.csv"
+# The client is created on first use in each worker process, after gunicorn
+# forks; pool size, timeouts and read preference come from MONGO_* variables.
+mongo = MongoConnection.from_env(on_connect=lambda db: ensure_user_indexes(db["users"]))
+users_collection = mongo.collection("users")
+
+
+prediction_cache.max_entries = int(os.environ.get("PREDICTION_CACHE_SIZE", 10000))
+prediction_cache.ttl_seconds = float(os.environ.get("PREDICTION_CACHE_TTL", 3600))
+
+# Micro-batching only pays off with threaded workers (e.g. gunicorn --threads 8).
+micro_batcher.enabled = os.environ.get("MICRO_BATCH", "0") == "1"
+micro_batcher.max_batch = int(os.environ.get("MICRO_BATCH_MAX_ROWS", 64))
+micro_batcher.max_wait_ms = float(os.environ.get("MICRO_BATCH_WINDOW_MS", 2))
+micro_batcher.max_queue = int(os.environ.get("MICRO_BATCH_MAX_QUEUE", 1024))
+
+# Bcrypt runs on a bounded pool (BCRYPT_WORKERS / BCRYPT_MAX_PENDING) at BCRYPT_LOG_ROUNDS;
+# logins re-hash passwords stored with a different cost.
+password_hasher = password_hasher_from_env()
+metrics.gauge("password_hasher_in_flight", lambda: password_hasher.in_flight, "bcrypt jobs running or queued")
+metrics.gauge("prediction_cache_entries", lambda: prediction_cache.stats()["entries"], "cached predictions")
+
+# FAST_START=1 serves from the memory-mapped forests and defers unpickling
+# the sklearn model until a request actually needs it; SHARED_MODEL=1 never
+# unpickles it, so workers forked by gunicorn --preload share one mapping.
+registry.lazy = hourly_registry.lazy = os.environ.get("FAST_START", "0") == "1"
+registry.forest_only = hourly_registry.forest_only = os.environ.get("SHARED_MODEL", "0") == "1"
 
 print("Attempting to load model files...")
-if not os.path.exists(MODEL_PATH) or not os.path.exists(SCALER_PATH) or not os.path.exists(FEATURE_PATH):
+if registry.get() is None:
     print("❌ Model files missing. Please run 'trainmodel.py' first.")
-    model, scaler, feature_columns = None, None, []
 else:
-    model = joblib.load(MODEL_PATH)
-    scaler = joblib.load(SCALER_PATH)
-    feature_columns = pd.read_csv(FEATURE_PATH).columns.tolist()
     print("✅ Model, Scaler, and Feature Columns Loaded")
+if hourly_registry.get() is None:
+    print("⚠️ Hourly model files missing. Run 'train_model.py --hourly --fused' to enable the hourly route.")
 
 def train_model():
     """Train Random Forest model for Solar Power Prediction"""
+    import pandas as pd
+    import joblib
+    import numpy as np
     df = pd.read_csv("Solar_Power_Prediction.csv")
     print("✅ Dataset loaded successfully!")
 
@@ -97,10 +129,39 @@ def train_model():
 def home():
     return jsonify({"message": "☀️ SolarPower-ML Flask API (Auth + ML) is Running!"})
 
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    """Health check: pings Mongo through the worker's pool and reports whether a model is loaded"""
+    mongo_health = mongo.health()
+    model_loaded = registry.get() is not None
+    ok = mongo_health["ok"] and model_loaded
+    return jsonify({"ok": ok, "mongo": mongo_health, "model_loaded": model_loaded}), 200 if ok else 503
+
+@app.route("/metrics", methods=["GET"])
+def prometheus_metrics():
+    """Request, stage, Mongo, bcrypt and SMTP latency histograms in Prometheus text format"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route("/api/model/status", methods=["GET"])
+def model_status():
+    """Report the loaded model version, how long it took to load and cache usage"""
+    return jsonify({
+        **registry.status(),
+        "hourly": hourly_registry.status(),
+        "prediction_cache": prediction_cache.stats(),
+        "micro_batcher": micro_batcher.stats(),
+    }), 200
+
+@app.route("/api/auth/status", methods=["GET"])
+def auth_status():
+    """Report password hashing load and admission rejections"""
+    return jsonify(password_hasher.stats()), 200
+
 @app.route("/predict", methods=["POST"])
 def predict_power():
     """Predict solar power output using ML model"""
-    if not model or not scaler:
+    bundle = registry.get()
+    if bundle is None:
         return jsonify({"error": "Model not loaded"}), 500
 
     data = request.get_json()
@@ -113,10 +174,12 @@ def predict_power():
     if missing:
         return jsonify({"error": f"Missing fields: {', '.join(missing)}"}), 400
 
-    df = pd.DataFrame([{key: data[key] for key in required_fields}])
-    df = df.reindex(columns=feature_columns, fill_value=0)
-    scaled = scaler.transform(df)
-    predicted_kw = float(model.predict(scaled)[0])
+    try:
+        predicted_kw = predict_row(bundle, {key: data[key] for key in required_fields})
+    except InvalidFeatureError as e:
+        return jsonify({"error": str(e)}), 400
+    except QueueFullError:
+        return jsonify({"error": "Server busy, please retry"}), 503
 
     return jsonify({
         "predicted_power_kW": round(predicted_kw, 3),
@@ -133,10 +196,10 @@ def signup():
     if not fullname or not email or not password:
         return jsonify({"message": "Please fill all required fields"}), 400
 
-    if users_collection.find_one({"email": email}):
-        return jsonify({"message": "User already exists"}), 400
-
-    hashed_pw = bcrypt.generate_password_hash(password).decode("utf-8")
+    try:
+        hashed_pw = password_hasher.hash(password)
+    except HasherBusyError:
+        return jsonify({"message": "Server busy, please retry"}), 503
 
     new_user = {
         "fullname": fullname,
@@ -146,7 +209,11 @@ def signup():
         "createdAt": datetime.datetime.utcnow()
     }
 
-    result = users_collection.insert_one(new_user)
+    # The unique email index makes the insert itself the existence check.
+    try:
+        result = users_collection.insert_one(new_user)
+    except DuplicateKeyError:
+        return jsonify({"message": "User already exists"}), 400
 
     return jsonify({
         "message": "Signup successful",
@@ -160,12 +227,10 @@ def signup():
 # SINGLE DAY SOLAR POWER PREDICTION (TryModelPage)
 @app.route("/api/predict/solarpower", methods=["POST"])
 def predict_single_day():
-    if not os.path.exists(MODEL_PATH) or not os.path.exists(SCALER_PATH) or not os.path.exists(FEATURE_PATH):
+    bundle = registry.get()
+    if bundle is None:
         return jsonify({"error": "Model not trained yet. Please run trainmodel.py first."}), 400
-
-    model = joblib.load(MODEL_PATH)
-    scaler = joblib.load(SCALER_PATH)
-    feature_columns = pd.read_csv(FEATURE_PATH).columns.tolist()
+    feature_columns = bundle.feature_columns
 
     data = request.get_json()
     if not data:
@@ -176,54 +241,65 @@ def predict_single_day():
         return jsonify({"error": f"Missing fields: {', '.join(missing)}"}), 400
 
     try:
-        df_input = pd.DataFrame([{col: data[col] for col in feature_columns}])
-        scaled_features = scaler.transform(df_input)
-        predicted_kw = float(model.predict(scaled_features)[0])
+        predicted_kw = predict_row(bundle, {col: data[col] for col in feature_columns})
 
         return jsonify({
             "predicted_power_kW": round(predicted_kw, 3),
             "input_used": data
         }), 200
 
+    except InvalidFeatureError as e:
+        return jsonify({"error": str(e)}), 400
+    except QueueFullError:
+        return jsonify({"error": "Server busy, please retry"}), 503
     except Exception as e:
         print("❌ Error during single-day prediction:", e)
+        metrics.inc("prediction_errors_total", route="/api/predict/solarpower")
         return jsonify({"error": "Prediction failed", "details": str(e)}), 500
 
 
 @app.route("/api/predict/solarpowerforecast", methods=["POST"])
 def predict_multiple_days():
-    if not os.path.exists(MODEL_PATH) or not os.path.exists(SCALER_PATH) or not os.path.exists(FEATURE_PATH):
+    bundle = registry.get()
+    if bundle is None:
         return jsonify({"error": "Model not trained yet. Please run trainmodel.py first."}), 400
 
-    model = joblib.load(MODEL_PATH)
-    scaler = joblib.load(SCALER_PATH)
-    feature_columns = pd.read_csv(FEATURE_PATH).columns.tolist()
-
     payload = request.get_json()
     if not isinstance(payload, list) or len(payload) == 0:
         return jsonify({"error": "Request body must be a non-empty JSON array"}), 400
 
-    predictions = []
-
     try:
-        for day_data in payload:
-            missing = [f for f in feature_columns if f not in day_data]
-            if missing:
-                return jsonify({"error": f"Missing fields: {', '.join(missing)}"}), 400
-            
-            df_input = pd.DataFrame([{col: day_data[col] for col in feature_columns}])
-            scaled_features = scaler.transform(df_input)
-            predicted_kw = float(model.predict(scaled_features)[0])
-
-            predictions.append({
-                "input": day_data,
-                "predicted_power_kW": round(predicted_kw, 3)
-            })
-
-        return jsonify({"predictions": predictions}), 200
+        predictions, errors = predict_batch(bundle, payload)
+        if len(errors) == len(payload):
+            return jsonify({"error": "No valid rows in request", "errors": errors}), 400
+
+        return jsonify({"predictions": predictions, "errors": errors}), 200
 
     except Exception as e:
         print("❌ Error predicting solar power:", e)
+        metrics.inc("prediction_errors_total", route="/api/predict/solarpowerforecast")
+        return jsonify({"error": "Prediction failed", "details": str(e)}), 500
+
+
+# HOURLY CURVE OF ONE DAY (eight 3-hour periods, one predict call)
+@app.route("/api/predict/solarpower/hourly", methods=["POST"])
+def predict_hourly_curve():
+    bundle = hourly_registry.get()
+    geometry = solar_geometry()
+    if bundle is None or geometry is None:
+        return jsonify({"error": "Hourly model not trained yet. Please run train_model.py --hourly first."}), 400
+
+    data = request.get_json()
+    if not isinstance(data, dict) or not data:
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+
+    try:
+        return jsonify(predict_day_curve(bundle, data, geometry)), 200
+    except HourlyInputError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print("❌ Error during hourly prediction:", e)
+        metrics.inc("prediction_errors_total", route="/api/predict/solarpower/hourly")
         return jsonify({"error": "Prediction failed", "details": str(e)}), 500
 
 
@@ -236,13 +312,19 @@ def signin():
     if not email or not password:
         return jsonify({"message": "Please enter all required fields"}), 400
 
-    user = users_collection.find_one({"email": email})
+    user = users_collection.find_one({"email": email}, SIGNIN_FIELDS)
 
     if not user:
         return jsonify({"message": "User does not exist"}), 401
 
-    if not bcrypt.check_password_hash(user["password"], password):
+    try:
+        ok, new_hash = password_hasher.verify_and_update(user["password"], password)
+    except HasherBusyError:
+        return jsonify({"message": "Server busy, please retry"}), 503
+    if not ok:
         return jsonify({"message": "Invalid credentials"}), 401
+    if new_hash:
+        users_collection.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
 
     return jsonify({
         "message": "Login successful",
@@ -258,7 +340,7 @@ def forgot_password_auth():
     data = request.get_json()
     email = data.get("email")
 
-    user = users_collection.find_one({"email": email})
+    user = users_collection.find_one({"email": email}, EXISTS_FIELDS)
     if not user:
         return jsonify({"message": "User not found"}), 404
 
@@ -270,16 +352,22 @@ def forgot_password_reset():
     email = data.get("email")
     password = data.get("password")
 
-    if not email or not password:
+    if not email or not isinstance(password, str) or not password:
         return jsonify({"message": "Email & password required"}), 400
 
-    if not users_collection.find_one({"email": email}):
+    # This variant issues no OTPs, so there is nothing to claim; a projected
+    # lookup still keeps unknown emails away from the bounded bcrypt pool.
+    user = users_collection.find_one({"email": email}, EXISTS_FIELDS)
+    if not user:
         return jsonify({"message": "User not found"}), 404
 
-    hashed_pw = bcrypt.generate_password_hash(password).decode("utf-8")
+    try:
+        hashed_pw = password_hasher.hash(password)
+    except HasherBusyError:
+        return jsonify({"message": "Server busy, please retry"}), 503
 
     users_collection.update_one(
-        {"email": email},
+        {"_id": user["_id"]},
         {"$set": {
             "password": hashed_pw,
             "updatedAt": datetime.datetime.utcnow()
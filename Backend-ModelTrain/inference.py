@@ -0,0 +1,144 @@
+import numpy as np
+from prediction_cache import prediction_cache
+from micro_batcher import MicroBatcher
+from metrics import mark_stage
+
+
+class InvalidFeatureError(ValueError):
+    """A feature value that is not a finite number; the message is meant for the client"""
+
+
+def _invalid_fields(row, feature_columns):
+    invalid = []
+    for col in feature_columns:
+        try:
+            float(row[col])
+        except (TypeError, ValueError):
+            invalid.append(col)
+    return invalid
+
+
+def _non_finite_fields(values, feature_columns):
+    return [col for col, ok in zip(feature_columns, np.isfinite(values).tolist()) if not ok]
+
+
+def build_feature_matrix(rows, feature_columns):
+    """Validate a list of JSON rows and pack the good ones into one float64 matrix.
+
+    Returns (X, valid_indices, errors) where X[i] holds the features of
+    rows[valid_indices[i]] in feature_columns order, and errors lists
+    {"index", "error"} for every row that was skipped.
+    """
+    X = np.empty((len(rows), len(feature_columns)), dtype=np.float64)
+    valid_indices = []
+    errors = []
+
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append({"index": i, "error": "Each item must be a JSON object"})
+            continue
+
+        missing = [f for f in feature_columns if f not in row]
+        if missing:
+            errors.append({"index": i, "error": f"Missing fields: {', '.join(missing)}"})
+            continue
+
+        try:
+            X[len(valid_indices)] = [float(row[col]) for col in feature_columns]
+        except (TypeError, ValueError):
+            invalid = _invalid_fields(row, feature_columns)
+            errors.append({"index": i, "error": f"Non-numeric fields: {', '.join(invalid)}"})
+            continue
+
+        valid_indices.append(i)
+
+    X = X[:len(valid_indices)]
+    # float() accepts "nan" and "inf", which the scaler used to reject and
+    # the flat forests would route differently from sklearn.
+    finite = np.isfinite(X).all(axis=1)
+    if not finite.all():
+        for k in np.flatnonzero(~finite).tolist():
+            errors.append({"index": valid_indices[k],
+                           "error": f"Non-finite fields: {', '.join(_non_finite_fields(X[k], feature_columns))}"})
+        errors.sort(key=lambda err: err["index"])
+        X = X[finite]
+        valid_indices = [i for i, ok in zip(valid_indices, finite.tolist()) if ok]
+
+    return X, valid_indices, errors
+
+
+def predict_matrix(bundle, X):
+    """Predict a whole raw feature matrix, scoring only the rows not already cached"""
+    if len(X) == 0:
+        return np.empty(0, dtype=np.float64)
+    if not prediction_cache.enabled:
+        predicted = bundle.predict(X)
+        mark_stage("model")
+        return predicted
+
+    keys = prediction_cache.keys_for(X)
+    predicted, missing = prediction_cache.lookup(bundle.version, keys)
+    mark_stage("cache")
+    if missing.any():
+        # Boolean indexing copies, so bundle.predict may scale X[missing] in place.
+        fresh = bundle.predict(X[missing])
+        mark_stage("model")
+        predicted[missing] = fresh
+        prediction_cache.store(bundle.version, [k for k, m in zip(keys, missing) if m], fresh)
+        mark_stage("cache")
+    return predicted
+
+
+def feature_row(bundle, data):
+    """Place one JSON row's fields into a (1, n_features) float64 array.
+
+    Fields are mapped with the bundle's column-index map; feature columns
+    absent from data are left at 0 like DataFrame.reindex(fill_value=0).
+    Raises InvalidFeatureError for non-numeric or non-finite values.
+    """
+    row = np.zeros((1, len(bundle.feature_columns)), dtype=np.float64)
+    feature_index = bundle.feature_index
+    try:
+        for key, value in data.items():
+            idx = feature_index.get(key)
+            if idx is not None:
+                row[0, idx] = float(value)
+    except (TypeError, ValueError):
+        present = [col for col in bundle.feature_columns if col in data]
+        raise InvalidFeatureError(f"Non-numeric fields: {', '.join(_invalid_fields(data, present))}")
+    if not np.isfinite(row).all():
+        raise InvalidFeatureError(f"Non-finite fields: {', '.join(_non_finite_fields(row[0], bundle.feature_columns))}")
+    return row
+
+
+def predict_row(bundle, data):
+    """Predict one JSON row without going through pandas.
+
+    When micro-batching is enabled the row is scored together with other
+    requests arriving in the same window (may raise QueueFullError).
+    """
+    row = feature_row(bundle, data)
+    mark_stage("features")
+    if micro_batcher.enabled:
+        predicted = micro_batcher.predict(bundle, row)
+        mark_stage("micro_batch")
+        return predicted
+    return float(predict_matrix(bundle, row)[0])
+
+
+def predict_batch(bundle, rows):
+    """Predict every valid row of a forecast payload, keeping results in payload order"""
+    X, valid_indices, errors = build_feature_matrix(rows, bundle.feature_columns)
+    mark_stage("features")
+    predicted = predict_matrix(bundle, X)
+
+    predictions = [{"input": row, "predicted_power_kW": None} for row in rows]
+    for i, kw in zip(valid_indices, predicted.tolist()):
+        predictions[i]["predicted_power_kW"] = round(kw, 3)
+    for err in errors:
+        predictions[err["index"]]["error"] = err["error"]
+
+    return predictions, errors
+
+
+micro_batcher = MicroBatcher(predict_matrix)
@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+from imputation import impute_numeric
+from stage_profiler import profiler
+
+DATA_PATH = "Solar_Power_Prediction.csv"
+DAY_KEYS = ["Year", "Month", "Day"]
+
+DAILY_AGGREGATIONS = {
+    "Is Daylight": "max",
+    # "Distance to Solar Noon": "mean", # 👈 BUGGY FEATURE IS REMOVED
+    "Average Temperature (Day)": "mean",
+    "Average Wind Direction (Day)": "mean",
+    "Average Wind Speed (Day)": "mean",
+    "Sky Cover": "mean",
+    "Visibility": "mean",
+    "Relative Humidity": "mean",
+    "Average Wind Speed (Period)": "mean",
+    "Average Barometric Pressure (Period)": "mean",
+    "Power Generated": "sum",
+}
+
+
+def clean_hourly(df, impute_method="knn", n_neighbors=3):
+    """Normalize Is Daylight, impute daylight-zero power readings and convert W → kW"""
+    with profiler.stage("daylight"):
+        # Convert "Is Daylight" to numeric binary (1/0)
+        df["Is Daylight"] = (
+            df["Is Daylight"]
+            .astype(str)
+            .str.upper()
+            .replace({"TRUE": 1, "FALSE": 0, "YES": 1, "NO": 0})
+            .astype(int)
+        )
+
+    # Handle missing values
+    with profiler.stage("impute"):
+        mask = (df["Is Daylight"] == 1) & (df["Power Generated"] == 0)
+        df.loc[mask, "Power Generated"] = np.nan
+        impute_numeric(df, method=impute_method, n_neighbors=n_neighbors)
+
+        df["Power Generated"] = df["Power Generated"] / 1000
+    return df
+
+
+def aggregate_daily(df):
+    """Collapse cleaned hourly rows into one row per day, sorted chronologically"""
+    with profiler.stage("aggregate"):
+        daily_power = df.groupby(DAY_KEYS, as_index=False).agg(DAILY_AGGREGATIONS)
+        return daily_power.sort_values(by=DAY_KEYS).reset_index(drop=True)
+
+
+def load_daily_power(path=DATA_PATH, impute_method="knn", n_neighbors=3):
+    """Read the whole hourly CSV, clean it and aggregate it per day"""
+    with profiler.stage("load_csv"):
+        df = pd.read_csv(path)
+    print("Dataset loaded successfully!")
+    clean_hourly(df, impute_method=impute_method, n_neighbors=n_neighbors)
+    print(f"Missing values handled ({impute_method}).")
+    return aggregate_daily(df)
+
+
+def load_hourly_power(path=DATA_PATH, impute_method="knn", n_neighbors=3):
+    """Read the whole hourly CSV and clean it, keeping one row per 3-hour period"""
+    with profiler.stage("load_csv"):
+        df = pd.read_csv(path)
+    print("Dataset loaded successfully!")
+    clean_hourly(df, impute_method=impute_method, n_neighbors=n_neighbors)
+    print(f"Missing values handled ({impute_method}).")
+    return df.sort_values(by=DAY_KEYS + ["First Hour of Period"]).reset_index(drop=True)
+
+
+def _partial_aggregates(df):
+    """Per-day sum/count/max pieces that can be merged across chunks"""
+    grouped = df.groupby(DAY_KEYS)
+    pieces = {}
+    for col, how in DAILY_AGGREGATIONS.items():
+        if how == "max":
+            pieces[(col, "max")] = grouped[col].max()
+        else:
+            pieces[(col, "sum")] = grouped[col].sum()
+            if how == "mean":
+                pieces[(col, "count")] = grouped[col].count()
+    return pd.DataFrame(pieces)
+
+
+def _merge_partials(left, right):
+    merged = pd.concat([left, right])
+    how = {key: ("max" if key[1] == "max" else "sum") for key in merged.columns}
+    return merged.groupby(level=DAY_KEYS).agg(how)
+
+
+def stream_daily_power(path=DATA_PATH, chunksize=100_000, impute_method="knn", n_neighbors=3):
+    """Build the same daily_power frame as load_daily_power, one CSV chunk at a time.
+
+    Only the current chunk and the running per-day partial aggregates are
+    held in memory, so peak memory depends on chunksize and the number of
+    days rather than the number of hourly rows. Imputation runs within each
+    chunk, so neighbours and interpolation anchors come from that chunk.
+    """
+    partial = None
+    n_rows = 0
+    reader = pd.read_csv(path, chunksize=chunksize)
+    while True:
+        with profiler.stage("load_csv"):
+            chunk = next(reader, None)
+        if chunk is None:
+            break
+        clean_hourly(chunk, impute_method=impute_method, n_neighbors=n_neighbors)
+        with profiler.stage("aggregate"):
+            part = _partial_aggregates(chunk)
+            partial = part if partial is None else _merge_partials(partial, part)
+        n_rows += len(chunk)
+    print(f"Dataset streamed successfully! ({n_rows} rows, chunks of {chunksize})")
+
+    with profiler.stage("aggregate"):
+        daily_power = pd.DataFrame(index=partial.index)
+        for col, how in DAILY_AGGREGATIONS.items():
+            if how == "max":
+                daily_power[col] = partial[(col, "max")]
+            elif how == "sum":
+                daily_power[col] = partial[(col, "sum")]
+            else:
+                daily_power[col] = partial[(col, "sum")] / partial[(col, "count")]
+
+        return daily_power.reset_index().sort_values(by=DAY_KEYS).reset_index(drop=True)
@@ -0,0 +1,377 @@
+import os
+import time
+import queue
+import random
+import sqlite3
+import smtplib
+import threading
+import weakref
+from collections import deque
+from email.message import EmailMessage
+import numpy as np
+from metrics import metrics, mark_stage
+
+MAIL_QUEUE_PATH = "mail_queue.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    to_email TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    html TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    claimed_at REAL,
+    created_at REAL NOT NULL,
+    sent_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+
+def otp_email_html(otp, subject):
+    return f"""
+    <div style="font-family: Arial; font-size:16px; color:#222;">
+        <h3>{subject}</h3>
+        <p>Your OTP code is:</p>
+        <h2>{otp}</h2>
+        <p>This code will expire in 5 minutes.</p>
+    </div>
+    """
+
+
+class SMTPPool:
+    """A few long-lived SMTP connections shared by the delivery workers.
+
+    Opening a connection costs a TCP + STARTTLS + AUTH round trip, so idle
+    connections are handed back out until they have been idle for
+    idle_timeout seconds (servers drop them after a while).
+    """
+
+    def __init__(self, server, port, use_tls=True, username=None, password=None,
+                 max_connections=4, idle_timeout=60.0, timeout=10.0):
+        self.server = server
+        self.port = port
+        self.use_tls = use_tls
+        self.username = username
+        self.password = password
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self._idle = queue.LifoQueue(maxsize=max_connections)
+        self.opened = 0
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.server, self.port, timeout=self.timeout)
+        if self.use_tls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password)
+        self.opened += 1
+        return smtp
+
+    def acquire(self):
+        while True:
+            try:
+                smtp, released_at = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            if time.monotonic() - released_at < self.idle_timeout:
+                return smtp
+            self.discard(smtp)
+
+    def release(self, smtp):
+        try:
+            self._idle.put_nowait((smtp, time.monotonic()))
+        except queue.Full:
+            self.discard(smtp)
+
+    def discard(self, smtp):
+        try:
+            smtp.quit()
+        except Exception:
+            smtp.close()
+
+    def close(self):
+        while True:
+            try:
+                smtp, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self.discard(smtp)
+
+
+class MailQueue:
+    """Outgoing email persisted in a local SQLite outbox and delivered by worker threads.
+
+    enqueue() only inserts a row, so request handlers return without
+    touching SMTP. Workers claim due rows, send them over pooled
+    connections and retry failures with exponential backoff until
+    max_attempts; 5xx replies are treated as permanent. Rows survive
+    restarts, and rows left 'sending' by a crashed process are picked up
+    again after claim_timeout seconds.
+
+    Creating a queue touches neither the outbox file nor any thread. Call
+    start() once the app is serving (e.g. on its first request) so a
+    backlog left by a restart is delivered without waiting for the next
+    enqueue(). A queue started before a fork (gunicorn --preload) restarts
+    its workers in the child.
+    Sent rows are deleted and failed ones keep no body, so OTPs do not
+    linger on disk.
+    """
+
+    def __init__(self, smtp_pool, sender, path=MAIL_QUEUE_PATH, workers=2, max_attempts=5,
+                 backoff_seconds=2.0, max_backoff_seconds=300.0, claim_timeout=120.0,
+                 poll_interval=1.0):
+        self.smtp_pool = smtp_pool
+        self.sender = sender
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.claim_timeout = claim_timeout
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._latencies_ms = deque(maxlen=1000)
+        self.enqueued = 0
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self._prepared = False
+        self._prepare_lock = threading.Lock()
+
+    def _connection(self):
+        # One SQLite connection per thread (and per process, after a fork).
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._prepare(conn)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _prepare(self, conn):
+        # The outbox file is only created on first use, not when the app is imported.
+        if self._prepared:
+            return
+        with self._prepare_lock:
+            if self._prepared:
+                return
+            # WAL is a property of the file, so it only needs switching on once.
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            # Outboxes written before sent rows were deleted still hold OTP bodies.
+            conn.execute("DELETE FROM outbox WHERE status = 'sent'")
+            conn.execute("UPDATE outbox SET html = '' WHERE status = 'failed' AND html != ''")
+            self._prepared = True
+
+    def start(self):
+        """Start this process's delivery workers; a no-op if they are already running"""
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            # Create the outbox before any worker races to, here or in a forked child.
+            self._connection()
+            self._stop.clear()
+            self._threads = [threading.Thread(target=self._run, name=f"mail-worker-{i}", daemon=True)
+                             for i in range(self.workers)]
+            for t in self._threads:
+                t.start()
+            self._pid = os.getpid()
+            _started_queues.add(self)
+
+    def _after_fork(self):
+        # Only the forking thread survives; its locks may have been held by others.
+        self._start_lock = threading.Lock()
+        self._prepare_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._pid = None
+        self.start()
+
+    def enqueue(self, to_email, subject, html):
+        """Persist one email for background delivery and return its outbox id"""
+        now = time.time()
+        cur = self._connection().execute(
+            "INSERT INTO outbox (to_email, subject, html, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?)",
+            (to_email, subject, html, now, now),
+        )
+        with self._lock:
+            self.enqueued += 1
+        self.start()
+        self._wakeup.set()
+        mark_stage("mail_enqueue")
+        return cur.lastrowid
+
+    def _claim(self):
+        conn = self._connection()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, to_email, subject, html, attempts FROM outbox "
+                "WHERE (status = 'pending' AND next_attempt_at <= ?) "
+                "   OR (status = 'sending' AND claimed_at < ?) "
+                "ORDER BY id LIMIT 1",
+                (now, now - self.claim_timeout),
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE outbox SET status = 'sending', claimed_at = ? WHERE id = ?", (now, row[0]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def _send(self, to_email, subject, html):
+        msg = EmailMessage()
+        msg["Subject"] = subject
+        msg["From"] = self.sender
+        msg["To"] = to_email
+        msg.set_content(html, subtype="html")
+
+        smtp = self.smtp_pool.acquire()
+        try:
+            smtp.send_message(msg)
+        except Exception:
+            self.smtp_pool.discard(smtp)
+            raise
+        self.smtp_pool.release(smtp)
+
+    def _backoff(self, attempts):
+        delay = min(self.backoff_seconds * 2 ** (attempts - 1), self.max_backoff_seconds)
+        return delay * random.uniform(0.5, 1.0)
+
+    def _deliver(self, row):
+        job_id, to_email, subject, html, attempts = row
+        attempts += 1
+        conn = self._connection()
+        start = time.perf_counter()
+        try:
+            self._send(to_email, subject, html)
+        except Exception as e:
+            metrics.observe("smtp_send_duration_seconds", time.perf_counter() - start, outcome="error")
+            permanent = (isinstance(e, smtplib.SMTPResponseException) and e.smtp_code >= 500) \
+                or isinstance(e, smtplib.SMTPRecipientsRefused)
+            if permanent or attempts >= self.max_attempts:
+                with self._lock:
+                    self.failed += 1
+                print(f"❌ Email to {to_email} failed after {attempts} attempt(s):", e)
+                conn.execute("UPDATE outbox SET status = 'failed', attempts = ?, html = '', last_error = ? "
+                             "WHERE id = ?", (attempts, str(e), job_id))
+            else:
+                with self._lock:
+                    self.retried += 1
+                conn.execute(
+                    "UPDATE outbox SET status = 'pending', attempts = ?, next_attempt_at = ?, last_error = ? "
+                    "WHERE id = ?",
+                    (attempts, time.time() + self._backoff(attempts), str(e), job_id),
+                )
+            return
+
+        elapsed = time.perf_counter() - start
+        metrics.observe("smtp_send_duration_seconds", elapsed, outcome="ok")
+        self._latencies_ms.append(elapsed * 1000)
+        with self._lock:
+            self.sent += 1
+        conn.execute("DELETE FROM outbox WHERE id = ?", (job_id,))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                row = self._claim()
+            except sqlite3.Error as e:
+                print("❌ Mail queue error:", e)
+                row = None
+            if row is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._deliver(row)
+
+    def drain(self, timeout=30.0):
+        """Wait until nothing is pending or in flight; True if the outbox emptied in time"""
+        self.start()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.depth() == 0:
+                return True
+            self._wakeup.set()
+            time.sleep(0.01)
+        return False
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+        for t in self._threads:
+            t.join(timeout=5)
+        self._pid = None
+        _started_queues.discard(self)
+        self.smtp_pool.close()
+
+    def depth(self):
+        (n,) = self._connection().execute(
+            "SELECT COUNT(*) FROM outbox WHERE status IN ('pending', 'sending')").fetchone()
+        return n
+
+    def stats(self):
+        conn = self._connection()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall())
+        (oldest,) = conn.execute("SELECT MIN(created_at) FROM outbox WHERE status = 'pending'").fetchone()
+        latencies = np.array(self._latencies_ms)
+        return {
+            "queue_depth": counts.get("pending", 0) + counts.get("sending", 0),
+            "oldest_pending_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+            "outbox": counts,
+            "workers": self.workers,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "retried": self.retried,
+            "failed": self.failed,
+            "smtp_connections_opened": self.smtp_pool.opened,
+            "send_ms_mean": round(float(latencies.mean()), 3) if len(latencies) else 0.0,
+            "send_ms_p95": round(float(np.percentile(latencies, 95)), 3) if len(latencies) else 0.0,
+        }
+
+
+_started_queues = weakref.WeakSet()
+
+
+def _restart_after_fork():
+    for mail_queue in list(_started_queues):
+        mail_queue._after_fork()
+
+
+os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def mail_queue_from_env():
+    """Build the app's MailQueue from MAIL_* / EMAIL_* environment variables"""
+    username = os.environ.get("EMAIL_USER")
+    pool = SMTPPool(
+        server=os.environ.get("MAIL_SERVER", "smtp.gmail.com"),
+        port=int(os.environ.get("MAIL_PORT", 587)),
+        use_tls=os.environ.get("MAIL_USE_TLS", "1") == "1",
+        username=username,
+        password=os.environ.get("EMAIL_PASS"),
+        max_connections=int(os.environ.get("MAIL_POOL_SIZE", 2)),
+    )
+    return MailQueue(
+        pool,
+        sender=os.environ.get("EMAIL_FROM") or username,
+        path=os.environ.get("MAIL_QUEUE_PATH", MAIL_QUEUE_PATH),
+        workers=int(os.environ.get("MAIL_WORKERS", 2)),
+        max_attempts=int(os.environ.get("MAIL_MAX_ATTEMPTS", 5)),
+    )
@@ -0,0 +1,330 @@
+import os
+import json
+import time
+import bisect
+import threading
+import contextvars
+from collections import deque
+import numpy as np
+
+# Upper bounds in seconds; covers a cached prediction (~100 µs) up to a slow SMTP send.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PREFIX = "solarpower_"
+
+# Request durations wait in a queue until this many have arrived (or a
+# scrape or snapshot needs them) and are then bucketed in one numpy pass.
+PENDING_LIMIT = 1024
+
+_current_clock = contextvars.ContextVar("request_clock", default=None)
+_perf_counter = time.perf_counter
+
+
+class RequestClock:
+    """Stage timings of one sampled request: each mark() charges the time since the previous mark"""
+
+    __slots__ = ("start", "last", "stages")
+
+    def __init__(self):
+        self.start = self.last = time.perf_counter()
+        self.stages = {}
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last
+        self.last = now
+
+
+def mark_stage(stage):
+    """Close the current stage of the request running in this context, if it is sampled"""
+    clock = _current_clock.get()
+    if clock is not None:
+        # RequestClock.mark inlined: this runs several times per request.
+        now = _perf_counter()
+        stages = clock.stages
+        stages[stage] = stages.get(stage, 0.0) + now - clock.last
+        clock.last = now
+
+
+def stages_sampled():
+    """True while the request running in this context is having its stages timed"""
+    return _current_clock.get() is not None
+
+
+class Metrics:
+    """Histograms and counters kept in process, rendered in Prometheus text format.
+
+    Recording an observation is a dict lookup and a bisect under one lock;
+    request totals skip even that and are queued for batch bucketing, so
+    the layer can stay on in production. Every request's total is recorded; the
+    per-stage breakdown is sampled on one request in stage_sample_every,
+    which keeps the bookkeeping to a few microseconds per request while
+    still filling the stage histograms within seconds under load.
+
+    Under gunicorn every worker has its own numbers; with
+    METRICS_DIR set each worker also snapshots them to METRICS_DIR/<pid>.json
+    at most every flush_interval seconds and render() sums all snapshots,
+    so any worker answering /metrics reports the whole server.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, enabled=True, directory=None, flush_interval=5.0,
+                 stage_sample_every=10):
+        self.buckets = tuple(buckets)
+        self.enabled = enabled
+        self.stage_sample_every = max(1, int(stage_sample_every))
+        self._started = 0
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._histograms = {}
+        self._counters = {}
+        self._gauges = {}
+        # Shortcuts into _histograms for the per-request series, keyed by
+        # plain tuples so finish_request builds no label tuples on a hit.
+        self._request_series = {}
+        self._stage_series = {}
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def _series(self, name, labels):
+        series = self._histograms.get((name, labels))
+        if series is None:
+            series = self._histograms[(name, labels)] = [[0] * (len(self.buckets) + 1), 0.0]
+        return series
+
+    def _observe_locked(self, name, labels, seconds):
+        series = self._series(name, labels)
+        series[0][bisect.bisect_left(self.buckets, seconds)] += 1
+        series[1] += seconds
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._observe_locked(name, tuple(sorted(labels.items())), seconds)
+        self._maybe_flush()
+
+    def inc(self, name, amount=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def gauge(self, name, fn, help_text=""):
+        """Register fn() as a gauge read at render time (this process only)"""
+        self._gauges[name] = (fn, help_text)
+
+    # Per-request timing.
+    def start_request(self):
+        """Start timing a request; returns the token finish_request needs, or None if disabled.
+
+        The token is the start time, or for a request in the stage sample a
+        RequestClock that is also installed for mark_stage() in this context.
+        """
+        if not self.enabled:
+            return None
+        # Unlocked: a lost increment under threads only shifts the sample.
+        self._started += 1
+        if self._started % self.stage_sample_every:
+            return _perf_counter()
+        clock = RequestClock()
+        _current_clock.set(clock)
+        return clock
+
+    def finish_request(self, token, method, route, status):
+        """Record a request's total duration, and its stage timings if it was sampled"""
+        if token is None:
+            return
+        now = _perf_counter()
+        clock = None
+        if token.__class__ is RequestClock:
+            clock = token
+            _current_clock.set(None)
+            token = clock.start
+        total = now - token
+        series = self._request_series.get((method, route, status))
+        if series is None:
+            with self._lock:
+                series = self._request_series[(method, route, status)] = self._series(
+                    "http_request_duration_seconds", (("method", method), ("route", route), ("status", str(status))))
+        # deque.append is atomic, so the common path takes no lock; _drain
+        # folds the backlog into the histograms in one vectorized pass.
+        self._pending.append((series, total))
+        if clock is not None:
+            with self._lock:
+                for stage, seconds in clock.stages.items():
+                    series = self._stage_series.get((route, stage))
+                    if series is None:
+                        series = self._stage_series[(route, stage)] = self._series(
+                            "stage_duration_seconds", (("route", route), ("stage", stage)))
+                    series[0][bisect.bisect_left(self.buckets, seconds)] += 1
+                    series[1] += seconds
+        if len(self._pending) >= PENDING_LIMIT:
+            self._drain()
+        if self.directory is not None:
+            self._maybe_flush()
+
+    def _drain(self):
+        with self._lock:
+            pending = self._pending
+            items = [pending.popleft() for _ in range(len(pending))]
+            if not items:
+                return
+            ids = {}
+            series_ids = np.fromiter((ids.setdefault(id(series), (len(ids), series))[0] for series, _ in items),
+                                     dtype=np.int64, count=len(items))
+            seconds = np.fromiter((total for _, total in items), dtype=np.float64, count=len(items))
+            n_buckets = len(self.buckets) + 1
+            slots = series_ids * n_buckets + np.searchsorted(self.buckets, seconds, side="left")
+            counts = np.bincount(slots, minlength=len(ids) * n_buckets).reshape(len(ids), n_buckets)
+            sums = np.bincount(series_ids, weights=seconds, minlength=len(ids))
+            for i, series in ids.values():
+                series[0] = [a + int(b) for a, b in zip(series[0], counts[i])]
+                series[1] += float(sums[i])
+
+    # Multi-process snapshots.
+    def snapshot(self):
+        self._drain()
+        with self._lock:
+            return {
+                "histograms": [[name, list(labels), counts[:], total] for (name, labels), (counts, total)
+                               in self._histograms.items()],
+                "counters": [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+            }
+
+    def _snapshot_path(self, pid):
+        return os.path.join(self.directory, f"{pid}.json")
+
+    def _maybe_flush(self):
+        if self.directory is None or time.monotonic() - self._last_flush < self.flush_interval:
+            return
+        self._last_flush = time.monotonic()
+        self.flush()
+
+    def flush(self):
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._snapshot_path(os.getpid())
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.snapshot(), f)
+        os.replace(path + ".tmp", path)
+
+    def _merged(self):
+        snapshots = [self.snapshot()]
+        if self.directory is not None and os.path.isdir(self.directory):
+            own = f"{os.getpid()}.json"
+            for entry in os.listdir(self.directory):
+                if entry.endswith(".json") and entry != own:
+                    try:
+                        with open(os.path.join(self.directory, entry)) as f:
+                            snapshots.append(json.load(f))
+                    except (OSError, ValueError):
+                        continue
+        histograms, counters = {}, {}
+        for snap in snapshots:
+            for name, labels, counts, total in snap["histograms"]:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                merged = histograms.setdefault(key, [[0] * len(counts), 0.0])
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+            for name, labels, value in snap["counters"]:
+                key = (name, tuple(tuple(pair) for pair in labels))
+                counters[key] = counters.get(key, 0) + value
+        return histograms, counters
+
+    def render(self):
+        """All series in Prometheus text exposition format 0.0.4"""
+        histograms, counters = self._merged()
+        lines = []
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# TYPE {PREFIX}{name} histogram")
+            for (series_name, labels), (counts, total) in sorted(histograms.items()):
+                if series_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{PREFIX}{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{PREFIX}{name}_sum{_labels(labels)} {total}")
+                lines.append(f"{PREFIX}{name}_count{_labels(labels)} {cumulative}")
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# TYPE {PREFIX}{name} counter")
+            for (series_name, labels), value in sorted(counters.items()):
+                if series_name == name:
+                    lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+        for name, (fn, help_text) in sorted(self._gauges.items()):
+            try:
+                value = float(fn())
+            except Exception:
+                continue
+            if help_text:
+                lines.append(f"# HELP {PREFIX}{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}{name} gauge")
+            lines.append(f"{PREFIX}{name}{_labels((('pid', str(os.getpid())),))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class WSGIRequestTimer:
+    """WSGI middleware timing every request of a Flask app, labelled by its URL rule.
+
+    Wrapping wsgi_app keeps the start time in a local instead of any
+    request-scoped storage. The matched rule is copied into the WSGI
+    environ by a before_request hook, since Flask's request context is
+    gone by the time the response has been returned here.
+    """
+
+    ROUTE_KEY = "solarpower.route"
+
+    def __init__(self, flask_app, registry):
+        self.wsgi_app = flask_app.wsgi_app
+        self.registry = registry
+        flask_app.before_request(self._record_route)
+
+    def _record_route(self):
+        from flask import request
+        rule = request.url_rule
+        if rule is not None:
+            request.environ[self.ROUTE_KEY] = rule.rule
+
+    def __call__(self, environ, start_response):
+        token = self.registry.start_request()
+        if token is None:
+            return self.wsgi_app(environ, start_response)
+        status = "500"
+
+        def start_response_with_status(status_line, headers, exc_info=None):
+            nonlocal status
+            status = status_line[:3]
+            return start_response(status_line, headers, exc_info)
+
+        try:
+            return self.wsgi_app(environ, start_response_with_status)
+        finally:
+            if token.__class__ is RequestClock:
+                token.mark("handler")
+            self.registry.finish_request(token, environ.get("REQUEST_METHOD", ""),
+                                         environ.get(self.ROUTE_KEY, "unmatched"), status)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+def metrics_from_env():
+    return Metrics(enabled=os.environ.get("METRICS_ENABLED", "1") == "1",
+                   directory=os.environ.get("METRICS_DIR") or None,
+                   flush_interval=float(os.environ.get("METRICS_FLUSH_INTERVAL", 5)),
+                   stage_sample_every=int(os.environ.get("METRICS_STAGE_SAMPLE", 10)))
+
+
+metrics = metrics_from_env()
@@ -0,0 +1,128 @@
+import os
+import time
+import queue
+import threading
+import numpy as np
+
+
+class QueueFullError(Exception):
+    """Raised when the micro-batch queue is at its maximum depth"""
+
+
+class _Pending:
+    __slots__ = ("bundle", "row", "done", "value", "error")
+
+    def __init__(self, bundle, row):
+        self.bundle = bundle
+        self.row = row
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row predictions into one batched predict call.
+
+    Request threads enqueue a row and block; a background thread takes the
+    first waiting row, keeps collecting until max_batch rows or max_wait_ms
+    have passed, runs predict_fn once per model bundle in the batch and
+    hands each caller its own result. The queue holds at most max_queue
+    rows: past that, submit() waits up to submit_timeout and then raises
+    QueueFullError so the route can shed load instead of piling up.
+    """
+
+    def __init__(self, predict_fn, enabled=False, max_batch=64, max_wait_ms=2.0,
+                 max_queue=1024, submit_timeout=0.05):
+        self.predict_fn = predict_fn
+        self.enabled = enabled
+        self.max_batch = max_batch
+        self.max_wait_ms = max_wait_ms
+        self.max_queue = max_queue
+        self.submit_timeout = submit_timeout
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+        self.largest_batch = 0
+        self.rejected = 0
+
+    def _ensure_started(self):
+        # Started lazily and per process: a thread started before a gunicorn
+        # fork does not exist in the forked workers.
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def predict(self, bundle, row, timeout=5.0):
+        """Predict one raw feature row (shape (1, n_features)) as part of a micro-batch"""
+        self._ensure_started()
+        pending = _Pending(bundle, row)
+        try:
+            self._queue.put(pending, timeout=self.submit_timeout)
+        except queue.Full:
+            self.rejected += 1
+            raise QueueFullError("Prediction queue is full")
+
+        if not pending.done.wait(timeout):
+            raise TimeoutError("Timed out waiting for a micro-batch prediction")
+        if pending.error is not None:
+            raise pending.error
+        return pending.value
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            self.batches += 1
+            self.rows += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+
+            # A model reload mid-batch can leave rows built for different bundles.
+            groups = {}
+            for pending in batch:
+                groups.setdefault(id(pending.bundle), []).append(pending)
+
+            for group in groups.values():
+                try:
+                    values = self.predict_fn(group[0].bundle, np.vstack([p.row for p in group]))
+                    for pending, value in zip(group, values.tolist()):
+                        pending.value = value
+                except Exception as e:
+                    for pending in group:
+                        pending.error = e
+                for pending in group:
+                    pending.done.set()
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait_ms,
+            "max_queue": self.max_queue,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "largest_batch": self.largest_batch,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,277 @@
+import os
+import csv
+import time
+import hashlib
+import threading
+import numpy as np
+from flat_forest import FlatForest, FOREST_PATH, FUSED_FOREST_PATH, FLAT_FOREST_MAX_BATCH, file_sha256
+
+MODEL_PATH = "random_forest_model.pkl"
+SCALER_PATH = "scaler.pkl"
+FEATURE_PATH = "feature_columns.csv"
+
+
+def read_feature_columns(path=FEATURE_PATH):
+    """Header row of feature_columns.csv, read without pandas"""
+    with open(path, newline="") as f:
+        return next(csv.reader(f))
+
+
+def content_hash(paths):
+    """Version id of a set of artifacts: sha256 over the files that exist, cut to 12 characters"""
+    digest = hashlib.sha256()
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+def load_pickle(path):
+    import joblib
+    return joblib.load(path)
+
+
+class ModelBundle:
+    """Immutable snapshot of the artifacts used to serve one model version.
+
+    model and scaler may be passed as None together with a loader; they
+    are then unpickled on first access, so a process serving only small
+    batches from the fused forest never imports sklearn at all.
+    """
+
+    def __init__(self, model, scaler, feature_columns, version, load_time_ms, loaded_at,
+                 forest=None, fused_forest=None, model_loader=None, scaler_loader=None,
+                 forest_only=False):
+        self._model = model
+        self._scaler = scaler
+        self._model_loader = model_loader
+        self._scaler_loader = scaler_loader
+        self._lazy_lock = threading.Lock()
+        self._mean = None
+        self._scale = None
+        self.forest = forest
+        self.fused_forest = fused_forest
+        # Serve every batch size from the memory-mapped forests, so the
+        # sklearn trees (private to each process once unpickled) never load.
+        self.forest_only = forest_only and (forest is not None or fused_forest is not None)
+        self.feature_columns = feature_columns
+        self.feature_index = {col: i for i, col in enumerate(feature_columns)}
+        self.version = version
+        self.load_time_ms = load_time_ms
+        self.loaded_at = loaded_at
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lazy_lock:
+                if self._model is None:
+                    self._model = self._model_loader()
+        return self._model
+
+    @property
+    def scaler(self):
+        if self._scaler is None:
+            with self._lazy_lock:
+                if self._scaler is None:
+                    self._scaler = self._scaler_loader()
+        return self._scaler
+
+    @property
+    def model_loaded(self):
+        return self._model is not None
+
+    @property
+    def mean(self):
+        # StandardScaler parameters, applied inline on the pandas-free hot path.
+        if self._mean is None:
+            mean = self.scaler.mean_
+            self._mean = np.asarray(mean, dtype=np.float64) if mean is not None else np.zeros(len(self.feature_columns))
+        return self._mean
+
+    @property
+    def scale(self):
+        if self._scale is None:
+            scale = self.scaler.scale_
+            self._scale = np.asarray(scale, dtype=np.float64) if scale is not None else np.ones(len(self.feature_columns))
+        return self._scale
+
+    @property
+    def evaluator(self):
+        if self.fused_forest is not None:
+            return "fused_forest"
+        if self.forest is not None:
+            return "flat_forest"
+        return "sklearn"
+
+    def scale_rows(self, X):
+        """Apply the fitted StandardScaler in place, exactly as scaler.transform does"""
+        X -= self.mean
+        X /= self.scale
+        return X
+
+    def predict(self, X):
+        """Predict raw float64 feature rows; X may be scaled in place.
+
+        Small batches go to the scaler-fused forest (no scaling at all) or
+        the flat forest; larger ones to sklearn's compiled traversal unless
+        the bundle is forest_only.
+        """
+        small = len(X) <= FLAT_FOREST_MAX_BATCH or self.forest_only
+        if self.fused_forest is not None and small:
+            return self.fused_forest.predict(X)
+        X_scaled = self.scale_rows(X)
+        if self.forest is not None and small:
+            return self.forest.predict(X_scaled)
+        return self.model.predict(X_scaled)
+
+
+class ModelRegistry:
+    """Loads model, scaler and feature list once per process and hot-reloads them on change.
+
+    Readers always get a complete ModelBundle: a reload builds the new bundle
+    off to the side and then swaps a single reference, so in-flight requests
+    keep using the version they started with.
+
+    With lazy=True (FAST_START=1 in the apps) a load only maps the exported
+    forests and reads the feature list; the pickles are unpickled the first
+    time something needs them, e.g. a batch too large for the flat forest.
+    forest_only=True (SHARED_MODEL=1) goes further and sends large batches
+    to the mapped forests too: with gunicorn --preload the master maps the
+    files once and every worker reads the same physical pages.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, scaler_path=SCALER_PATH,
+                 feature_path=FEATURE_PATH, forest_path=FOREST_PATH,
+                 fused_forest_path=FUSED_FOREST_PATH, check_interval=2.0, lazy=False,
+                 forest_only=False):
+        self.paths = (model_path, scaler_path, feature_path)
+        self.optional_paths = (forest_path, fused_forest_path)
+        self.check_interval = check_interval
+        self.lazy = lazy
+        self.forest_only = forest_only
+        self._bundle = None
+        self._stat_signature = None
+        self._last_check = 0.0
+        self._reload_lock = threading.Lock()
+        self.reload_count = 0
+        self.last_error = None
+
+    def _stat(self):
+        """mtime/size of every artifact, or None when a required one is missing"""
+        try:
+            required = tuple((os.stat(p).st_mtime_ns, os.stat(p).st_size) for p in self.paths)
+        except FileNotFoundError:
+            return None
+        optional = tuple(
+            (os.stat(p).st_mtime_ns, os.stat(p).st_size) if os.path.exists(p) else None
+            for p in self.optional_paths
+        )
+        return required + optional
+
+    def _content_hash(self):
+        return content_hash(self.paths + self.optional_paths)
+
+    def _load_scaler(self, scaler_path, feature_path, feature_columns):
+        scaler = load_pickle(scaler_path)
+        scaler_columns = getattr(scaler, "feature_names_in_", None)
+        if scaler_columns is not None and list(scaler_columns) != feature_columns:
+            raise ValueError(f"{feature_path} does not match the columns the scaler was fitted on")
+        return scaler
+
+    def _load(self, version):
+        model_path, scaler_path, feature_path = self.paths
+        start = time.perf_counter()
+        feature_columns = read_feature_columns(feature_path)
+        model_sha256 = file_sha256(model_path)
+        scaler_sha256 = file_sha256(scaler_path)
+        forest_path, fused_forest_path = self.optional_paths
+        forest = self._load_forest(forest_path, model_sha256)
+        fused_forest = self._load_forest(fused_forest_path, model_sha256, scaler_sha256)
+
+        model_loader = lambda: load_pickle(model_path)
+        scaler_loader = lambda: self._load_scaler(scaler_path, feature_path, feature_columns)
+        model = scaler = None
+        if not (self.lazy or self.forest_only):
+            model = model_loader()
+            scaler = scaler_loader()
+        load_time_ms = (time.perf_counter() - start) * 1000
+        return ModelBundle(model, scaler, feature_columns, version,
+                           round(load_time_ms, 2), time.time(),
+                           forest=forest, fused_forest=fused_forest,
+                           model_loader=model_loader, scaler_loader=scaler_loader,
+                           forest_only=self.forest_only)
+
+    def _load_forest(self, path, model_sha256, scaler_sha256=None):
+        """Flat (or fused) forest exported from these exact pickles, or None"""
+        if not os.path.exists(path):
+            return None
+        forest = FlatForest.load(path)
+        if forest.source_sha256 != model_sha256 or forest.fused != (scaler_sha256 is not None):
+            print(f"⚠️ {path} was exported from a different model, ignoring it")
+            return None
+        if scaler_sha256 is not None and forest.scaler_sha256 != scaler_sha256:
+            print(f"⚠️ {path} was fused with a different scaler, ignoring it")
+            return None
+        return forest
+
+    def reload(self, force=False):
+        """Reload the artifacts if their mtime and content hash changed (or if forced)"""
+        with self._reload_lock:
+            self._last_check = time.monotonic()
+            signature = self._stat()
+            if signature is None:
+                return self._bundle
+            if not force and signature == self._stat_signature:
+                return self._bundle
+
+            try:
+                version = self._content_hash()
+                if not force and self._bundle is not None and version == self._bundle.version:
+                    # Touched but unchanged: remember the new mtime and keep serving.
+                    self._stat_signature = signature
+                    return self._bundle
+                bundle = self._load(version)
+            except Exception as e:
+                self.last_error = str(e)
+                print("❌ Model reload failed:", e)
+                return self._bundle
+
+            self._bundle = bundle
+            self._stat_signature = signature
+            self.reload_count += 1
+            self.last_error = None
+            print(f"✅ Model version {bundle.version} loaded in {bundle.load_time_ms} ms")
+            return bundle
+
+    def get(self):
+        """Current bundle, checking the files for changes at most every check_interval seconds"""
+        bundle = self._bundle
+        if bundle is None or time.monotonic() - self._last_check >= self.check_interval:
+            if self._reload_lock.locked() and bundle is not None:
+                return bundle
+            bundle = self.reload()
+        return bundle
+
+    def status(self):
+        bundle = self._bundle
+        if bundle is None:
+            return {"loaded": False, "last_error": self.last_error}
+        return {
+            "loaded": True,
+            "version": bundle.version,
+            "load_time_ms": bundle.load_time_ms,
+            "loaded_at": bundle.loaded_at,
+            "feature_columns": bundle.feature_columns,
+            "evaluator": bundle.evaluator,
+            "lazy": self.lazy,
+            "forest_only": bundle.forest_only,
+            "sklearn_model_loaded": bundle.model_loaded,
+            "reload_count": self.reload_count,
+            "last_error": self.last_error,
+        }
+
+
+registry = ModelRegistry()
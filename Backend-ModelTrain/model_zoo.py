@@ -0,0 +1,129 @@
+import os
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import PolynomialFeatures, StandardScaler
+from sklearn.linear_model import LinearRegression, Ridge, Lasso
+from sklearn.tree import DecisionTreeRegressor
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.svm import SVR
+from sklearn.model_selection import TimeSeriesSplit
+from sklearn.metrics import mean_absolute_error, r2_score
+
+RESULTS_PATH = "model_search_results.csv"
+
+# name → (estimator, hyperparameter grid). Estimators are fitted on
+# standardized features, the same way train_model.py serves them.
+MODEL_ZOO = {
+    "Linear Regression": (LinearRegression(), {}),
+    "Polynomial Regression": (
+        make_pipeline(PolynomialFeatures(), LinearRegression()),
+        {"polynomialfeatures__degree": [2, 3]},
+    ),
+    "Ridge Regression": (Ridge(), {"alpha": [0.1, 1.0, 10.0]}),
+    "Lasso Regression": (Lasso(max_iter=10_000), {"alpha": [0.01, 0.1, 1.0]}),
+    "Decision Tree": (
+        DecisionTreeRegressor(random_state=42),
+        {"max_depth": [None, 5, 10], "min_samples_leaf": [1, 5]},
+    ),
+    "Random Forest": (
+        RandomForestRegressor(random_state=42, n_jobs=1),
+        {"n_estimators": [50, 100, 200], "max_depth": [None, 10], "min_samples_leaf": [1, 3]},
+    ),
+    "Support Vector Machine": (SVR(kernel="rbf"), {"C": [1.0, 10.0, 100.0], "epsilon": [0.1, 1.0]}),
+}
+
+
+def expand_grid(zoo, names=None, grid_overrides=None):
+    """One (name, params) candidate per point of each selected model's grid"""
+    candidates = []
+    for name, (_, grid) in zoo.items():
+        if names and name not in names:
+            continue
+        grid = (grid_overrides or {}).get(name, grid)
+        keys = sorted(grid)
+        for values in itertools.product(*(grid[k] for k in keys)):
+            candidates.append((name, dict(zip(keys, values))))
+    return candidates
+
+
+def _single_row_latency_ms(estimator, X_scaled, repeat=30):
+    row = X_scaled[:1]
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        estimator.predict(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings) * 1000)
+
+
+def evaluate_candidate(name, params, X, y, n_splits=5, zoo=MODEL_ZOO):
+    """Time-series cross-validate one candidate and time its fit and single-row predict"""
+    base, _ = zoo[name]
+    r2s, maes, fit_seconds = [], [], []
+    start = time.perf_counter()
+    for train_idx, test_idx in TimeSeriesSplit(n_splits=n_splits).split(X):
+        scaler = StandardScaler().fit(X[train_idx])
+        estimator = clone(base).set_params(**params)
+        fit_start = time.perf_counter()
+        estimator.fit(scaler.transform(X[train_idx]), y[train_idx])
+        fit_seconds.append(time.perf_counter() - fit_start)
+        y_pred = estimator.predict(scaler.transform(X[test_idx]))
+        r2s.append(r2_score(y[test_idx], y_pred))
+        maes.append(mean_absolute_error(y[test_idx], y_pred))
+    wall_seconds = time.perf_counter() - start
+
+    latency_ms = _single_row_latency_ms(estimator, scaler.transform(X[test_idx]))
+    r2 = float(np.mean(r2s))
+    return {
+        "model": name,
+        "params": params,
+        "cv_r2": r2,
+        "cv_r2_std": float(np.std(r2s)),
+        "cv_mae": float(np.mean(maes)),
+        "fit_seconds": float(np.mean(fit_seconds)),
+        "wall_seconds": wall_seconds,
+        "latency_ms": latency_ms,
+        # Serving cost matters as much as accuracy: R² per millisecond of predict.
+        "r2_per_ms": r2 / max(latency_ms, 1e-3),
+    }
+
+
+def run_search(X, y, names=None, grid_overrides=None, n_splits=5, n_jobs=None, zoo=MODEL_ZOO):
+    """Evaluate every candidate across a process pool and return the results table"""
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    candidates = expand_grid(zoo, names, grid_overrides)
+    n_jobs = n_jobs or os.cpu_count()
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        futures = [pool.submit(evaluate_candidate, name, params, X, y, n_splits, zoo)
+                   for name, params in candidates]
+        rows = [future.result() for future in futures]
+
+    return pd.DataFrame(rows).sort_values("r2_per_ms", ascending=False).reset_index(drop=True)
+
+
+def select_best(results, r2_tolerance=0.02, min_r2=0.0):
+    """Candidate with the highest R² per millisecond among the near-best ones.
+
+    Only candidates within r2_tolerance of the best cross-validated R² (and
+    at or above min_r2) compete on speed, so a fast model cannot win by
+    giving up most of the accuracy. If nothing reaches min_r2 the objective
+    is meaningless (negative R² divided by latency rewards slow models), so
+    fall back to the most accurate candidate.
+    """
+    best_r2 = results["cv_r2"].max()
+    if best_r2 < min_r2:
+        print(f"⚠️ No candidate reached a cross-validated R² of {min_r2}; picking the highest R² instead")
+        return results.sort_values("cv_r2", ascending=False).iloc[0]
+    eligible = results[results["cv_r2"] >= max(best_r2 - r2_tolerance, min_r2)]
+    return eligible.sort_values("r2_per_ms", ascending=False).iloc[0]
+
+
+def build_estimator(name, params, zoo=MODEL_ZOO):
+    return clone(zoo[name][0]).set_params(**params)
@@ -0,0 +1,129 @@
+import os
+import time
+import threading
+import pymongo
+from pymongo import MongoClient
+from pymongo import monitoring
+from pymongo.errors import PyMongoError
+from metrics import metrics, mark_stage
+
+DB_NAME = "SolarPower-ML"
+
+# environment variable → MongoClient keyword; unset variables keep the driver default.
+POOL_SETTINGS = {
+    "MONGO_MAX_POOL_SIZE": ("maxPoolSize", int),
+    "MONGO_MIN_POOL_SIZE": ("minPoolSize", int),
+    "MONGO_MAX_IDLE_MS": ("maxIdleTimeMS", int),
+    "MONGO_WAIT_QUEUE_TIMEOUT_MS": ("waitQueueTimeoutMS", int),
+    "MONGO_CONNECT_TIMEOUT_MS": ("connectTimeoutMS", int),
+    "MONGO_SOCKET_TIMEOUT_MS": ("socketTimeoutMS", int),
+    "MONGO_SERVER_SELECTION_TIMEOUT_MS": ("serverSelectionTimeoutMS", int),
+    "MONGO_READ_PREFERENCE": ("readPreference", str),
+    "MONGO_APP_NAME": ("appname", str),
+}
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Feeds every command's server round trip into mongo_command_duration_seconds.
+
+    Listeners run in the thread (or task) that issued the command, so the
+    request's time up to the reply is also charged to its "mongo" stage.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        metrics.observe("mongo_command_duration_seconds", event.duration_micros / 1e6,
+                        command=event.command_name, outcome="ok")
+        mark_stage("mongo")
+
+    def failed(self, event):
+        metrics.observe("mongo_command_duration_seconds", event.duration_micros / 1e6,
+                        command=event.command_name, outcome="error")
+        mark_stage("mongo")
+
+
+def mongo_options_from_env():
+    """MongoClient / AsyncMongoClient keyword arguments from MONGO_* variables"""
+    options = {}
+    for env, (option, cast) in POOL_SETTINGS.items():
+        value = os.environ.get(env)
+        if value:
+            options[option] = cast(value)
+    return options
+
+
+class MongoConnection:
+    """A MongoClient created on first use in each process.
+
+    Nothing connects at import, so gunicorn can fork workers from a master
+    that never touched the network, and a forked worker never reuses the
+    parent's sockets (pymongo clients are not fork-safe). on_connect runs
+    once per process right after the client is built, e.g. to provision
+    indexes, and no caller gets the client before it has finished: signup
+    relies on the unique email index to reject duplicate accounts.
+    """
+
+    def __init__(self, uri=None, db_name=DB_NAME, on_connect=None, **options):
+        self.uri = uri
+        self.db_name = db_name
+        self.on_connect = on_connect
+        self.options = options
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.created_ms = None
+
+    @classmethod
+    def from_env(cls, on_connect=None):
+        return cls(os.environ.get("MONGO_URI"), os.environ.get("MONGO_DB", DB_NAME),
+                   on_connect=on_connect, event_listeners=[MongoCommandTimer()], **mongo_options_from_env())
+
+    @property
+    def client(self):
+        if self._pid == os.getpid():
+            return self._client
+        with self._lock:
+            if self._pid != os.getpid():
+                start = time.perf_counter()
+                self._client = MongoClient(self.uri, **self.options)
+                self.created_ms = (time.perf_counter() - start) * 1000
+                if self.on_connect is not None:
+                    # Other threads wait on the lock until this returns.
+                    self.on_connect(self._client[self.db_name])
+                self._pid = os.getpid()
+        return self._client
+
+    @property
+    def database(self):
+        return self.client[self.db_name]
+
+    def collection(self, name):
+        return LazyCollection(self, name)
+
+    def health(self, timeout=2.0):
+        """Ping the server through the pool; returns a JSON-able report with an "ok" flag"""
+        pool = {k: v for k, v in self.options.items() if k != "event_listeners"}
+        report = {"ok": False, "pool": pool, "pid": os.getpid()}
+        start = time.perf_counter()
+        try:
+            with pymongo.timeout(timeout):
+                self.client.admin.command("ping")
+            report["ok"] = True
+        except PyMongoError as e:
+            report["error"] = str(e)[:200]
+        report["ping_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        report["client_created_ms"] = round(self.created_ms, 3) if self.created_ms is not None else None
+        return report
+
+
+class LazyCollection:
+    """Stands in for a pymongo Collection and resolves it in the calling process on each use"""
+
+    def __init__(self, connection, name):
+        self._connection = connection
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(self._connection.database[self._name], attr)
@@ -0,0 +1,147 @@
+import os
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import bcrypt
+from metrics import metrics, mark_stage
+
+_COST_RE = re.compile(r"^\$2[abxy]?\$(\d{2})\$")
+
+
+class HasherBusyError(Exception):
+    """Raised when too many password hashes are already running or waiting"""
+
+
+class PasswordHasher:
+    """Bcrypt hashing on a small dedicated thread pool with admission control.
+
+    At most `workers` hashes run at once (bcrypt releases the GIL, so they
+    use real cores) and at most `max_pending` more may wait; beyond that a
+    caller waits up to admit_timeout for a slot and then gets
+    HasherBusyError, so a login burst is shed instead of taking every
+    worker thread away from predictions. workers=0 hashes on the calling
+    thread with no limit, which is how Flask-Bcrypt behaved.
+
+    Hashes are plain bcrypt, the same format Flask-Bcrypt produced, so
+    existing passwords keep verifying. Hashes made with a different cost
+    than `rounds` are reported by needs_rehash() and replaced on login.
+    """
+
+    def __init__(self, rounds=12, workers=2, max_pending=16, admit_timeout=0.5):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.admit_timeout = admit_timeout
+        self._slots = threading.BoundedSemaphore(workers + max_pending) if workers else None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt") if workers else None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.hashed = 0
+        self.checked = 0
+        self.rehashed = 0
+        self.rejected = 0
+        self.total_ms = 0.0
+
+    def _timed(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.total_ms += elapsed * 1000
+            metrics.observe("bcrypt_duration_seconds", elapsed)
+
+    def submit(self, fn, *args, admit_timeout=None):
+        """Run fn(*args) on the hashing pool and return its Future.
+
+        Raises HasherBusyError if no slot frees up within admit_timeout.
+        """
+        timeout = self.admit_timeout if admit_timeout is None else admit_timeout
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self.rejected += 1
+            raise HasherBusyError("Too many password operations in progress")
+        with self._lock:
+            self.in_flight += 1
+        try:
+            future = self._executor.submit(self._timed, fn, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(lambda _: self._release())
+        return future
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def _run(self, fn, *args):
+        # The caller's "bcrypt" stage includes time spent waiting for a slot.
+        try:
+            if self._executor is None:
+                return self._timed(fn, *args)
+            return self.submit(fn, *args).result()
+        finally:
+            mark_stage("bcrypt")
+
+    def _hash(self, password, rounds):
+        return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds=rounds)).decode("utf-8")
+
+    @staticmethod
+    def _check(pw_hash, password):
+        return bcrypt.checkpw(password.encode("utf-8"), pw_hash.encode("utf-8"))
+
+    def hash(self, password):
+        """bcrypt hash of password at the configured cost, as a str"""
+        value = self._run(self._hash, password, self.rounds)
+        with self._lock:
+            self.hashed += 1
+        return value
+
+    def check(self, pw_hash, password):
+        value = self._run(self._check, pw_hash, password)
+        with self._lock:
+            self.checked += 1
+        return value
+
+    def needs_rehash(self, pw_hash):
+        match = _COST_RE.match(pw_hash)
+        return match is None or int(match.group(1)) != self.rounds
+
+    def verify_and_update(self, pw_hash, password):
+        """Check password and return (ok, new_hash); new_hash is set when the stored cost is stale"""
+        if not self.check(pw_hash, password):
+            return False, None
+        if not self.needs_rehash(pw_hash):
+            return True, None
+        new_hash = self.hash(password)
+        with self._lock:
+            self.rehashed += 1
+        return True, new_hash
+
+    def stats(self):
+        operations = self.hashed + self.checked
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "max_pending": self.max_pending,
+            "in_flight": self.in_flight,
+            "hashed": self.hashed,
+            "checked": self.checked,
+            "rehashed": self.rehashed,
+            "rejected": self.rejected,
+            "mean_ms": round(self.total_ms / operations, 3) if operations else 0.0,
+        }
+
+
+def password_hasher_from_env():
+    """Build the app's PasswordHasher from BCRYPT_* environment variables"""
+    return PasswordHasher(
+        rounds=int(os.environ.get("BCRYPT_LOG_ROUNDS", 12)),
+        workers=int(os.environ.get("BCRYPT_WORKERS", 2)),
+        max_pending=int(os.environ.get("BCRYPT_MAX_PENDING", 16)),
+        admit_timeout=float(os.environ.get("BCRYPT_ADMIT_TIMEOUT", 0.5)),
+    )
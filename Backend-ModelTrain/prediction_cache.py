@@ -0,0 +1,100 @@
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+class PredictionCache:
+    """LRU + TTL cache of predictions keyed by model version and quantized feature row.
+
+    Rows are rounded to `decimals` places before hashing so that repeated
+    dashboard forecasts for the same conditions hit. Entries from an older
+    model version are dropped as soon as a newer version is seen.
+    """
+
+    def __init__(self, max_entries=10_000, ttl_seconds=3600.0, decimals=6):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.decimals = decimals
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def keys_for(self, X):
+        # + 0.0 folds -0.0 into 0.0 so both hash the same.
+        quantized = np.round(X, self.decimals) + 0.0
+        return [row.tobytes() for row in quantized]
+
+    def _sync_version(self, version):
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._version = version
+
+    def lookup(self, version, keys):
+        """Cached values (NaN where absent) and a mask of the rows that missed"""
+        values = np.full(len(keys), np.nan)
+        missing = np.ones(len(keys), dtype=bool)
+        now = time.monotonic()
+        with self._lock:
+            self._sync_version(version)
+            for i, key in enumerate(keys):
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                value, expires_at = entry
+                if expires_at < now:
+                    del self._entries[key]
+                    self.expirations += 1
+                    continue
+                self._entries.move_to_end(key)
+                values[i] = value
+                missing[i] = False
+            n_hits = int((~missing).sum())
+            self.hits += n_hits
+            self.misses += len(keys) - n_hits
+        return values, missing
+
+    def store(self, version, keys, values):
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            self._sync_version(version)
+            for key, value in zip(keys, values):
+                self._entries[key] = (float(value), expires_at)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "model_version": self._version,
+        }
+
+
+prediction_cache = PredictionCache()
@@ -0,0 +1,193 @@
+import os
+import io
+import json
+import time
+import pstats
+import cProfile
+import platform
+import resource
+import tracemalloc
+from contextlib import contextmanager
+
+REPORT_PATH = "training_profile.json"
+CPROFILE_PATH = "training_profile.prof"
+TRACEMALLOC_PATH = "training_profile.tracemalloc"
+CAPTURES = ("cprofile", "tracemalloc")
+TOP_ENTRIES = 25
+
+
+def _children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _status_kb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss():
+    """Restart the kernel's RSS high-water mark (VmHWM); False where that is not possible"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class StageProfiler:
+    """Wall time, CPU time and peak memory of each named stage of a run.
+
+    A stage entered several times (e.g. once per CSV chunk) accumulates its
+    times and keeps its highest peak. CPU time is this process's user +
+    system time across all its threads plus that of child processes reaped
+    during the stage. Peak RSS is the kernel's high-water mark, reset at
+    each stage start on Linux; elsewhere it is the process lifetime peak.
+
+    With captures ("cprofile", "tracemalloc") every stage is also profiled
+    and the capture of the slowest stage is kept for the report. Both slow
+    the run down, tracemalloc by several times, so compare timings only
+    between runs made with the same captures.
+    """
+
+    def __init__(self, enabled=False, captures=()):
+        self.enabled = enabled
+        self.captures = tuple(captures)
+        self.stages = {}
+        self._profiles = {}
+        self._snapshot = None
+        self._started = None
+        self._active = None
+        self._peak_resettable = None
+
+    def start(self, captures=()):
+        self.enabled = True
+        self.captures = tuple(captures)
+        self._started = time.perf_counter()
+        if "tracemalloc" in self.captures and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        # Peak RSS resets and cProfile cannot nest, so neither can stages.
+        if self._active is not None:
+            raise RuntimeError(f"stage {name!r} started inside stage {self._active!r}")
+        self._active = name
+        if self._peak_resettable is None or self._peak_resettable:
+            self._peak_resettable = _reset_peak_rss()
+        rss_start = _status_kb("VmRSS")
+        profile = None
+        if "cprofile" in self.captures:
+            profile = self._profiles.setdefault(name, cProfile.Profile())
+            profile.enable()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        wall, cpu, child_cpu = time.perf_counter(), time.process_time(), _children_cpu()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu + _children_cpu() - child_cpu
+            if profile is not None:
+                profile.disable()
+            self._active = None
+            self._record(name, wall, cpu, rss_start)
+
+    def _record(self, name, wall, cpu, rss_start):
+        entry = self.stages.setdefault(name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                                              "rss_start_mb": None, "peak_rss_mb": None})
+        entry["calls"] += 1
+        entry["wall_s"] += wall
+        entry["cpu_s"] += cpu
+        if entry["rss_start_mb"] is None and rss_start is not None:
+            entry["rss_start_mb"] = round(rss_start / 1024, 1)
+        peak = _status_kb("VmHWM") if self._peak_resettable else None
+        if peak is None:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        entry["peak_rss_mb"] = max(entry["peak_rss_mb"] or 0.0, round(peak / 1024, 1))
+        if tracemalloc.is_tracing():
+            traced_peak = round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+            entry["traced_peak_mb"] = max(entry.get("traced_peak_mb", 0.0), traced_peak)
+            # A snapshot is large; keep only the one of the slowest stage so far.
+            if name == self.slowest():
+                self._snapshot = (name, tracemalloc.take_snapshot())
+
+    def slowest(self):
+        if not self.stages:
+            return None
+        return max(self.stages, key=lambda name: self.stages[name]["wall_s"])
+
+    def report(self):
+        total = time.perf_counter() - self._started if self._started is not None else None
+        stages = {}
+        for name, entry in self.stages.items():
+            stages[name] = dict(entry, wall_s=round(entry["wall_s"], 4), cpu_s=round(entry["cpu_s"], 4),
+                                cpu_per_wall=round(entry["cpu_s"] / entry["wall_s"], 2) if entry["wall_s"] else None,
+                                share=round(entry["wall_s"] / total, 4) if total else None)
+        slowest = self.slowest()
+        report = {
+            "created_at": time.time(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "total_wall_s": round(total, 4) if total is not None else None,
+            "peak_rss_is_per_stage": bool(self._peak_resettable),
+            "captures": list(self.captures),
+            "slowest_stage": slowest,
+            "stages": stages,
+        }
+        if slowest in self._profiles:
+            out = io.StringIO()
+            stats = pstats.Stats(self._profiles[slowest], stream=out)
+            stats.sort_stats("cumulative").print_stats(TOP_ENTRIES)
+            report["cprofile"] = {"stage": slowest, "top_cumulative": out.getvalue().splitlines()}
+        if self._snapshot is not None:
+            name, snapshot = self._snapshot
+            report["tracemalloc"] = {"stage": name, "top_lines": [
+                {"where": str(stat.traceback), "size_mb": round(stat.size / 2**20, 3), "blocks": stat.count}
+                for stat in snapshot.statistics("lineno")[:TOP_ENTRIES]
+            ]}
+        return report
+
+    def save(self, directory="."):
+        """Write the JSON report, plus the slowest stage's raw captures, into directory"""
+        report = self.report()
+        path = os.path.join(directory, REPORT_PATH)
+        with open(path + ".tmp", "w") as f:
+            json.dump(report, f, indent=2)
+        os.replace(path + ".tmp", path)
+        written = [path]
+        slowest = report["slowest_stage"]
+        captures = {CPROFILE_PATH: self._profiles[slowest].dump_stats if slowest in self._profiles else None,
+                    TRACEMALLOC_PATH: self._snapshot[1].dump if self._snapshot is not None else None}
+        for name, dump in captures.items():
+            capture_path = os.path.join(directory, name)
+            if dump is not None:
+                dump(capture_path)
+                written.append(capture_path)
+            elif os.path.exists(capture_path):
+                # Left by an earlier run; it would not match this report.
+                os.remove(capture_path)
+        return report, written
+
+    def summary(self):
+        lines = [f"{'stage':24s} {'calls':>5} {'wall s':>9} {'cpu s':>9} {'cpu/wall':>8} {'peak RSS MB':>11}"]
+        for name, entry in self.stages.items():
+            ratio = entry["cpu_s"] / entry["wall_s"] if entry["wall_s"] else 0.0
+            lines.append(f"{name:24s} {entry['calls']:>5} {entry['wall_s']:>9.3f} {entry['cpu_s']:>9.3f} "
+                         f"{ratio:>8.2f} {entry['peak_rss_mb']:>11.1f}")
+        return "\n".join(lines)
+
+
+# Shared by train_model.py and the ingest/feature-cache helpers it calls; a
+# no-op until start() is called.
+profiler = StageProfiler()
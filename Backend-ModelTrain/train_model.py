@@ -265,102 +265,372 @@
 
 # print("\n✅ Random Forest model, scaler, and feature columns saved successfully!")
 
-
+import os
+import json
+import time
+import argparse
 import numpy as np
 import joblib
 import pandas as pd
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import train_test_split, GroupShuffleSplit
 from sklearn.preprocessing import StandardScaler
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import r2_score
-from sklearn.impute import KNNImputer
-
-print("Starting model training...")
-
-try:
-    df = pd.read_csv("Solar_Power_Prediction.csv")
-    print("Dataset loaded successfully!")
-except FileNotFoundError:
-    print("❌ ERROR: Solar_Power_Prediction.csv not found!")
-    print("Please make sure the file is in the same directory.")
-    exit()
-
-
-# Convert "Is Daylight" to numeric binary (1/0)
-df["Is Daylight"] = (
-    df["Is Daylight"]
-    .astype(str)
-    .str.upper()
-    .replace({"TRUE": 1, "FALSE": 0, "YES": 1, "NO": 0})
-    .astype(int)
-)
-
-# Handle missing values
-mask = (df["Is Daylight"] == 1) & (df["Power Generated"] == 0)
-df.loc[mask, "Power Generated"] = np.nan
-numeric_df = df.select_dtypes(include=[np.number])
-imputer = KNNImputer(n_neighbors=3)
-df[numeric_df.columns] = imputer.fit_transform(numeric_df)
-print("Missing values handled.")
-
-df["Power Generated"] = df["Power Generated"] / 1000
-
-daily_power = (
-    df.groupby(["Year", "Month", "Day"], as_index=False)
-    .agg({
-        "Is Daylight": "max",
-        # "Distance to Solar Noon": "mean", # 👈 BUGGY FEATURE IS REMOVED
-        "Average Temperature (Day)": "mean",
-        "Average Wind Direction (Day)": "mean",
-        "Average Wind Speed (Day)": "mean",
-        "Sky Cover": "mean",
-        "Visibility": "mean",
-        "Relative Humidity": "mean",
-        "Average Wind Speed (Period)":"mean",
-        "Average Barometric Pressure (Period)": "mean",
-        "Power Generated": "sum",
-    })
-)
-
-daily_power = daily_power.sort_values(by=["Year", "Month", "Day"]).reset_index(drop=True)
-
-drop_cols = ["Power Generated", "Year", "Average Wind Speed (Period)"]
-
-if "Distance to Solar Noon" in daily_power.columns:
-    daily_power = daily_power.drop(columns=["Distance to Solar Noon"])
-
-X = daily_power.drop(columns=drop_cols)
-y = daily_power["Power Generated"]
-
-X.to_csv("feature_columns.csv", index=False)
-print(f"✅ Features saved. Using: {X.columns.tolist()}")
-
-
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, random_state=42
-)
-
-# Scale features
-scaler = StandardScaler()
-X_train_scaled = scaler.fit_transform(X_train)
-X_test_scaled = scaler.transform(X_test)
-
-
-print("\nTraining Random Forest model...")
-model = RandomForestRegressor(n_estimators=100, random_state=42)
-
-model.fit(X_train_scaled, y_train)
-y_test_pred = model.predict(X_test_scaled)
-test_r2 = r2_score(y_test, y_test_pred)
-
-print(f"Model trained. Test R²: {test_r2:.4f}")
-
-full_X_scaled = scaler.fit_transform(X) 
-model.fit(full_X_scaled, y)
-
-joblib.dump(model, "random_forest_model.pkl")
-joblib.dump(scaler, "scaler.pkl")
-
-print("\n✅✅✅ FINISHED! ✅✅✅")
-print("New 'random_forest_model.pkl', 'scaler.pkl', and 'feature_columns.csv' are saved.")
-print("You can now run app.py")
\ No newline at end of file
+from flat_forest import (export_flat_forest, export_fused_forest, check_parity,
+                         FOREST_PATH, FUSED_FOREST_PATH)
+from model_registry import content_hash
+from imputation import IMPUTE_METHODS
+from ingest import DATA_PATH, load_daily_power, stream_daily_power, load_hourly_power
+from feature_cache import cached_daily_power, appended_path, read_table, write_table
+from model_zoo import MODEL_ZOO, RESULTS_PATH, run_search, select_best, build_estimator
+from stage_profiler import profiler, CAPTURES
+from hourly_model import (HOURLY_MODEL_PATH, HOURLY_SCALER_PATH, HOURLY_FEATURE_PATH, HOURLY_FOREST_PATH,
+                          HOURLY_FUSED_FOREST_PATH, SOLAR_GEOMETRY_PATH, HOURLY_ARTIFACT_PATHS,
+                          HOURLY_DROP_COLS, SolarGeometry)
+from incremental import (append_daily_rows, recent_window, warm_start_forest,
+                         publish_version, publish_baseline, last_full_fit_seconds)
+
+MODEL_PATH = "random_forest_model.pkl"
+SCALER_PATH = "scaler.pkl"
+FEATURE_PATH = "feature_columns.csv"
+ARTIFACT_PATHS = [MODEL_PATH, SCALER_PATH, FEATURE_PATH, "forest_nodes.npz", "fused_forest.npz"]
+DROP_COLS = ["Power Generated", "Year", "Average Wind Speed (Period)"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the solar power Random Forest model")
+    parser.add_argument("--fused", action="store_true",
+                        help="also export fused_forest.npz with the scaler folded into the thresholds")
+    parser.add_argument("--impute", choices=IMPUTE_METHODS, default="knn",
+                        help="knn: brute-force KNNImputer (default), kdtree: chunked KD-tree neighbours, "
+                             "interpolate: time-aware interpolation between neighbouring periods")
+    parser.add_argument("--stream", action="store_true",
+                        help="read the hourly CSV in chunks and aggregate days incrementally (bounded memory)")
+    parser.add_argument("--chunksize", type=int, default=100_000,
+                        help="rows per chunk in --stream mode (default: 100000)")
+    parser.add_argument("--rebuild-cache", action="store_true",
+                        help="ignore the cached daily feature table and rebuild it from the CSV")
+    parser.add_argument("--search", action="store_true",
+                        help="pick the model from a parallel model-zoo search instead of the fixed Random Forest")
+    parser.add_argument("--search-models", nargs="+", choices=list(MODEL_ZOO), metavar="MODEL",
+                        help=f"zoo entries to search (default: all of {', '.join(MODEL_ZOO)})")
+    parser.add_argument("--search-grid", metavar="JSON",
+                        help="JSON file mapping zoo entry → hyperparameter grid, overriding the defaults")
+    parser.add_argument("--search-jobs", type=int, default=None,
+                        help="worker processes for --search (default: one per CPU)")
+    parser.add_argument("--cv-splits", type=int, default=5,
+                        help="time-series cross-validation folds for --search (default: 5)")
+    parser.add_argument("--min-r2", type=float, default=0.0,
+                        help="minimum cross-validated R² a --search candidate needs to be selected")
+    parser.add_argument("--r2-tolerance", type=float, default=0.02,
+                        help="how far below the best cross-validated R² a --search candidate may fall "
+                             "and still be picked for speed (default: 0.02)")
+    parser.add_argument("--incremental", metavar="NEW_CSV",
+                        help="warm-start the saved forest on new hourly telemetry instead of a full retrain")
+    parser.add_argument("--add-trees", type=int, default=20,
+                        help="trees to grow in --incremental mode (default: 20)")
+    parser.add_argument("--replace-oldest", action="store_true",
+                        help="in --incremental mode, retire as many of the oldest trees as are added")
+    parser.add_argument("--window-days", type=int, default=120,
+                        help="in --incremental mode, fit new trees on this many most recent days (default: 120)")
+    parser.add_argument("--compare-full", action="store_true",
+                        help="in --incremental mode, also time a full retrain to report the time saved")
+    parser.add_argument("--hourly", action="store_true",
+                        help="train the hourly model family on the 3-hour rows (own artifact set, "
+                             "served by /api/predict/solarpower/hourly) instead of the daily model")
+    parser.add_argument("--profile", action="store_true",
+                        help="record wall time, CPU time and peak memory per stage into training_profile.json")
+    parser.add_argument("--profile-capture", nargs="+", choices=CAPTURES, default=[],
+                        help="with --profile, also keep a cProfile / tracemalloc capture of the slowest stage")
+    return parser.parse_args()
+
+
+def prepare_daily_power(args):
+    def build_daily_power():
+        if args.stream:
+            return stream_daily_power(DATA_PATH, chunksize=args.chunksize, impute_method=args.impute)
+        return load_daily_power(DATA_PATH, impute_method=args.impute)
+
+    # Cleaning, imputation and aggregation give the same table for the same
+    # input and settings, so reuse it from the cache when nothing changed.
+    pipeline_config = {
+        "impute": args.impute,
+        "n_neighbors": 3,
+        "chunksize": args.chunksize if args.stream else None,
+    }
+    daily_power = cached_daily_power(DATA_PATH, pipeline_config, build_daily_power,
+                                     rebuild=args.rebuild_cache)
+    # Days added by --incremental live only in the appended table, not in the
+    # source CSV, so every run (full retrains included) trains on them too.
+    appended = read_table(appended_path())
+    if appended is not None:
+        daily_power = append_daily_rows(daily_power, appended)
+        print(f"✅ Including {len(appended)} days from earlier incremental updates "
+              f"({len(daily_power)} days in the feature table)")
+    return daily_power
+
+
+def search_model(args, X, y):
+    """Run the model-zoo search and return an unfitted estimator for the winner"""
+    grid_overrides = None
+    if args.search_grid:
+        with open(args.search_grid) as f:
+            grid_overrides = json.load(f)
+
+    n_jobs = args.search_jobs or os.cpu_count()
+    print(f"\nSearching model zoo with time-series CV across {n_jobs} processes...")
+    results = run_search(X, y, names=args.search_models, grid_overrides=grid_overrides,
+                         n_splits=args.cv_splits, n_jobs=n_jobs)
+    results.to_csv(RESULTS_PATH, index=False)
+
+    columns = ["model", "params", "cv_r2", "cv_mae", "fit_seconds", "latency_ms", "r2_per_ms"]
+    print(results[columns].head(10).to_string(index=False))
+    print(f"✅ {len(results)} candidates evaluated. Full table saved to {RESULTS_PATH}")
+
+    best = select_best(results, r2_tolerance=args.r2_tolerance, min_r2=args.min_r2)
+    print(f"Selected {best['model']} {best['params']} "
+          f"(CV R² {best['cv_r2']:.4f}, {best['latency_ms']:.3f} ms/row)")
+    return best["model"], build_estimator(best["model"], best["params"])
+
+
+def split_features(daily_power):
+    if "Distance to Solar Noon" in daily_power.columns:
+        daily_power = daily_power.drop(columns=["Distance to Solar Noon"])
+    return daily_power.drop(columns=DROP_COLS), daily_power["Power Generated"]
+
+
+def export_forests(args, model, scaler, X, X_scaled, model_path=MODEL_PATH, scaler_path=SCALER_PATH,
+                   forest_path=FOREST_PATH, fused_forest_path=FUSED_FOREST_PATH):
+    # Flatten the trees into node arrays for the backend's fast evaluator.
+    with profiler.stage("export_forests"):
+        forest = export_flat_forest(model, model_path, path=forest_path)
+        max_diff = check_parity(model, forest, X_scaled)
+    print(f"Flat forest exported ({forest.node_count} nodes). Parity max abs diff: {max_diff:.3g}")
+
+    # Optionally fold the scaler into the thresholds so serving can skip scaling.
+    if args.fused:
+        with profiler.stage("export_forests"):
+            fused = export_fused_forest(forest, scaler, scaler_path, path=fused_forest_path)
+            max_diff = check_parity(model, fused, X, scaler=scaler)
+        print(f"Fused forest exported. Parity max abs diff: {max_diff:.3g}")
+
+
+def save_profile(args):
+    """Print the per-stage table and write training_profile.json next to the model artifacts"""
+    if not args.profile:
+        return
+    print("\nTraining profile:")
+    print(profiler.summary())
+    report, written = profiler.save(os.path.dirname(os.path.abspath(MODEL_PATH)))
+    print(f"Slowest stage: {report['slowest_stage']}. Profile saved to {', '.join(written)}")
+
+
+def train_hourly(args):
+    """Fit the hourly model family on the 3-hour rows and save its own artifact set"""
+    try:
+        hourly = load_hourly_power(DATA_PATH, impute_method=args.impute)
+    except FileNotFoundError:
+        print("❌ ERROR: Solar_Power_Prediction.csv not found!")
+        exit()
+
+    announce_baseline(HOURLY_ARTIFACT_PATHS)
+    with profiler.stage("split"):
+        X = hourly.drop(columns=HOURLY_DROP_COLS)
+        y = hourly["Power Generated"]
+        # Periods of one day are near-duplicates of each other, so hold out
+        # whole days: a random row split would score the model on days it saw.
+        days = hourly["Year"] * 10000 + hourly["Month"] * 100 + hourly["Day"]
+        train_idx, test_idx = next(GroupShuffleSplit(n_splits=1, test_size=0.2, random_state=42).split(X, y, days))
+        X.head(0).to_csv(HOURLY_FEATURE_PATH, index=False)
+    print(f"✅ Hourly features saved. Using: {X.columns.tolist()}")
+
+    with profiler.stage("scale"):
+        scaler = StandardScaler()
+        X_train_scaled = scaler.fit_transform(X.iloc[train_idx])
+        X_test_scaled = scaler.transform(X.iloc[test_idx])
+
+    print(f"\nTraining hourly Random Forest model on {len(X)} periods...")
+    model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1)
+    with profiler.stage("fit"):
+        model.fit(X_train_scaled, y.iloc[train_idx])
+    with profiler.stage("evaluate"):
+        test_r2 = r2_score(y.iloc[test_idx], model.predict(X_test_scaled))
+    print(f"Hourly model trained. Test R² on held-out days: {test_r2:.4f}")
+
+    with profiler.stage("refit"):
+        full_X_scaled = scaler.fit_transform(X)
+        start = time.perf_counter()
+        model.fit(full_X_scaled, y)
+        fit_seconds = time.perf_counter() - start
+    model.set_params(n_jobs=None)
+
+    with profiler.stage("dump"):
+        joblib.dump(model, HOURLY_MODEL_PATH)
+        joblib.dump(scaler, HOURLY_SCALER_PATH)
+        SolarGeometry.from_hourly(hourly).save(SOLAR_GEOMETRY_PATH)
+    export_forests(args, model, scaler, X, full_X_scaled, model_path=HOURLY_MODEL_PATH,
+                   scaler_path=HOURLY_SCALER_PATH, forest_path=HOURLY_FOREST_PATH,
+                   fused_forest_path=HOURLY_FUSED_FOREST_PATH)
+
+    with profiler.stage("publish"):
+        publish_version(HOURLY_ARTIFACT_PATHS, mode="hourly", model="Random Forest",
+                        fit_seconds=round(fit_seconds, 3), test_r2=round(test_r2, 4))
+
+    print("\n✅✅✅ FINISHED! ✅✅✅")
+    print(f"Hourly artifacts saved: {', '.join(p for p in HOURLY_ARTIFACT_PATHS if os.path.exists(p))}")
+
+
+def announce_baseline(paths):
+    with profiler.stage("publish"):
+        entry = publish_baseline(paths)
+    if entry is not None:
+        print(f"✅ Published the current model as baseline version {entry['version']} before overwriting it")
+
+
+def incremental_update(args, daily_power):
+    """Append new telemetry to the feature table and warm-start extra trees on recent days"""
+    if not os.path.exists(MODEL_PATH) or not os.path.exists(SCALER_PATH):
+        print("❌ ERROR: no saved model to update. Run a full training first.")
+        exit()
+    model = joblib.load(MODEL_PATH)
+    scaler = joblib.load(SCALER_PATH)
+    if not isinstance(model, RandomForestRegressor):
+        print("❌ ERROR: incremental retraining needs a Random Forest model.")
+        exit()
+
+    announce_baseline(ARTIFACT_PATHS)
+    new_rows = load_daily_power(args.incremental, impute_method=args.impute)
+    appended = read_table(appended_path())
+    appended = new_rows if appended is None else append_daily_rows(appended, new_rows)
+    write_table(appended, appended_path())
+    daily_power = append_daily_rows(daily_power, new_rows)
+    print(f"✅ Appended {len(new_rows)} new days ({len(daily_power)} days in the feature table)")
+
+    X, y = split_features(daily_power)
+    X.to_csv(FEATURE_PATH, index=False)
+    X_recent, y_recent = split_features(recent_window(daily_power, args.window_days))
+
+    # Keep the saved scaler: existing trees split on thresholds in its units.
+    X_recent_scaled = scaler.transform(X_recent)
+    # Seeded from the version being updated, so each run grows different trees.
+    seed = int(content_hash(ARTIFACT_PATHS), 16) % 2**32
+    action = "Replacing the oldest" if args.replace_oldest else "Growing"
+    print(f"\n{action} {args.add_trees} trees on the last {len(X_recent)} days...")
+    with profiler.stage("fit"):
+        fit_seconds = warm_start_forest(model, X_recent_scaled, y_recent, args.add_trees,
+                                        replace_oldest=args.replace_oldest, seed=seed)
+
+    with profiler.stage("evaluate"):
+        X_scaled = scaler.transform(X)
+        full_r2 = r2_score(y, model.predict(X_scaled))
+    print(f"Model updated to {len(model.estimators_)} trees in {fit_seconds:.2f}s. R² on all days: {full_r2:.4f}")
+
+    if args.compare_full:
+        start = time.perf_counter()
+        RandomForestRegressor(n_estimators=len(model.estimators_), random_state=42, n_jobs=-1).fit(X_scaled, y)
+        full_seconds = time.perf_counter() - start
+    else:
+        full_seconds = last_full_fit_seconds()
+    if full_seconds:
+        print(f"Full retrain takes {full_seconds:.2f}s: saved {full_seconds - fit_seconds:.2f}s "
+              f"({full_seconds / max(fit_seconds, 1e-9):.1f}x faster)")
+
+    with profiler.stage("dump"):
+        joblib.dump(model, MODEL_PATH)
+    export_forests(args, model, scaler, X, X_scaled)
+    with profiler.stage("publish"):
+        entry = publish_version(ARTIFACT_PATHS, mode="replace" if args.replace_oldest else "grow",
+                                n_trees=len(model.estimators_), fit_seconds=round(fit_seconds, 3),
+                                full_fit_seconds=round(full_seconds, 3) if full_seconds else None,
+                                new_days=len(new_rows), r2_all_days=round(full_r2, 4), seed=seed)
+    print(f"\n✅ Published model version {entry['version']} (previous versions kept in model_versions/)")
+
+
+def main():
+    args = parse_args()
+    if args.profile:
+        profiler.start(captures=args.profile_capture)
+    print("Starting model training...")
+
+    if args.hourly:
+        train_hourly(args)
+        save_profile(args)
+        return
+
+    try:
+        daily_power = prepare_daily_power(args)
+    except FileNotFoundError:
+        print("❌ ERROR: Solar_Power_Prediction.csv not found!")
+        print("Please make sure the file is in the same directory.")
+        exit()
+
+    if args.incremental:
+        incremental_update(args, daily_power)
+        save_profile(args)
+        return
+
+    announce_baseline(ARTIFACT_PATHS)
+    with profiler.stage("split"):
+        X, y = split_features(daily_power)
+        X.to_csv(FEATURE_PATH, index=False)
+    print(f"✅ Features saved. Using: {X.columns.tolist()}")
+
+    if args.search:
+        with profiler.stage("search"):
+            model_name, model = search_model(args, X, y)
+    else:
+        model_name = "Random Forest"
+        model = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=-1)
+
+    with profiler.stage("split"):
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42
+        )
+
+    # Scale features
+    with profiler.stage("scale"):
+        scaler = StandardScaler()
+        X_train_scaled = scaler.fit_transform(X_train)
+        X_test_scaled = scaler.transform(X_test)
+
+    print(f"\nTraining {model_name} model...")
+    with profiler.stage("fit"):
+        model.fit(X_train_scaled, y_train)
+    with profiler.stage("evaluate"):
+        y_test_pred = model.predict(X_test_scaled)
+        test_r2 = r2_score(y_test, y_test_pred)
+
+    print(f"Model trained. Test R²: {test_r2:.4f}")
+
+    with profiler.stage("refit"):
+        full_X_scaled = scaler.fit_transform(X)
+        start = time.perf_counter()
+        model.fit(full_X_scaled, y)
+        fit_seconds = time.perf_counter() - start
+
+    # Fit on every core, but serve single-threaded: per-request thread fan-out
+    # costs more than it saves on the batch sizes the API sees.
+    if "n_jobs" in model.get_params():
+        model.set_params(n_jobs=None)
+
+    with profiler.stage("dump"):
+        joblib.dump(model, MODEL_PATH)
+        joblib.dump(scaler, SCALER_PATH)
+
+    if not isinstance(model, RandomForestRegressor):
+        print("Selected model is not a Random Forest; serving will use model.predict directly.")
+    else:
+        export_forests(args, model, scaler, X, full_X_scaled)
+
+    with profiler.stage("publish"):
+        publish_version(ARTIFACT_PATHS, mode="full", model=model_name,
+                        fit_seconds=round(fit_seconds, 3), test_r2=round(test_r2, 4))
+
+    print("\n✅✅✅ FINISHED! ✅✅✅")
+    print("New 'random_forest_model.pkl', 'scaler.pkl', 'forest_nodes.npz' and 'feature_columns.csv' are saved.")
+    save_profile(args)
+    print("You can now run app.py")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import os
+from pymongo import ASCENDING
+from pymongo.errors import PyMongoError
+
+# Unverified accounts are deleted by MongoDB this long after their OTP
+# expired, which leaves time to resend an OTP before the account goes.
+UNVERIFIED_TTL_SECONDS = int(os.environ.get("UNVERIFIED_TTL_SECONDS", 24 * 3600))
+
+# (keys, options) for every index the auth routes rely on.
+USER_INDEXES = [
+    ([("email", ASCENDING)], {"name": "email_unique", "unique": True}),
+    # Covers /api/signin/emailnotverified's {email, isverified} filter.
+    ([("email", ASCENDING), ("isverified", ASCENDING)], {"name": "email_isverified"}),
+    # TTL: only unverified users are removed; verified users keep their
+    # account when a password-reset OTP on them expires.
+    ([("otpExpiry", ASCENDING)], {
+        "name": "otpExpiry_unverified_ttl",
+        "expireAfterSeconds": UNVERIFIED_TTL_SECONDS,
+        "partialFilterExpression": {"isverified": False},
+    }),
+]
+
+# Fields each route reads from the user document; everything else (the
+# password hash in particular) stays on the server.
+RESEND_OTP_FIELDS = {"email": 1, "isverified": 1}
+VERIFY_EMAIL_FIELDS = {"fullname": 1, "email": 1, "isverified": 1, "otp": 1, "otpExpiry": 1}
+SIGNIN_FIELDS = {"fullname": 1, "email": 1, "phonenumber": 1, "password": 1, "isverified": 1}
+EXISTS_FIELDS = {"_id": 1}
+OTP_FIELDS = {"otp": 1, "otpExpiry": 1}
+
+
+def ensure_user_indexes(users_collection):
+    """Create the users indexes if missing; returns the index names, or None on failure.
+
+    create_index is a no-op for an index that already exists with the same
+    options. A unique index cannot be built over existing duplicate emails,
+    so failures are reported instead of stopping the app.
+    """
+    try:
+        return [users_collection.create_index(keys, **options) for keys, options in USER_INDEXES]
+    except PyMongoError as e:
+        print("❌ Could not create user indexes:", e)
+        return None
+
+
+async def ensure_user_indexes_async(users_collection):
+    """ensure_user_indexes for an AsyncMongoClient collection"""
+    try:
+        return [await users_collection.create_index(keys, **options) for keys, options in USER_INDEXES]
+    except PyMongoError as e:
+        print("❌ Could not create user indexes:", e)
+        return None